@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Measure cold start times of the package and the command line tasks in fresh interpreters.
+
+    $ python benchmarks/import_time.py --repeat=10 > import_time.json
+"""
+
+import json
+import os
+import subprocess
+import sys
+import time
+
+from absl import app
+from absl import flags
+
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CASES = {
+    'import src': [sys.executable, '-c', 'import src'],
+    'import src.core.plot': [sys.executable, '-c', 'import src.core.plot'],
+    'src.PiGainCorrect': [sys.executable, '-c', 'import src; src.PiGainCorrect'],
+    'src.SingleCurveFit': [sys.executable, '-c', 'import src; src.SingleCurveFit'],
+    'xisscfcurvefit.py --helpshort': [sys.executable, 'xisscfcurvefit.py', '--helpshort'],
+}
+
+
+def measure(command, repeat):
+    elapsed = list()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        # absl exits with 1 after printing help, so that the exit status is not checked
+        subprocess.run(command, cwd=ROOT_DIR,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        elapsed.append(time.perf_counter() - start)
+    elapsed.sort()
+    return dict(min=elapsed[0], median=elapsed[len(elapsed)//2], max=elapsed[-1], repeat=repeat)
+
+
+def main(argv):
+    results = dict((name, measure(command, flag_values.repeat)) for name, command in CASES.items())
+    json.dump(dict(benchmark='import_time', python=sys.version.split()[0], results=results),
+              sys.stdout, indent=2)
+    print()
+
+
+def define_flags():
+    flag_values = flags.FLAGS
+    flags.DEFINE_integer('repeat', 5, 'Number of runs of each case.', lower_bound=1)
+    return flag_values
+
+
+if __name__ == '__main__':
+    flag_values = define_flags()
+    sys.exit(app.run(main))
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Time the fitters, the gain correction of spectra and events, the region counting and the line fits on synthetic data sets.
+
+    $ python benchmarks/run.py --ndata=3 --ndata=30 --ndata=300 --repeat=5 > run.json
+
+The JSON has the minimum, median and maximum wall-clock times of each case
+with its parameters, so that runs before and after a change can be compared.
+"""
+
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+from absl import app
+from absl import flags
+
+import synthetic
+from src.core.count import RegionCounter
+from src.core.event import EventImageBinner
+from src.core.eventgain import EventGainCorrect
+from src.core.fit import MultipleCurveFit, SingleCurveFit
+from src.core.gain import LIBRARY_FILE, correct_counts, correct_counts_clib, overlap_matrix
+from src.core.linefit import LineCentroidFitter, load_spectra
+
+
+def measure(function, repeat, setup=None):
+    """Wall-clock times of the function, calling setup before each run outside of the timing."""
+    elapsed = list()
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        function()
+        elapsed.append(time.perf_counter() - start)
+    elapsed.sort()
+    return dict(min=elapsed[0], median=elapsed[len(elapsed)//2], max=elapsed[-1], repeat=repeat)
+
+
+def fit_cases(directory, rng, repeat):
+    results = list()
+    log_file = os.path.join(directory, 'fit.log')
+    qdp_list = synthetic.make_qdp_set(os.path.join(directory, 'qdp'), max(flag_values.ndata), rng,
+                                      npoint=flag_values.npoint)
+    single = lambda: SingleCurveFit(qdp_list[0], log_file, plot_flag=False, loglv=2, guess=True).fit()
+    results.append(dict(case='SingleCurveFit', ndata=1, **measure(single, repeat)))
+    for ndata in flag_values.ndata:
+        for solver in flag_values.solver:
+            multiple = lambda: MultipleCurveFit(
+                qdp_list[:ndata], log_file, plot_flag=False, loglv=2, guess=True, solver=solver).fit()
+            results.append(dict(case='MultipleCurveFit', ndata=ndata, solver=solver, **measure(multiple, repeat)))
+    return results
+
+
+def gain_cases(directory, rng, repeat):
+    results = list()
+    efunc, etrue = synthetic.ET*1.01, synthetic.ET
+    for nspec in flag_values.nspec:
+        pifile = os.path.join(directory, f'gain{nspec}.pi')
+        synthetic.make_spectrum(pifile, rng, counts=50.0*synthetic.NCHAN, nspec=nspec)
+        counts = load_spectra([pifile]).astype(np.int32)
+        # the first call builds the overlap matrix, which is cached for the rest
+        results.append(dict(case='correct_counts', nspec=nspec, **measure(
+            lambda: correct_counts(counts, efunc, etrue, seed=1), repeat, setup=overlap_matrix.cache_clear)))
+        results.append(dict(case='correct_counts_cached', nspec=nspec, **measure(
+            lambda: correct_counts(counts, efunc, etrue, seed=1), repeat)))
+        if os.path.exists(LIBRARY_FILE):
+            results.append(dict(case='correct_counts_clib', nspec=nspec, **measure(
+                lambda: correct_counts_clib(counts, efunc, etrue, seed=1), repeat)))
+    return results
+
+
+def count_cases(directory, rng, repeat):
+    results = list()
+    image = os.path.join(directory, 'image.fits')
+    center = (768.5, 768.5)
+    synthetic.make_image(image, rng, counts=flag_values.counts, center=center)
+    for nregion in flag_values.nregion:
+        regions = synthetic.make_regions(
+            os.path.join(directory, f'region{nregion}'), center, list(np.geomspace(4.0, 240.0, nregion)))
+        # counting in a fresh cache directory includes decompressing the image
+        results.append(dict(case='RegionCounter.count', nregion=len(regions), **measure(
+            lambda: RegionCounter(image, cache_dir=tempfile.mkdtemp(dir=directory), loglv=2).count(regions),
+            repeat)))
+    return results
+
+
+def event_cases(directory, rng, repeat):
+    results = list()
+    evtfile, image = os.path.join(directory, 'event.evt'), os.path.join(directory, 'event.img')
+    synthetic.make_event_file(evtfile, rng, nevent=flag_values.nevent)
+    EventImageBinner([evtfile], workers=1, loglv=2).write(image, clobber=True)
+    for workers in flag_values.workers:
+        corrector = EventGainCorrect(image, C=synthetic.C, epsilon=synthetic.EPSILON, nframe=5000.0, seed=1,
+                                     workers=workers, cache_dir=directory, clobber=True, loglv=2)
+        results.append(dict(case='EventGainCorrect.correct', nevent=flag_values.nevent, workers=workers, **measure(
+            lambda: corrector.correct(evtfile, os.path.join(directory, 'event_cor.evt')), repeat)))
+    return results
+
+
+def line_cases(directory, rng, repeat):
+    results = list()
+    fitter = LineCentroidFitter(loglv=2)
+    for nline in flag_values.nline:
+        pifile = os.path.join(directory, f'line{nline}.pi')
+        synthetic.make_spectrum(pifile, rng, counts=flag_values.line_counts, nspec=nline)
+        # loading the spectra is included, as the QDP of the regions starts from the files
+        results.append(dict(case='LineCentroidFitter.fit', nspec=nline, **measure(
+            lambda: fitter.fit_files([pifile]), repeat)))
+    return results
+
+
+CASES = dict(fit=fit_cases, gain=gain_cases, count=count_cases, event=event_cases, line=line_cases)
+
+
+def main(argv):
+    results = list()
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        # the fitters write the result QDP files to the current directory
+        os.chdir(directory)
+        try:
+            for name in flag_values.case:
+                rng = np.random.default_rng(flag_values.seed)
+                results.extend(CASES[name](directory, rng, flag_values.repeat))
+        finally:
+            os.chdir(cwd)
+    json.dump(dict(benchmark='run', python=sys.version.split()[0], seed=flag_values.seed, results=results),
+              sys.stdout, indent=2)
+    print()
+
+
+def define_flags():
+    flag_values = flags.FLAGS
+    flags.DEFINE_multi_enum('case', list(CASES), list(CASES), 'Cases to run.')
+    flags.DEFINE_integer('repeat', 3, 'Number of runs of each case.', lower_bound=1)
+    flags.DEFINE_integer('seed', 0, 'Seed of the synthetic data sets.')
+    flags.DEFINE_multi_integer('ndata', [3, 30, 300], 'Numbers of QDP files of the joint fits.', lower_bound=2)
+    flags.DEFINE_integer('npoint', 10, 'Number of data points in each QDP file.', lower_bound=3)
+    flags.DEFINE_multi_enum('solver', ['leastsq', 'trf'], ['leastsq', 'trf'], 'Solvers of the joint fits.')
+    flags.DEFINE_multi_integer('nspec', [1, 1000], 'Numbers of spectra corrected at once.', lower_bound=1)
+    flags.DEFINE_float('counts', 1e6, 'Number of events of the point source image.', lower_bound=1)
+    flags.DEFINE_multi_integer('nregion', [8, 64], 'Numbers of concentric regions counted at once.', lower_bound=1)
+    flags.DEFINE_integer('nevent', 3000000, 'Number of events of the event file corrected.', lower_bound=1)
+    flags.DEFINE_multi_integer('workers', [1, 4], 'Numbers of processes of the event correction.', lower_bound=1)
+    flags.DEFINE_multi_integer('nline', [60, 1000], 'Numbers of spectra of the line fits, e.g. 20 annuli of 3 sensors.',
+                               lower_bound=1)
+    flags.DEFINE_float('line_counts', 1e5, 'Number of counts of each spectrum of the line fits.', lower_bound=1)
+    return flag_values
+
+
+if __name__ == '__main__':
+    flag_values = define_flags()
+    sys.exit(app.run(main))
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""Synthetic data sets for the benchmarks.
+
+QDP files of event densities and line energies drawn from
+energy_event_density_curve, PI spectra of a continuum and a line, and
+images and event files of a point source with the regions around it.
+"""
+
+import os
+import sys
+from typing import List, Tuple
+
+import numpy as np
+from astropy.io import fits
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from src.core.gain import PiGainCorrect
+from src.core.model import energy_event_density_curve
+from src.core.qdp import write_qdp_file
+from src.core.region import write_annulus_region, write_circle_region
+
+
+ET, C, EPSILON = 6.7, 0.02, 150.0 # iron line energy in keV and SCF parameters
+SENSORS = (0, 1, 3)
+NCHAN = 4096
+
+
+def make_qdp(qdp:str, rng:np.random.Generator, npoint:int=10, Et:float=ET, C:float=C,
+             epsilon:float=EPSILON, density_range:Tuple[float, float]=(1e-4, 2e-2),
+             density_error:float=0.02, energy_error:float=0.004) -> None:
+    """Write a QDP of npoint event densities and line energies with Gaussian errors.
+
+    Densities are log-uniform in events/frame/pixel with the relative error
+    density_error, and energies scatter by energy_error in keV.
+    """
+    density = np.sort(10**rng.uniform(*np.log10(density_range), npoint))
+    energy = energy_event_density_curve(density, Et, C, epsilon) + rng.normal(0.0, energy_error, npoint)
+    result = np.column_stack((
+        density, density*density_error, energy, np.full(npoint, energy_error)))
+    write_qdp_file(qdp, [result])
+
+
+def make_qdp_set(directory:str, ndata:int, rng:np.random.Generator, npoint:int=10) -> List[str]:
+    """Write ndata QDP files of observations by the sensors in turn, named like ae0000xi0.qdp.
+
+    Et scatters among observations and C differs by sensor while epsilon is common.
+    """
+    os.makedirs(directory, exist_ok=True)
+    sensor_c = dict((sensor, C*(1.0 + 0.1*n)) for n, sensor in enumerate(SENSORS))
+    qdp_list = list()
+    for n in range(ndata):
+        sensor = SENSORS[n % len(SENSORS)]
+        qdp = os.path.join(directory, f'ae{n//len(SENSORS):04d}xi{sensor}.qdp')
+        make_qdp(qdp, rng, npoint=npoint, Et=ET + rng.normal(0.0, 0.02), C=sensor_c[sensor])
+        qdp_list.append(qdp)
+    return qdp_list
+
+
+def make_spectrum(pifile:str, rng:np.random.Generator, counts:float=1e5, nspec:int=1,
+                  nchan:int=NCHAN, line_energy:float=ET, line_fraction:float=0.2) -> None:
+    """Write a PI spectrum of an exponential continuum and a Gaussian line with Poisson counts.
+
+    nspec > 1 writes a column of nspec spectra per row, as the rebinning
+    routine corrects spectra given as an array of shape (..., nchan).
+    """
+    energy = (np.arange(nchan) + 0.5)*3.65e-3
+    continuum = np.exp(-energy/5.0)
+    line = np.exp(-0.5*((energy - line_energy)/0.06)**2)
+    model = (1.0 - line_fraction)*continuum/continuum.sum() + line_fraction*line/line.sum()
+    spectra = rng.poisson(counts*model, size=(nspec, nchan)).astype(np.int32)
+    if nspec == 1:
+        columns = [
+            fits.Column(name=PiGainCorrect.CHANNEL_COLUMN, format='J', array=np.arange(nchan)),
+            fits.Column(name=PiGainCorrect.COUNTS_COLUMN, format='J', unit='count', array=spectra[0])]
+    else:
+        columns = [
+            fits.Column(name=PiGainCorrect.CHANNEL_COLUMN, format=f'{nchan}J',
+                        array=np.broadcast_to(np.arange(nchan), spectra.shape)),
+            fits.Column(name=PiGainCorrect.COUNTS_COLUMN, format=f'{nchan}J', unit='count', array=spectra)]
+    spectrum = fits.BinTableHDU.from_columns(columns, name=PiGainCorrect.EXTNAME)
+    fits.HDUList([fits.PrimaryHDU(), spectrum]).writeto(pifile, overwrite=True)
+
+
+def make_image(image:str, rng:np.random.Generator, counts:float=1e6, size:int=1024,
+               center:Tuple[float, float]=(768.5, 768.5), offset:float=256.0,
+               core_radius:float=10.0, background:float=0.02) -> None:
+    """Write a sky image of a point source of a beta-model profile on a flat background.
+
+    The image covers the physical pixels offset+1 to offset+size along both
+    axes by LTV1 and LTV2, as images extracted from XIS event files do.
+    """
+    # surface brightness (1+(r/rc)^2)^-1.5, whose enclosed fraction is 1-(1+(r/rc)^2)^-0.5
+    u = rng.random(int(counts))
+    radius = core_radius*np.sqrt(np.clip(1.0 - u, 1e-12, None)**-2 - 1.0)
+    angle = rng.uniform(0.0, 2*np.pi, radius.size)
+    x = center[0] - offset + radius*np.cos(angle)
+    y = center[1] - offset + radius*np.sin(angle)
+    inside = (x >= 0.5) & (x < size + 0.5) & (y >= 0.5) & (y < size + 0.5)
+    data = np.histogram2d(y[inside], x[inside], bins=size, range=((0.5, size+0.5), (0.5, size+0.5)))[0]
+    data += rng.poisson(background, data.shape)
+    header = fits.Header()
+    header['LTV1'], header['LTV2'] = -offset, -offset
+    header['LTM1_1'], header['LTM2_2'] = 1.0, 1.0
+    fits.PrimaryHDU(data.astype(np.int32), header=header).writeto(image, overwrite=True)
+
+
+def make_event_file(evtfile:str, rng:np.random.Generator, nevent:int=1000000, size:int=1024,
+                    center:Tuple[float, float]=(768.5, 768.5), offset:int=256, core_radius:float=10.0,
+                    C:float=C, epsilon:float=EPSILON, nframe:float=5000.0) -> None:
+    """Write an event table of a point source whose iron line is shifted by the SCF effect.
+
+    Events of the line at ET are shifted by the gain at the density of
+    their pixel over nframe frames, and the others are continuum.
+    """
+    u = rng.random(nevent)
+    radius = core_radius*np.sqrt(np.clip(1.0 - u, 1e-12, None)**-2 - 1.0)
+    angle = rng.uniform(0.0, 2*np.pi, nevent)
+    x = np.rint(center[0] + radius*np.cos(angle))
+    y = np.rint(center[1] + radius*np.sin(angle))
+    inside = (x > offset) & (x <= offset + size) & (y > offset) & (y <= offset + size)
+    x, y = x[inside].astype(np.int16), y[inside].astype(np.int16)
+    density = np.zeros((size, size))
+    np.add.at(density, (y - offset - 1, x - offset - 1), 1.0/nframe)
+    gain = energy_event_density_curve(density[y - offset - 1, x - offset - 1], 1.0, C, epsilon)
+    energy = np.where(rng.random(x.size) < 0.2, rng.normal(ET, 0.06, x.size), rng.exponential(5.0, x.size))
+    pi = np.clip(energy*gain/3.65e-3, 0, NCHAN-1).astype(np.int16)
+    events = fits.BinTableHDU.from_columns([
+        fits.Column(name='X', format='I', array=x), fits.Column(name='Y', format='I', array=y),
+        fits.Column(name='PI', format='I', array=pi),
+        fits.Column(name='GRADE', format='B', array=rng.choice([0, 2, 3, 4, 6], x.size).astype(np.uint8))],
+        name='EVENTS')
+    for index, (lower, upper) in enumerate(((offset+1, offset+size), (offset+1, offset+size), (0, NCHAN-1)), start=1):
+        events.header[f'TLMIN{index}'], events.header[f'TLMAX{index}'] = lower, upper
+    fits.HDUList([fits.PrimaryHDU(), events]).writeto(evtfile, overwrite=True)
+
+
+def make_regions(directory:str, center:Tuple[float, float], radii:List[float]) -> List[str]:
+    """Write a circle region within the first radius and annulus regions between the radii."""
+    os.makedirs(directory, exist_ok=True)
+    regions = [os.path.join(directory, 'region000.reg')]
+    write_circle_region(regions[0], *center, radii[0])
+    for n, (inner, outer) in enumerate(zip(radii[:-1], radii[1:]), start=1):
+        regions.append(os.path.join(directory, f'region{n:03d}.reg'))
+        write_annulus_region(regions[-1], *center, inner, outer)
+    return regions
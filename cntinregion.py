@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import sys
+
+from absl import app
+from absl import flags
+
+import src as scf
+
+
+def main(argv):
+    if len(argv) < 3:
+        raise app.UsageError(
+            'USAGE   : cntinregion.py <IMAGE FITS> <REGION> [<REGION> ...]\n'
+            'EXAMPLE : cntinregion.py xis0.img xis0_src.reg\n\n'
+            'OUTPUT FORMAT\n  <COUNTS> <ERROR> <PIXEL>')
+    counter = scf.RegionCounter(image=argv[1], loglv=flag_values.loglv)
+    for count, error, pixel in counter.count(argv[2:]):
+        print(f'{count:g} {error:g} {pixel:g}')
+
+
+def define_flags():
+    flag_values = flags.FLAGS
+    flags.DEFINE_enum(
+        'loglv', 'WARNING',
+        ['DEBUG', 'debug', 'INFO', 'info', 'WARNING', 'warning', 'ERROR', 'error'],
+        'Logging level.')
+    return flag_values
+
+
+if __name__ == '__main__':
+    flag_values = define_flags()
+    sys.exit(app.run(main))
@@ -1,5 +1,43 @@
 __version__ = '0.1.0'
 
-from .util.common import PKG_DIR, OUT_DIR, DAT_DIR, Common
+import importlib
+
+from .util.common import PKG_DIR, OUT_DIR, DAT_DIR, CACHE_DIR, Common
 from .util.object import ObjectLikeDict
-from .core.fit import CurveFitFactory, SingleCurveFit, MultipleCurveFit
+
+# modules are imported on first access of their names so that each task pays
+# only for its own dependencies, e.g. lmfit for fitting or astropy for images
+LAZY_EXPORTS = {
+    '.util.profile': ('PROFILER',),
+    '.core.fit': ('CurveFitFactory', 'CurveFitParameter', 'SingleCurveFit', 'MultipleCurveFit',
+                  'read_joint_state', 'joint_state_values'),
+    '.core.hint': ('read_parameter_hints', 'parse_parameter_hints', 'read_tie_spec', 'parse_ties'),
+    '.core.cache': ('FIT_CACHE_DIR', 'FitCache'),
+    '.core.evaluation': ('FitEvaluation',),
+    '.core.qdp': ('QdpData', 'read_qdp_file', 'write_qdp_file', 'qdp_files', 'read_qdp_directory'),
+    '.core.batch': ('BatchCurveFit', 'read_manifest'),
+    '.core.gain': ('PiGainCorrect',),
+    '.core.eventgain': ('EventGainCorrect',),
+    '.core.densitymap': ('PSF_SCALE', 'DensityMap'),
+    '.core.region': ('AnnulusRegionPlanner',),
+    '.core.regionbatch': ('XIS_SENSORS', 'RegionTask', 'BatchRegionPlanner', 'read_observations'),
+    '.core.count': ('RegionCounter',),
+    '.core.event': ('EventImageBinner', 'unfiltered_event_files'),
+    '.core.density': ('FRAME_TIME', 'EventDensityQdpBuilder', 'read_line_energy', 'write_line_energy'),
+    '.core.linefit': ('LINE_WINDOW', 'LINE_SIGMA', 'LineCentroidFitter', 'load_spectra'),
+    '.core.pipeline': ('Stage', 'Pipeline'),
+    '.core.scfpipeline': ('PIPELINE_STATE_FILE', 'PIPELINE_REPORT_FILE', 'read_pipeline_config', 'scf_stages'),
+}
+LAZY_MODULES = dict((name, module) for module, names in LAZY_EXPORTS.items() for name in names)
+
+
+def __getattr__(name:str):
+    if name not in LAZY_MODULES:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    value = getattr(importlib.import_module(LAZY_MODULES[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + list(LAZY_MODULES))
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+
+import csv
+import inspect
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Tuple
+
+from ..util.common import Common
+from ..util.error import InvalidInputError
+from ..util.profile import PROFILER
+from .fit import CurveFitFactory
+
+
+DEFAULT_LOG_FILE = 'xisscfcurvefit_result.log' # name of the log in the directory of each group
+
+
+def read_manifest(manifest:str) -> List[List[str]]:
+    """Read groups of QDP files to be fitted together.
+
+    A text manifest has one group per line as a comma-separated list, and
+    a JSON manifest is a list whose items are a QDP file or a list of them.
+    """
+    if not os.path.exists(manifest):
+        raise FileNotFoundError(f'No such manifest file: {manifest}')
+    with open(manifest, 'r') as f:
+        if os.path.splitext(manifest)[1].lower() == '.json':
+            groups = [[item] if isinstance(item, str) else list(item) for item in json.load(f)]
+        else:
+            groups = [
+                [qdp.strip() for qdp in line.split('#')[0].split(',') if qdp.strip()]
+                for line in f.read().splitlines()]
+    groups = [group for group in groups if group]
+    if not groups:
+        raise InvalidInputError(f'No QDP file is found in {manifest}')
+    return groups
+
+
+def fit_group(qdp_list:List[str], hints:Dict[str, Dict], guess:bool, output_dir:str, log_file:str, loglv:int,
+              cache_dir:str=None, save_flag:bool=False) -> Tuple[Dict, Dict]:
+    """Fit a group of QDP files without prompt and display, and summarize the result and the profile.
+
+    The log, the result QDP files and the plot are written to the output directory of the group.
+    """
+    PROFILER.reset()
+    log_file = os.path.join(output_dir, log_file)
+    row = dict(group=','.join(qdp_list), log=log_file)
+    try:
+        os.makedirs(output_dir, exist_ok=True)
+        cf = CurveFitFactory.get_instance(
+            qdp_list=qdp_list, log_file=log_file, plot_flag=False, loglv=loglv, hints=hints, guess=guess,
+            cache_dir=cache_dir, save_flag=save_flag, output_dir=output_dir)
+        cf.fit()
+        row.update(cf.summary())
+    except (Exception, SystemExit) as err:
+        row.update(success=False, message=f'{type(err).__name__}: {err}')
+    return row, PROFILER.report()
+
+
+class BatchCurveFit(Common):
+    """Fit groups of QDP files in a process pool into a summary table.
+
+    The outputs of the n-th group are written to the directory group<n>
+    under the directory named after the summary file, e.g. summary/group1
+    for summary.csv, so that groups sharing QDP files or their names do not
+    overwrite each other.
+    """
+
+    def __init__(self, groups:List[List[str]], hints:Dict[str, Dict], summary_file:str,
+                 guess:bool=False, workers:int=None, cache_dir:str=None, save_flag:bool=False,
+                 log_file:str=DEFAULT_LOG_FILE, loglv:int=1) -> None:
+        super().__init__(loglv)
+        if hints is None and not guess:
+            raise InvalidInputError('Batch fitting requires hints of parameters or the initial guess.')
+        self.groups = groups
+        self.hints = hints
+        self.guess = guess
+        self.summary_file = summary_file
+        self.workers = workers
+        self.cache_dir = cache_dir
+        self.save_flag = save_flag
+        self.log_file = os.path.basename(log_file)
+
+    def run(self) -> List[Dict]:
+        self.debug('START', inspect.currentframe())
+        ngroup = len(self.groups)
+        output_dirs = [os.path.join(os.path.splitext(self.summary_file)[0], f'group{n+1}') for n in range(ngroup)]
+        # workers only report warnings and errors not to interleave their logs
+        arguments = (self.groups, [self.hints]*ngroup, [self.guess]*ngroup, output_dirs, [self.log_file]*ngroup,
+                     [max(self.loglv, 2)]*ngroup, [self.cache_dir]*ngroup, [self.save_flag]*ngroup)
+        if self.workers == 1:
+            # fitting in this process resets the profiler of the process
+            profile = PROFILER.report()
+            results = list(map(fit_group, *arguments))
+            PROFILER.reset()
+            PROFILER.merge(profile)
+        else:
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                results = list(executor.map(fit_group, *arguments))
+        rows = [row for row, _ in results]
+        for _, profile in results:
+            PROFILER.merge(profile)
+        nfail = sum(not row['success'] for row in rows)
+        for row in rows:
+            if not row['success']:
+                self.warning(f'Fitting failed for {row["group"]}: {row.get("message", "")}')
+        self.write_summary(rows)
+        self.info(f'{ngroup-nfail} / {ngroup} group(s) were fitted successfully')
+        self.debug('END', inspect.currentframe())
+        return rows
+
+    def write_summary(self, rows:List[Dict]) -> None:
+        fieldnames = list()
+        for row in rows:
+            fieldnames.extend(key for key in row if key not in fieldnames)
+        with open(self.summary_file, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames, restval='')
+            writer.writeheader()
+            writer.writerows(rows)
+        self.info(f'Summary of fitting results was recorded to {self.summary_file}')
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+
+import glob
+import hashlib
+import os
+from typing import Dict, Union
+
+import numpy as np
+
+from ..util.common import CACHE_DIR
+
+
+FIT_CACHE_DIR = os.path.join(CACHE_DIR, 'fit')
+FIT_CACHE_SIZE = 256*1024**2 # bytes of fit results kept in the cache directory
+
+
+def content_key(*parts:Union[str, bytes, np.ndarray]) -> str:
+    """Hash of the contents, which is the same whenever the contents are the same."""
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, np.ndarray):
+            part = np.ascontiguousarray(part)
+            digest.update(f'{part.dtype.str}{part.shape}'.encode())
+            part = part.tobytes()
+        elif isinstance(part, str):
+            part = part.encode()
+        digest.update(len(part).to_bytes(8, 'little'))
+        digest.update(part)
+    return digest.hexdigest()
+
+
+class FitCache(object):
+    """Results of fitting stored as compressed npz files keyed by content_key.
+
+    Files are evicted in order of the last use when their total size exceeds max_bytes.
+    """
+
+    def __init__(self, cache_dir:str=FIT_CACHE_DIR, max_bytes:int=FIT_CACHE_SIZE) -> None:
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    def path(self, key:str) -> str:
+        return os.path.join(self.cache_dir, f'{key}.npz')
+
+    def load(self, key:str) -> Dict[str, np.ndarray]:
+        """Return the stored record or None, marking the record as used."""
+        path = self.path(key)
+        try:
+            with np.load(path, allow_pickle=False) as npz:
+                record = dict(npz)
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return record
+
+    def store(self, key:str, record:Dict[str, np.ndarray]) -> None:
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self.path(key)
+        # write to a temporary file first so that concurrent readers never see a partial one
+        with open(f'{path}.{os.getpid()}', 'wb') as f:
+            np.savez_compressed(f, **record)
+        os.replace(f'{path}.{os.getpid()}', path)
+        self.evict(keep=path)
+
+    def evict(self, keep:str=None) -> None:
+        """Remove the least recently used files until the total size is within max_bytes."""
+        entries = list()
+        for path in glob.glob(os.path.join(self.cache_dir, '*.npz')):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
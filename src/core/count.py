@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+
+import inspect
+from typing import List
+
+import numpy as np
+
+from ..util.common import CACHE_DIR, Common
+from ..util.error import InvalidInputError
+from .image import load_image, physical_axes
+from .region import RegionShape, read_region
+
+
+class RegionCounter(Common):
+    """Count events of an image in many regions at once."""
+
+    def __init__(self, image:str, cache_dir:str=CACHE_DIR, loglv:int=1) -> None:
+        super().__init__(loglv)
+        self.image = image
+        self.data, header = load_image(image, cache_dir=cache_dir)
+        self.x, self.y = physical_axes(self.data.shape, header)
+
+    def _window(self, shapes:List[RegionShape]):
+        """Index ranges of the pixels covering the bounding boxes of the shapes."""
+        bbox = np.array([shape.bbox for shape in shapes if not shape.exclude])
+        if bbox.size == 0:
+            raise InvalidInputError('Region consists of excluded shapes only.')
+        ix = np.searchsorted(self.x, [bbox[:, 0].min(), bbox[:, 1].max()], side='left')
+        iy = np.searchsorted(self.y, [bbox[:, 2].min(), bbox[:, 3].max()], side='left')
+        return slice(ix[0], ix[1]+1), slice(iy[0], iy[1]+1)
+
+    def mask(self, shapes:List[RegionShape]):
+        """Pixels in the union of included shapes minus the excluded ones, within a window."""
+        xs, ys = self._window(shapes)
+        x, y = self.x[xs][None, :], self.y[ys][:, None]
+        mask = np.zeros((y.size, x.size), dtype=bool)
+        for shape in shapes:
+            if shape.exclude:
+                mask &= ~shape.contains(x, y)
+            else:
+                mask |= shape.contains(x, y)
+        return (ys, xs), mask
+
+    def count(self, regions:List[str], data:np.ndarray=None) -> np.ndarray:
+        """Return an array of (counts, error, pixels) for each region file.
+
+        data of the shape of the image, e.g. a smoothed one, is summed instead of the image if given.
+        """
+        self.debug('START', inspect.currentframe())
+        nregion = len(regions)
+        # regions are labelled in layers of mutually disjoint regions, so that
+        # concentric annuli and other tilings are counted in a single bincount
+        layers = [np.zeros(self.data.shape, dtype=np.int32)]
+        for n, region in enumerate(regions, start=1):
+            window, mask = self.mask(read_region(region))
+            for labels in layers:
+                if not labels[window][mask].any():
+                    break
+            else:
+                labels = np.zeros(self.data.shape, dtype=np.int32)
+                layers.append(labels)
+            labels[window][mask] = n
+        self.debug(f'{nregion} regions are labelled in {len(layers)} layer(s)')
+
+        counts = np.zeros(nregion+1)
+        pixels = np.zeros(nregion+1)
+        weights = np.ravel(self.data if data is None else data)
+        for labels in layers:
+            counts += np.bincount(labels.ravel(), weights=weights, minlength=nregion+1)
+            pixels += np.bincount(labels.ravel(), minlength=nregion+1)
+        self.debug('END', inspect.currentframe())
+        return np.column_stack((counts, np.sqrt(counts), pixels))[1:]
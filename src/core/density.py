@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+import inspect
+import os
+from typing import List, Tuple
+
+import numpy as np
+
+from ..util.common import CACHE_DIR, Common
+from ..util.error import InsufficientInputError, InvalidInputError
+from .count import RegionCounter
+from .densitymap import PSF_SCALE, DensityMap
+from .qdp import write_qdp_file
+
+
+FRAME_TIME = 8.0 # exposure time of a frame in second in the normal mode without window option
+
+
+def read_line_energy(energy:str) -> Tuple[np.ndarray, np.ndarray]:
+    """Read line energies and errors in keV, one region per row.
+
+    Rows consist of either (energy, error) or (energy, lower error, upper error).
+    """
+    if not os.path.exists(energy):
+        raise FileNotFoundError(f'No such line energy file: {energy}')
+    table = np.loadtxt(energy, dtype=float, comments=('#', '!'), ndmin=2)
+    if table.shape[1] == 2:
+        return table[:, 0], table[:, 1]
+    elif table.shape[1] == 3:
+        return table[:, 0], 0.5*(np.abs(table[:, 1]) + np.abs(table[:, 2]))
+    else:
+        raise InvalidInputError(f'{energy} should have 2 or 3 columns.')
+
+
+def write_line_energy(energy:str, center:np.ndarray, error:np.ndarray) -> None:
+    """Write line energies and errors in keV, one region per row, as read by read_line_energy."""
+    invalid = np.flatnonzero(~(np.isfinite(center) & np.isfinite(error)))
+    if invalid.size:
+        raise InvalidInputError(f'No reliable line in region(s) {", ".join(str(n+1) for n in invalid)}.')
+    np.savetxt(energy, np.column_stack((center, error)), fmt='%.8e', header='energy error (keV)')
+
+
+class EventDensityQdpBuilder(Common):
+    """Make the QDP of event densities and line energies for the curve fitting."""
+
+    def __init__(self, image:str, regions:List[str], nframe:float=None, exposure:float=None,
+                 frame_time:float=FRAME_TIME, kernel:str='gaussian', scale:float=PSF_SCALE,
+                 cache_dir:str=CACHE_DIR, loglv:int=1) -> None:
+        super().__init__(loglv)
+        self.image = image
+        self.regions = regions
+        self.counter = RegionCounter(image, cache_dir=cache_dir, loglv=loglv)
+        if nframe is None:
+            if exposure is None:
+                raise InsufficientInputError('Either number of frames or exposure is required.')
+            nframe = exposure/frame_time
+        if nframe <= 0:
+            raise InvalidInputError('Number of frames should be positive.')
+        self.nframe = nframe
+        self.density_map = None
+        if scale > 0.0:
+            self.density_map = DensityMap(image, nframe, kernel=kernel, scale=scale, cache_dir=cache_dir)
+
+    def event_density(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Event densities in events/frame/pixel and the errors of all regions.
+
+        With the smoothed density map, the densities are averages of the map
+        over the regions, while the errors are from the counts of the image.
+        """
+        self.debug('START', inspect.currentframe())
+        counts, errors, pixels = self.counter.count(self.regions).T
+        if np.any(pixels == 0):
+            raise InvalidInputError(
+                f'No pixel of {self.image} in ' + ', '.join(np.array(self.regions)[pixels == 0]))
+        scale = 1.0/(self.nframe*pixels)
+        if self.density_map is not None:
+            counts = self.counter.count(self.regions, data=self.density_map.counts)[:, 0]
+        self.debug('END', inspect.currentframe())
+        return counts*scale, errors*scale
+
+    def write_qdp(self, qdp:str, energy:str) -> None:
+        self.debug('START', inspect.currentframe())
+        e_dat, e_err = read_line_energy(energy)
+        if not e_dat.size == len(self.regions):
+            raise InvalidInputError(
+                f'{energy} has {e_dat.size} rows for {len(self.regions)} regions.')
+        d_dat, d_err = self.event_density()
+        result = np.column_stack((d_dat, d_err, e_dat, e_err))
+        write_qdp_file(qdp, [result])
+        self.info(f'{qdp} is generated')
+        self.debug('END', inspect.currentframe())
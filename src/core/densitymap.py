@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+import os
+from typing import Dict
+
+import numpy as np
+from astropy.io import fits
+from scipy import signal
+
+from ..util.common import CACHE_DIR
+from ..util.error import InvalidInputError
+from .cache import content_key
+from .image import ARCMIN2PIXEL, load_image
+
+
+KERNELS = ('gaussian', 'tophat')
+GAUSSIAN_TRUNCATE = 4.0 # half size of the gaussian kernel in units of sigma
+PSF_SCALE = ARCMIN2PIXEL # default scale of the kernel in sky pixels, as large as the PSF of about 1 arcmin
+
+
+def smoothing_kernel(kernel:str, scale:float) -> np.ndarray:
+    """Normalized kernel of the sigma of a gaussian or the radius of a top hat in pixels."""
+    if kernel not in KERNELS:
+        raise InvalidInputError('Kernel should be one of ' + ', '.join(KERNELS))
+    if scale <= 0.0:
+        return np.ones((1, 1))
+    half = int(np.ceil(GAUSSIAN_TRUNCATE*scale if kernel == 'gaussian' else scale))
+    r2 = np.add.outer(np.arange(-half, half+1)**2, np.arange(-half, half+1)**2)
+    if kernel == 'gaussian':
+        values = np.exp(-0.5*r2/scale**2)
+    else:
+        values = (r2 <= scale**2).astype(float)
+    return values/values.sum()
+
+
+def smooth_image(data:np.ndarray, kernel:str='gaussian', scale:float=0.0) -> np.ndarray:
+    """Convolve the image with the kernel by FFT, normalized by the kernel within the image at the edges."""
+    values = smoothing_kernel(kernel, scale)
+    data = np.asarray(data, dtype=float)
+    if values.size == 1:
+        return data.copy()
+    smoothed = signal.fftconvolve(data, values, mode='same')
+    coverage = signal.fftconvolve(np.ones(data.shape), values, mode='same')
+    return np.clip(smoothed/coverage, 0.0, None)
+
+
+class DensityMap(object):
+    """Event density in events/frame/pixel of each pixel of an image smoothed with a PSF-scale kernel.
+
+    The smoothed counts are cached as a memory-mapped npy file keyed by the
+    contents of the image and the kernel, so that lookups are array reads.
+    Pickling passes the path of the cached file, not the map.
+    """
+
+    def __init__(self, image:str, nframe:float, kernel:str='gaussian', scale:float=0.0,
+                 cache_dir:str=CACHE_DIR) -> None:
+        if nframe <= 0:
+            raise InvalidInputError('Number of frames should be positive.')
+        data, self.header = load_image(image, cache_dir=cache_dir)
+        self.nframe = nframe
+        self.kernel, self.scale = kernel, float(scale)
+        key = content_key(data, kernel, repr(self.scale))
+        self.path = os.path.join(cache_dir, 'density', f'{key}.npy')
+        if not os.path.exists(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            # write to a temporary file first so that concurrent readers never see a partial one
+            with open(f'{self.path}.{os.getpid()}', 'wb') as f:
+                np.save(f, smooth_image(data, kernel, self.scale))
+            os.replace(f'{self.path}.{os.getpid()}', self.path)
+        self.counts = np.load(self.path, mmap_mode='r')
+
+    def __getstate__(self) -> Dict:
+        state = dict(self.__dict__)
+        state['header'] = self.header.tostring()
+        del state['counts']
+        return state
+
+    def __setstate__(self, state:Dict) -> None:
+        self.__dict__.update(state)
+        self.header = fits.Header.fromstring(state['header'])
+        self.counts = np.load(self.path, mmap_mode='r')
+
+    @property
+    def shape(self):
+        return self.counts.shape
+
+    def pixel_index(self, x:np.ndarray, y:np.ndarray):
+        """Indices of the pixels at physical (sky) coordinates, and whether they are in the image."""
+        ix = np.rint(np.asarray(x)*self.header.get('LTM1_1', 1.0) + self.header.get('LTV1', 0.0)).astype(np.int64) - 1
+        iy = np.rint(np.asarray(y)*self.header.get('LTM2_2', 1.0) + self.header.get('LTV2', 0.0)).astype(np.int64) - 1
+        inside = (ix >= 0) & (ix < self.shape[1]) & (iy >= 0) & (iy < self.shape[0])
+        return iy, ix, inside
+
+    def density(self, x:np.ndarray, y:np.ndarray) -> np.ndarray:
+        """Event density at physical (sky) coordinates, or zero outside the image."""
+        iy, ix, inside = self.pixel_index(x, y)
+        density = np.zeros(ix.shape)
+        density[inside] = self.counts[iy[inside], ix[inside]]/self.nframe
+        return density
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+
+import math
+from typing import List
+
+import numpy as np
+
+from .model import energy_event_density_curve as scf_curve
+from .model import energy_event_density_curve_jacobian as scf_jacobian
+
+
+BAND_MODES = ('analytic', 'sample')
+BAND_SIGMAS = (1.0, 2.0)
+CHUNK_ELEMENTS = 4000000 # elements of the sampled curves evaluated at once
+
+
+def readonly(array:np.ndarray, dtype:type=float) -> np.ndarray:
+    array = np.array(array, dtype=dtype)
+    array.setflags(write=False)
+    return array
+
+
+class FitEvaluation(object):
+    """Best-fit curves and residuals of the data sets, each evaluated once on first use.
+
+    values has Et, C and epsilon of each data set in the columns, and the
+    n-th data set is the points from offsets[n] to offsets[n+1]. sources has
+    the index of the varying parameter of covariance that each value is, or
+    -1 for a fixed value. The arrays are read-only, and only they are
+    pickled, not the evaluated curves.
+    """
+    __slots__ = ('values', 'energy', 'xd', 'yd', 'offsets', 'covariance', 'sources',
+                 '_curves', '_residuals', '_bands')
+
+    def __init__(self, values:np.ndarray, energy:np.ndarray, xd:np.ndarray, yd:np.ndarray,
+                 offsets:np.ndarray, covariance:np.ndarray=None, sources:np.ndarray=None) -> None:
+        for name, array in zip(self.__slots__[:4], (values, energy, xd, yd)):
+            object.__setattr__(self, name, readonly(array))
+        object.__setattr__(self, 'offsets', readonly(offsets, dtype=int))
+        object.__setattr__(self, 'covariance', None if covariance is None else readonly(covariance))
+        object.__setattr__(self, 'sources', readonly(
+            np.full(self.values.shape, -1) if sources is None else sources, dtype=int))
+        object.__setattr__(self, '_curves', [None]*self.ndata)
+        object.__setattr__(self, '_residuals', [None]*self.ndata)
+        object.__setattr__(self, '_bands', dict())
+
+    def __setattr__(self, name:str, value) -> None:
+        raise AttributeError(f'{type(self).__name__} is immutable')
+
+    def __reduce__(self):
+        return (type(self), (self.values, self.energy, self.xd, self.yd, self.offsets,
+                             self.covariance, self.sources))
+
+    @property
+    def ndata(self) -> int:
+        return self.values.shape[1]
+
+    def curve(self, n:int) -> np.ndarray:
+        """Model of the n-th data set on the energy grid."""
+        if self._curves[n] is None:
+            self._curves[n] = readonly(scf_curve(self.energy, *self.values[:, n]))
+        return self._curves[n]
+
+    def residuals(self, n:int) -> np.ndarray:
+        """Data minus model of the n-th data set."""
+        if self._residuals[n] is None:
+            start, stop = self.offsets[n:n+2]
+            self._residuals[n] = readonly(
+                self.yd[start:stop] - scf_curve(self.xd[start:stop], *self.values[:, n]))
+        return self._residuals[n]
+
+    @property
+    def curves(self) -> List[np.ndarray]:
+        return [self.curve(n) for n in range(self.ndata)]
+
+    def bands(self, mode:str='analytic', nsample:int=1000, seed:int=None) -> np.ndarray:
+        """Lower and upper bounds of the bands of BAND_SIGMAS around the curves of all data sets.
+
+        The analytic bands propagate the covariance through the gradient of
+        the model, and the sampled ones are percentiles of the curves of
+        parameters drawn from the covariance. The shape is
+        (number of sigmas, 2, number of data sets, size of the energy grid).
+        """
+        if mode not in BAND_MODES:
+            raise ValueError('Mode of bands should be one of ' + ', '.join(BAND_MODES))
+        key = (mode,) if mode == 'analytic' else (mode, nsample, seed)
+        if key not in self._bands:
+            if self.covariance is None:
+                raise ValueError('Bands require the covariance of the parameters.')
+            if mode == 'analytic':
+                bands = self.analytic_bands()
+            else:
+                bands = self.sampled_bands(nsample, seed)
+            self._bands[key] = readonly(bands)
+        return self._bands[key]
+
+    def value_covariance(self) -> np.ndarray:
+        """Covariance of Et, C and epsilon of each data set in shape of (3, 3, number of data sets)."""
+        varying = self.sources >= 0
+        index = np.where(varying, self.sources, 0)
+        return (self.covariance[index[:, None, :], index[None, :, :]]
+                *(varying[:, None, :] & varying[None, :, :]))
+
+    def analytic_bands(self) -> np.ndarray:
+        gradient = scf_jacobian(self.energy[None, :], *self.values[:, :, None])
+        variance = np.einsum('pnk,pqn,qnk->nk', gradient, self.value_covariance(), gradient)
+        sigma = np.sqrt(np.clip(variance, 0.0, None))
+        curves = np.array(self.curves)
+        return np.array([(curves - level*sigma, curves + level*sigma) for level in BAND_SIGMAS])
+
+    def sampled_bands(self, nsample:int, seed:int=None) -> np.ndarray:
+        varying = self.sources >= 0
+        best = np.zeros(self.covariance.shape[0])
+        best[self.sources[varying]] = self.values[varying]
+        draws = np.random.default_rng(seed).multivariate_normal(
+            best, self.covariance, size=nsample, method='eigh')
+        percents = [100*p for level in BAND_SIGMAS
+                    for p in (0.5*math.erfc(level/math.sqrt(2)), 0.5*math.erfc(-level/math.sqrt(2)))]
+        bands = np.empty((len(percents), self.ndata, self.energy.size))
+        chunk = max(1, CHUNK_ELEMENTS//(nsample*self.energy.size))
+        for start in range(0, self.ndata, chunk):
+            stop = min(start + chunk, self.ndata)
+            values = np.repeat(self.values[None, :, start:stop], nsample, axis=0)
+            part = varying[:, start:stop]
+            values[:, part] = draws[:, self.sources[:, start:stop][part]]
+            curves = scf_curve(self.energy, *np.moveaxis(values[..., None], 1, 0))
+            bands[:, start:stop] = np.percentile(curves, percents, axis=0)
+        return bands.reshape(len(BAND_SIGMAS), 2, self.ndata, self.energy.size)
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+
+import glob
+import gzip
+import inspect
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import List, Tuple
+
+import numpy as np
+from astropy.io import fits
+
+from ..util.common import Common
+from ..util.error import InvalidInputError
+
+
+EXTNAME = 'EVENTS'
+CHUNK_SIZE = 1000000 # rows of event table read at once
+SKY_COLUMNS = ('X', 'Y')
+
+
+def unfiltered_event_files(directory:str, xis:str) -> List[str]:
+    """Unfiltered event files of the XIS sensor in an observation directory."""
+    seq = os.path.basename(os.path.abspath(directory))
+    return sorted(glob.glob(os.path.join(
+        directory, 'xis', 'event_uf', f'ae{seq}xi{xis}_?_?x??????_uf.evt*')))
+
+
+def sky_image_header(evtfile:str) -> Tuple[Tuple[int, int, int, int], fits.Header]:
+    """Range of X and Y from TLMIN/TLMAX of the event table and the sky WCS of the image."""
+    with fits.open(evtfile, memmap=True) as hdul:
+        columns = hdul[EXTNAME].columns
+        evthead = hdul[EXTNAME].header
+        index = [columns.names.index(name)+1 for name in SKY_COLUMNS]
+        xmin, xmax, ymin, ymax = (
+            int(evthead[f'{key}{i}']) for i in index for key in ('TLMIN', 'TLMAX'))
+        header = fits.Header()
+        for axis, (i, lower) in enumerate(zip(index, (xmin, ymin)), start=1):
+            for key, wcs in (('TCTYP', 'CTYPE'), ('TCRVL', 'CRVAL'), ('TCDLT', 'CDELT')):
+                if f'{key}{i}' in evthead:
+                    header[f'{wcs}{axis}'] = evthead[f'{key}{i}']
+            if f'TCRPX{i}' in evthead:
+                header[f'CRPIX{axis}'] = evthead[f'TCRPX{i}'] - lower + 1
+            header[f'LTV{axis}'] = (1-lower, f'offset of physical {SKY_COLUMNS[axis-1]}')
+            header[f'LTM{axis}_{axis}'] = 1.0
+        for key in ('TELESCOP', 'INSTRUME', 'OBJECT', 'OBS_ID', 'EXPOSURE'):
+            if key in evthead:
+                header[key] = evthead[key]
+    return (xmin, xmax, ymin, ymax), header
+
+
+@contextmanager
+def uncompressed(evtfile:str):
+    """Path to the event file, or to a temporary copy of a gzipped one decompressed in a stream.
+
+    astropy reads a gzipped table into memory as a whole, while it memory-maps
+    an uncompressed one, so that chunks of rows bound the memory.
+    """
+    if not evtfile.endswith('.gz'):
+        yield evtfile
+        return
+    fd, path = tempfile.mkstemp(suffix='.evt')
+    try:
+        with gzip.open(evtfile, 'rb') as fin, os.fdopen(fd, 'wb') as fout:
+            shutil.copyfileobj(fin, fout)
+        yield path
+    finally:
+        os.remove(path)
+
+
+def bin_event_file(evtfile:str, shape:Tuple[int, int], origin:Tuple[int, int],
+                   grade:Tuple[int, int]=(0, 7), chunk_size:int=CHUNK_SIZE) -> np.ndarray:
+    """Histogram X and Y of the events of the grades, reading the table chunk by chunk."""
+    ny, nx = shape
+    image = np.zeros(ny*nx, dtype=np.int64)
+    with uncompressed(evtfile) as path, fits.open(path, memmap=True) as hdul:
+        table = hdul[EXTNAME].data
+        for start in range(0, len(table), chunk_size):
+            chunk = table[start:start+chunk_size]
+            x = chunk['X'].astype(np.int64) - origin[0]
+            y = chunk['Y'].astype(np.int64) - origin[1]
+            selected = ((chunk['GRADE'] >= grade[0]) & (chunk['GRADE'] <= grade[1])
+                        & (x >= 0) & (x < nx) & (y >= 0) & (y < ny))
+            image += np.bincount(y[selected]*nx + x[selected], minlength=ny*nx)
+    return image.reshape(shape)
+
+
+class EventImageBinner(Common):
+    """Make an image of events summed over event files, one worker process per file."""
+
+    def __init__(self, evtfiles:List[str], grade:Tuple[int, int]=(0, 7),
+                 chunk_size:int=CHUNK_SIZE, workers:int=None, loglv:int=1) -> None:
+        super().__init__(loglv)
+        if not evtfiles:
+            raise InvalidInputError('No event file is given.')
+        for f in evtfiles:
+            if not os.path.exists(f):
+                raise FileNotFoundError(f'No such event file: {f}')
+        self.evtfiles = evtfiles
+        self.grade = grade
+        self.chunk_size = chunk_size
+        self.workers = workers
+
+    def bin(self) -> Tuple[np.ndarray, fits.Header]:
+        self.debug('START', inspect.currentframe())
+        (xmin, xmax, ymin, ymax), header = sky_image_header(self.evtfiles[0])
+        shape, origin = (ymax-ymin+1, xmax-xmin+1), (xmin, ymin)
+        nfile = len(self.evtfiles)
+        arguments = (self.evtfiles, [shape]*nfile, [origin]*nfile,
+                     [self.grade]*nfile, [self.chunk_size]*nfile)
+        if self.workers == 1 or nfile == 1:
+            image = sum(map(bin_event_file, *arguments))
+        else:
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                image = sum(executor.map(bin_event_file, *arguments))
+        header['GRADE'] = (f'{self.grade[0]}-{self.grade[1]}', 'selected grades')
+        self.debug(f'{int(image.sum())} events from {nfile} event file(s)')
+        self.debug('END', inspect.currentframe())
+        return image.astype(np.int32), header
+
+    def write(self, output:str, clobber:bool=False) -> None:
+        image, header = self.bin()
+        fits.PrimaryHDU(data=image, header=header).writeto(output, overwrite=clobber)
+        self.info(f'Make image: {output}')
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+
+import gzip
+import inspect
+import os
+import shutil
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple
+
+import numpy as np
+from astropy.io import fits
+
+from ..util.common import CACHE_DIR, Common
+from ..util.error import InvalidInputError
+from ..util.parse import get_file_prefix
+from .densitymap import PSF_SCALE, DensityMap
+from .event import CHUNK_SIZE, EXTNAME
+from .model import energy_event_density_curve as scf_curve
+
+
+PI_COLUMN = 'PI'
+
+
+def scf_gain(density:np.ndarray, C:float, epsilon:float) -> np.ndarray:
+    """Ratio of the observed energy to the true one at the event density."""
+    return scf_curve(density, 1.0, C, epsilon)
+
+
+def correct_pi(pi:np.ndarray, gain:np.ndarray, rng:np.random.Generator, pi_max:int) -> np.ndarray:
+    """Divide the energy drawn uniformly within the PI channel by the gain and bin it again."""
+    corrected = np.floor((pi + rng.random(pi.shape))/gain)
+    return np.clip(corrected, 0, pi_max).astype(pi.dtype)
+
+
+def correct_event_chunk(evtfile:str, start:int, stop:int, density_map:DensityMap, C:float, epsilon:float,
+                        pi_max:int, seed:np.random.SeedSequence) -> np.ndarray:
+    """Corrected PI of the rows from start to stop of the event table."""
+    with fits.open(evtfile, memmap=True) as hdul:
+        chunk = hdul[EXTNAME].data[start:stop]
+        density = density_map.density(chunk['X'], chunk['Y'])
+        pi = np.array(chunk[PI_COLUMN])
+    return correct_pi(pi, scf_gain(density, C, epsilon), np.random.default_rng(seed), pi_max)
+
+
+class EventGainCorrect(Common):
+    """Correct PI of each event for the SCF effect at the event density of its pixel in the density map.
+
+    The event table is copied to the output and its PI column is rewritten
+    chunk by chunk, with chunks corrected in worker processes. The map should
+    be smoothed with the kernel and the scale that the QDP was made with,
+    which are the same by default.
+    """
+
+    def __init__(self, image:str, C:float, epsilon:float, nframe:float, seed:int=None,
+                 kernel:str='gaussian', scale:float=PSF_SCALE, chunk_size:int=CHUNK_SIZE, workers:int=None,
+                 cache_dir:str=CACHE_DIR, clobber:bool=False, loglv:int=1) -> None:
+        super().__init__(loglv)
+        if not 0.0 <= C < 1.0:
+            raise InvalidInputError('C should be in [0, 1).')
+        if scale <= 0.0:
+            # counts of a single pixel are mostly 0 or 1 in a frame-averaged image
+            self.warning('Event density of each pixel is not smoothed, which is dominated by the Poisson noise.')
+        self.image = image
+        self.C = C
+        self.epsilon = epsilon
+        self.seed = seed
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self.clobber = clobber
+        # workers read the map cached by the parent
+        self.density_map = DensityMap(image, nframe, kernel=kernel, scale=scale, cache_dir=cache_dir)
+
+    def copy_event_file(self, input:str, output:str) -> None:
+        """Copy the input to the output uncompressed, so that PI is rewritten in place."""
+        if not os.path.exists(input):
+            raise FileNotFoundError(f'No such event file: {input}')
+        if output.endswith('.gz'):
+            raise InvalidInputError(f'Output event file should not be compressed: {output}')
+        if os.path.exists(output) and not self.clobber:
+            raise FileExistsError(f'{output} already exists.')
+        opener = gzip.open if input.endswith('.gz') else open
+        with opener(input, 'rb') as fin, open(output, 'wb') as fout:
+            shutil.copyfileobj(fin, fout)
+
+    def correct(self, input:str, output:str) -> None:
+        self.debug('START', inspect.currentframe())
+        self.copy_event_file(input, output)
+        with fits.open(output, mode='update', memmap=True) as hdul:
+            events = hdul[EXTNAME]
+            if PI_COLUMN not in events.columns.names:
+                raise InvalidInputError(f'{PI_COLUMN} column is not found in {input}')
+            index = events.columns.names.index(PI_COLUMN) + 1
+            pi_max = int(events.header.get(f'TLMAX{index}', 4095))
+            nrow = len(events.data)
+            ranges = [(start, min(start+self.chunk_size, nrow)) for start in range(0, nrow, self.chunk_size)]
+            seeds = np.random.SeedSequence(self.seed).spawn(len(ranges))
+            arguments = [(output, start, stop, self.density_map, self.C, self.epsilon, pi_max, seed)
+                         for (start, stop), seed in zip(ranges, seeds)]
+            column = events.data[PI_COLUMN]
+            for (start, stop), pi in zip(ranges, self.map_chunks(arguments)):
+                column[start:stop] = pi
+            events.header['SCFCOR'] = (True, 'PI is corrected for the SCF effect')
+            events.header['SCFC'] = (self.C, 'C of the SCF curve')
+            events.header['SCFEPS'] = (self.epsilon, 'epsilon of the SCF curve')
+            events.header['SCFIMAGE'] = (os.path.basename(self.image), 'image of the event density')
+            events.header['SCFKERN'] = (self.density_map.kernel, 'kernel smoothing the image')
+            events.header['SCFSCALE'] = (self.density_map.scale, '[pixel] scale of the kernel')
+            self.debug(f'{nrow} events in {len(ranges)} chunk(s)')
+        self.info(f'{output} is generated')
+        self.debug('END', inspect.currentframe())
+
+    def map_chunks(self, arguments:List[Tuple]):
+        """Corrected PI of the chunks in order, keeping a bounded number of chunks in flight."""
+        if self.workers == 1 or len(arguments) == 1:
+            for args in arguments:
+                yield correct_event_chunk(*args)
+            return
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            window = 2*(self.workers or os.cpu_count() or 1)
+            pending = deque()
+            for args in arguments:
+                pending.append(executor.submit(correct_event_chunk, *args))
+                if len(pending) >= window:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def correct_multiple(self, input_list:List[str], output_list:List[str]) -> None:
+        for input, output in zip(input_list, output_list):
+            self.correct(input, output)
+
+    @staticmethod
+    def default_output(input:str) -> str:
+        prefix = get_file_prefix(input[:-3] if input.endswith('.gz') else input)
+        return os.path.join(os.path.dirname(input), f'{prefix}_cor.evt')
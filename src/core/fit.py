@@ -1,22 +1,91 @@
 # -*- coding: utf-8 -*-
 
+import copy
 import inspect
+import json
 import os
+import re
 import sys
 from typing import Dict, List, Tuple, Union
 from abc import abstractmethod, ABCMeta
 
 import lmfit as lf
 import numpy as np
-from matplotlib import pyplot as plt
-from matplotlib import ticker
+from scipy import optimize, sparse
 
 from ..util.common import Common
 from ..util.error import InsufficientInputError, InvalidInputError
 from ..util.object import ObjectLikeDict
 from ..util.parse import get_file_prefix
-from .plot import DPI, SimplePlot
+from ..util.profile import PROFILER, stage, timed
+from .plot import DPI, SimplePlot, pyplot
 from .model import energy_event_density_curve as scf_curve
+from .model import energy_event_density_curve_jacobian as scf_jacobian
+from .resample import ResampleResult, resample
+from .cache import FitCache, content_key
+from .evaluation import BAND_MODES, BAND_SIGMAS, FitEvaluation
+from .qdp import read_qdp_file, write_qdp_file
+from .tie import tie_sources
+
+
+def tied_source(parameters:lf.Parameters, name:str) -> str:
+    """Name of the parameter that the parameter is tied to by its expr, or the parameter itself."""
+    expr = parameters[name].expr
+    if expr is not None and expr.strip() in parameters:
+        return expr.strip()
+    return name
+
+
+def has_analytic_jacobian(parameters:lf.Parameters) -> bool:
+    """Whether every constraint is a plain tie to another parameter, which the analytic Jacobian supports."""
+    return all(p.expr is None or p.expr.strip() in parameters for p in parameters.values())
+
+
+def read_joint_state(path:str) -> Dict:
+    """Read the joint solution of Et, C and epsilon of each QDP file saved by write_joint_state.
+
+    C and epsilon saved as single values by older versions are taken as
+    those of all the QDP files.
+    """
+    with open(path, 'r') as f:
+        state = json.load(f)
+    if not {'C', 'epsilon', 'Et'} <= set(state):
+        raise InvalidInputError(f'{path} should have C, epsilon and Et.')
+    for name in ('C', 'epsilon'):
+        if not isinstance(state[name], dict):
+            state[name] = dict((qdp, state[name]) for qdp in state['Et'])
+        if not set(state[name]) == set(state['Et']):
+            raise InvalidInputError(f'{path} should have {name} of the same QDP files as Et.')
+    return state
+
+
+def write_joint_state(path:str, C:Dict[str, float], epsilon:Dict[str, float], Et:Dict[str, float]) -> None:
+    """Write the joint solution with the values keyed by the absolute path of the QDP file."""
+    state = dict((name, dict((os.path.abspath(qdp), float(value)) for qdp, value in values.items()))
+                 for name, values in (('C', C), ('epsilon', epsilon), ('Et', Et)))
+    with open(f'{path}.{os.getpid()}', 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(f'{path}.{os.getpid()}', path)
+
+
+def joint_state_values(state:Dict, qdp:str=None) -> Dict[str, float]:
+    """Et, C and epsilon of the QDP file in the joint solution.
+
+    Without the QDP file, C and epsilon should be the same for all the QDP
+    files, e.g. shared by all the data sets, and Et is not given.
+    """
+    if qdp is not None:
+        path = os.path.abspath(qdp)
+        if path not in state['Et']:
+            raise InvalidInputError(f'{qdp} is not found in the joint solution.')
+        return dict((name, float(state[name][path])) for name in ('Et', 'C', 'epsilon'))
+    values = dict()
+    for name in ('C', 'epsilon'):
+        distinct = set(state[name].values())
+        if not len(distinct) == 1:
+            raise InvalidInputError(f'{name} differs among the QDP files of the joint solution; choose one of them.')
+        values[name] = float(distinct.pop())
+    return values
 
 
 class CurveFitParameter(object):
@@ -28,7 +97,8 @@ class CurveFitParameter(object):
         'expr': 'string'}
     MODIFIERS = (float, bool, float, float, str)
 
-    def __init__(self, name:str, value:float, min:float, max:float, vary:bool=True, expr:str=None):
+    def __init__(self, name:str, value:float, min:float=-np.inf, max:float=np.inf, vary:bool=True,
+                 expr:str=None):
         self.name = name
         self.value = value
         self.vary = vary
@@ -57,10 +127,130 @@ class CurveFitParameter(object):
     def hints(self) -> Dict:
         return dict(zip(self.properties, self.values))
 
+    @classmethod
+    def from_entry(cls, name:str, entry:str) -> 'CurveFitParameter':
+        """Make a parameter from values separated by "," in order of PROPERTIES."""
+        values = tuple(
+            modifier(v.strip()) if modifier is str else modifier(float(v.strip()))
+            for v, modifier in zip(entry.split(','), cls.MODIFIERS))
+        return cls(name=name, **dict(zip(cls.PROPERTIES.keys(), values)))
+
+
+class SeparableCurveSolver(object):
+    """Fit energy_event_density_curve without initial values by variable projection.
+
+    For a fixed epsilon the model is linear in Et and Et*C, so that they are
+    solved in closed form by weighted least squares. The chi-square is then
+    minimized over epsilon on a grid followed by a bounded scalar refinement.
+    Data sets fitted jointly share C and epsilon, and only Et is linear; C is
+    searched on a grid together with epsilon in that case.
+    """
+    EPSILON_GRID = np.logspace(-1, 6, 281)
+    C_GRID = np.linspace(0.0, 1.0, 1001)[:-1]
+
+    def __init__(self, epsilon_grid:np.ndarray=None, C_grid:np.ndarray=None) -> None:
+        self.epsilon_grid = self.EPSILON_GRID if epsilon_grid is None else np.asarray(epsilon_grid)
+        self.C_grid = self.C_GRID if C_grid is None else np.asarray(C_grid)
+
+    @staticmethod
+    def linear_solve(E:np.ndarray, y:np.ndarray, weight:np.ndarray, epsilon:np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Solve y = a + b*exp(-epsilon*E) for each epsilon, and return a, b and chi-square."""
+        g = np.exp(-np.asarray(epsilon)[..., None]*E)
+        s, sg, sgg = weight.sum(), (weight*g).sum(-1), (weight*g*g).sum(-1)
+        sy, sgy = (weight*y).sum(), (weight*g*y).sum(-1)
+        det = s*sgg - sg**2
+        a = (sgg*sy - sg*sgy)/det
+        b = (s*sgy - sg*sy)/det
+        chisqr = (weight*(y - a[..., None] - b[..., None]*g)**2).sum(-1)
+        return a, b, chisqr
+
+    def solve(self, E:np.ndarray, y:np.ndarray, sigma:np.ndarray) -> Tuple[Dict[str, float], float]:
+        """Return the best-fit values of Et, C and epsilon and the chi-square."""
+        weight = sigma**(-2)
+        chisqr = self.linear_solve(E, y, weight, self.epsilon_grid)[2]
+        i = int(np.nanargmin(chisqr))
+        bounds = np.log(self.epsilon_grid[[max(i-1, 0), min(i+1, self.epsilon_grid.size-1)]])
+        refined = optimize.minimize_scalar(
+            lambda log_epsilon: self.linear_solve(E, y, weight, np.exp(log_epsilon))[2],
+            bounds=tuple(bounds), method='bounded')
+        epsilon = float(np.exp(refined.x))
+        a, b, chisqr = self.linear_solve(E, y, weight, epsilon)
+        return dict(Et=float(a), C=float(-b/a), epsilon=epsilon), float(chisqr)
+
+    @staticmethod
+    def joint_chisqr(sums:Tuple[np.ndarray, ...], C:np.ndarray) -> np.ndarray:
+        """Chi-square summed over data sets with Et solved for each data set."""
+        syy, syh0, syh1, shh0, shh1, shh2 = (np.expand_dims(v, -1) for v in sums)
+        syh = syh0 - C*syh1
+        shh = shh0 - 2*C*shh1 + C**2*shh2
+        return (syy - syh**2/shh).sum(-2)
+
+    @staticmethod
+    def joint_sums(E:np.ndarray, y:np.ndarray, weight:np.ndarray, member:np.ndarray,
+                   epsilon:np.ndarray) -> Tuple[np.ndarray, ...]:
+        """Weighted sums per data set, with which the chi-square is a rational function of C."""
+        g = np.exp(-np.asarray(epsilon)[..., None]*E)
+        return ((weight*y*y) @ member, (weight*y) @ member, (weight*y*g) @ member,
+                weight @ member, (weight*g) @ member, (weight*g*g) @ member)
+
+    def solve_joint(self, E:np.ndarray, y:np.ndarray, sigma:np.ndarray, index:np.ndarray,
+                    ndata:int) -> Tuple[np.ndarray, float, float, float]:
+        """Return Et of each data set, the shared C and epsilon, and the chi-square."""
+        weight = sigma**(-2)
+        member = np.zeros((E.size, ndata))
+        member[np.arange(E.size), index] = 1.0
+        sums = self.joint_sums(E, y, weight, member, self.epsilon_grid)
+        chisqr = self.joint_chisqr(sums, self.C_grid)
+        i, j = np.unravel_index(np.nanargmin(chisqr), chisqr.shape)
+
+        def objective(x):
+            sums = self.joint_sums(E, y, weight, member, np.exp(x[0]))
+            return float(self.joint_chisqr(sums, np.array([x[1]]))[0])
+        refined = optimize.minimize(
+            objective, x0=[np.log(self.epsilon_grid[i]), self.C_grid[j]], method='Nelder-Mead')
+        log_epsilon, C = refined.x if refined.fun <= chisqr[i, j] else (np.log(self.epsilon_grid[i]), self.C_grid[j])
+        epsilon = float(np.exp(log_epsilon))
+        syy, syh0, syh1, shh0, shh1, shh2 = self.joint_sums(E, y, weight, member, epsilon)
+        Et = (syh0 - C*syh1)/(shh0 - 2*C*shh1 + C**2*shh2)
+        return Et, float(C), epsilon, objective([log_epsilon, C])
+
+
+class CachedFitResult(object):
+    """Fitting result restored from the cache, with the attributes of lmfit results used by the fit classes."""
+
+    def __init__(self, record:Dict[str, np.ndarray]) -> None:
+        self.params = lf.Parameters().loads(str(record['params']))
+        self.var_names = [str(name) for name in record['var_names']]
+        self.success = bool(record['success'])
+        self.message = str(record['message'])
+        self.chisqr = float(record['chisqr'])
+        self.nfree = int(record['nfree'])
+        self.redchi = float(record['redchi'])
+        self.covar = record['covar'] if record['covar'].size else None
+        self.best_fit = record['best_fit']
+        self.report = str(record['report'])
+
+    @property
+    def best_values(self) -> Dict[str, float]:
+        return self.params.valuesdict()
+
+    def fit_report(self) -> str:
+        return self.report
+
+    @staticmethod
+    def record(result:Union[lf.model.ModelResult, lf.minimizer.MinimizerResult], report:str) -> Dict[str, np.ndarray]:
+        """Arrays of the result to be stored in the cache."""
+        return dict(
+            params=np.array(result.params.dumps()), var_names=np.array(result.var_names, dtype=str),
+            success=np.array(result.success), message=np.array(str(result.message)),
+            chisqr=np.array(result.chisqr), nfree=np.array(result.nfree), redchi=np.array(result.redchi),
+            covar=np.zeros((0, 0)) if result.covar is None else np.asarray(result.covar),
+            best_fit=np.asarray(getattr(result, 'best_fit', np.zeros(0))), report=np.array(report))
+
 
 class CurveFitFactory(object):
     @classmethod
-    def get_instance(cls, qdp_list:List[str], **args):
+    def get_instance(cls, qdp_list:List[str], **args) -> Union['SingleCurveFit', 'MultipleCurveFit']:
         for f in qdp_list:
             if not os.path.exists(f):
                 raise FileNotFoundError(f'No such qdp file: {f}')
@@ -75,10 +265,166 @@ class AbstractCurveFit(object, metaclass=ABCMeta):
     IMAGE_FILE_DPI = DPI
     DUMMY_DATA_SIZE = 500
     DUMMY_ENERGY = np.logspace(-5, -1, DUMMY_DATA_SIZE)
+    GUESS_BOUNDS = {
+        'Et': dict(min=0.0, max=np.inf),
+        'C': dict(min=0.0, max=1.0),
+        'epsilon': dict(min=0.0, max=np.inf)}
 
     def __init__(self):
         pass # nothing to do
-    
+
+    @abstractmethod
+    def initial_guess(self) -> Dict[str, Dict]:
+        pass
+
+    def guess_hints(self, guess:Dict[str, Dict]=None) -> None:
+        """Fill the hints with the initial guess, keeping properties given by the hints."""
+        hints = self.hints or dict()
+        guess = self.initial_guess() if guess is None else guess
+        for name, hint in guess.items():
+            base = re.sub(r'_\d+$', '', name)
+            hint.update(hints.get(base, dict()))
+            hint.update(hints.get(name, dict()))
+        for name, hint in hints.items():
+            guess.setdefault(name, hint)
+        self.hints = guess
+        if self.enabled(0):
+            self.debug(f'Hints with initial guess: {self.hints}')
+
+    def request_parameter(self, name:str, prompt:str, keys:Tuple[str, ...]) -> CurveFitParameter:
+        """Take the parameter from the hint of the first key found, or from the standard input without hints."""
+        if self.hints is None:
+            print(prompt, end=' >>> ')
+            return CurveFitParameter.from_entry(name, input())
+        for key in keys:
+            if key in self.hints:
+                return CurveFitParameter(name=name, **self.hints[key])
+        raise InsufficientInputError(f'Hint of parameter {name} is not found.')
+
+    def summary(self) -> Dict:
+        """Best-fit values, errors and statistics of the varying parameters."""
+        summary = dict(success=self.result.success, chisqr=self.result.chisqr,
+                       nfree=self.result.nfree, redchi=self.result.redchi)
+        for name in self.result.var_names:
+            summary[name] = self.result.params[name].value
+            summary[f'{name}_err'] = self.result.params[name].stderr
+        if getattr(self, 'resample_result', None) is not None:
+            for name, (_, p16, _, p84, _) in self.resample_result.percentiles.items():
+                summary[f'{name}_p16'], summary[f'{name}_p84'] = float(p16), float(p84)
+        return summary
+
+    def resolved_solver(self) -> str:
+        """Method that minimizes the chi-square."""
+        return 'leastsq'
+
+    def cache_key(self, parameters:lf.Parameters) -> str:
+        """Hash of the data, the parameters before fitting, the model and the solver."""
+        code = scf_curve.__code__
+        properties = repr([(name, float(p.value), bool(p.vary), float(p.min), float(p.max), p.expr)
+                           for name, p in parameters.items()])
+        return content_key(type(self).__name__, lf.__version__, code.co_code, repr(code.co_consts),
+                           self.xd, self.xe, self.yd, self.ye, self.index, properties, self.resolved_solver())
+
+    @timed('cache')
+    def load_result(self, key:str) -> bool:
+        """Restore the result of the same fit from the cache instead of minimizing."""
+        if self.cache is None:
+            return False
+        record = self.cache.load(key)
+        if record is None:
+            self.debug(f'No cached result for {key}')
+            return False
+        self.result = CachedFitResult(record)
+        self.info(f'Fitting result was restored from {self.cache.path(key)}')
+        return True
+
+    @timed('cache')
+    def store_result(self, key:str, report:str) -> None:
+        if self.cache is not None:
+            self.cache.store(key, CachedFitResult.record(self.result, report))
+
+    def set_band(self, band:str, band_nsample:int=1000, seed:int=None) -> None:
+        """Bands of the best-fit curves by analytic propagation or sampling of the covariance, or None."""
+        if band is not None and band not in BAND_MODES:
+            raise InvalidInputError('Band should be one of ' + ', '.join(BAND_MODES))
+        self.band = band
+        self.band_nsample = band_nsample
+        self.seed = seed
+
+    def parameter_values(self, parameters:lf.Parameters) -> np.ndarray:
+        """Values of model parameters in shape of (number of parameters, number of data sets)."""
+        values = parameters.valuesdict()
+        return np.array([[values[name] for name in names] for names in self.param_table])
+
+    def evaluate(self) -> FitEvaluation:
+        """Best-fit curves and residuals shared by the result QDP and the plot, evaluated on first use."""
+        params, var_names = self.result.params, list(self.result.var_names)
+        sources = [[
+            var_names.index(tied_source(params, name)) if tied_source(params, name) in var_names else -1
+            for name in names] for names in self.param_table]
+        self.evaluation = FitEvaluation(
+            self.parameter_values(params), self.DUMMY_ENERGY, self.xd, self.yd, self.offsets,
+            covariance=self.result.covar, sources=sources)
+        return self.evaluation
+
+    def result_bands(self) -> np.ndarray:
+        """Bounds of the bands of BAND_SIGMAS around the best-fit curves, or None without them."""
+        if self.band is None:
+            return None
+        if self.evaluation.covariance is None:
+            self.warning('No band is drawn since the covariance of the parameters is not estimated.')
+            self.band = None
+            return None
+        return self.evaluation.bands(self.band, self.band_nsample, self.seed)
+
+    def result_block(self, n:int, level:int) -> np.ndarray:
+        """Best-fit curve of the n-th data set with the half width of the band of BAND_SIGMAS[level] as the error."""
+        bands = self.result_bands()
+        curve = self.evaluation.curve(n)
+        error = np.zeros(self.DUMMY_DATA_SIZE) if bands is None else 0.5*(bands[level, 1, n] - bands[level, 0, n])
+        return np.column_stack((self.DUMMY_ENERGY, np.zeros(self.DUMMY_DATA_SIZE), curve, error))
+
+    def plot_bands(self, ax, n:int, color:str) -> None:
+        bands = self.result_bands()
+        if bands is None:
+            return
+        for level in reversed(range(len(BAND_SIGMAS))):
+            ax.fill_between(self.DUMMY_ENERGY, bands[level, 0, n], bands[level, 1, n],
+                            color=color, alpha=0.15*(len(BAND_SIGMAS) - level), lw=0.0)
+
+    @abstractmethod
+    def resample_names(self) -> List[str]:
+        pass
+
+    @timed('resample')
+    def resample(self, nsample:int, mode:str='montecarlo', seed:int=None, workers:int=1) -> ResampleResult:
+        """Estimate the distribution of the parameters by refitting data sets perturbed within xe and ye.
+
+        The perturbed data sets are fitted as a batch starting from the best-fit values.
+        """
+        self.debug('START', inspect.currentframe())
+        params = self.result.params
+        names = self.resample_names()
+        for name in names:
+            if params[name].expr is not None:
+                raise InvalidInputError(f'Resampling does not support the constraint of {name}.')
+        self.resample_result = resample(
+            self.xd, self.xe, self.yd, self.ye, self.index, self.ndata,
+            start=np.array([params[name].value for name in names]),
+            free=np.array([params[name].vary for name in names]),
+            lower=np.array([params[name].min for name in names]),
+            upper=np.array([params[name].max for name in names]),
+            names=names, nsample=nsample, mode=mode, seed=seed, workers=workers)
+        report = self.resample_result.report()
+        for line in report.splitlines():
+            self.info(line)
+        with open(self.log_file, 'a') as log:
+            log.write(report)
+            log.write('\n')
+        self.info(f'Resampling results were recorded to {self.log_file}')
+        self.debug('END', inspect.currentframe())
+        return self.resample_result
+
     @abstractmethod
     def entry_parameter(self):
         pass
@@ -95,41 +441,71 @@ class AbstractCurveFit(object, metaclass=ABCMeta):
     def plot(self):
         pass
 
+    def result_file(self, qdp:str, ext:str) -> str:
+        """Result file of the QDP file in the output directory, or in the current directory without it."""
+        return os.path.join(self.output_dir or '', f'{get_file_prefix(qdp)}_result.{ext}')
+
+    @property
+    def image_file(self) -> str:
+        return self.result_file(list(self.qdp_header)[0], self.IMAGE_FILE_TYPE)
+
+    def show_or_save(self, spl:SimplePlot) -> None:
+        """Save the figure when requested, and show it only in the interactive mode."""
+        plt = pyplot(self.plot_flag)
+        if self.save_flag:
+            spl.fig.savefig(self.image_file, dpi=self.IMAGE_FILE_DPI)
+            self.info(f'{self.image_file} is generated')
+        if self.plot_flag:
+            plt.pause(1.0)
+            plt.show()
+        else:
+            plt.close(spl.fig)
+
     @abstractmethod
     def create_result_qdp(self):
         pass
 
 class SingleCurveFit(Common, AbstractCurveFit):
-    def __init__(self, qdp:str, log_file:str, plot_flag:bool=True, loglv:int=1) -> None:
+    def __init__(self, qdp:str, log_file:str, plot_flag:bool=True, loglv:int=1, hints:Dict[str, Dict]=None,
+                 guess:bool=False, cache_dir:str=None, save_flag:bool=False, band:str='analytic',
+                 band_nsample:int=1000, seed:int=None, output_dir:str=None) -> None:
         super().__init__(loglv)
         self.plot_flag = plot_flag
+        self.save_flag = save_flag
+        self.output_dir = output_dir
         self.log_file = log_file
+        self.hints = hints
+        self.guess = guess
+        self.cache = None if cache_dir is None else FitCache(cache_dir)
+        self.set_band(band, band_nsample, seed)
         self.xd, self.xe, self.yd, self.ye = self.read_qdp(qdp)
+        self.ndata = 1
+        self.index = np.zeros(self.xd.size, dtype=int)
+        self.offsets = np.array([0, self.xd.size])
         self.scf_model = lf.Model(func=scf_curve, independent_vars=['E'])
+        self.param_table = [[name] for name in self.scf_model.param_names]
 
-    def read_qdp(self, qdp:str) -> np.ndarray:
-        with open(qdp, 'r') as f:
-            raw_data = f.read().splitlines()
-        skiprows = raw_data.index('!')+1
-        self.raw_data = {qdp: raw_data}
-        return np.loadtxt(qdp, dtype=float, delimiter=' ', skiprows=skiprows, unpack=True)
+    @timed('read_qdp')
+    def read_qdp(self, qdp:str) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Read the first block of the QDP, keeping the header commands for the result."""
+        data = read_qdp_file(qdp)
+        self.qdp_header = {qdp: data.commands}
+        return data.curve()
 
     def entry_parameter(self) -> List[CurveFitParameter]:
         param_list = list()
+        if self.guess:
+            self.guess_hints()
         try:
-            self.info('Input parameters')
-            self.info('Enter the values separated by ","')
-            self.info(', '.join(
-                [f'{p} ({k})' for p, k in CurveFitParameter.PROPERTIES.items()]))
+            if self.hints is None:
+                self.info('Input parameters')
+                self.info('Enter the values separated by ","')
+                self.info(', '.join(
+                    [f'{p} ({k})' for p, k in CurveFitParameter.PROPERTIES.items()]))
             for name in self.scf_model.param_names:
-                print(f'{name}', end=' >>> ')
-                entry = input()
-                values = tuple(
-                    modifier(float(v.strip())) for v, modifier in zip(
-                        entry.split(','), CurveFitParameter.MODIFIERS))
-                params = dict(zip(CurveFitParameter.PROPERTIES.keys(), values))
-                param_list.append(CurveFitParameter(name=name, **params))
-            print('\n')
+                param_list.append(self.request_parameter(name, f'{name}', (name,)))
+            if self.hints is None:
+                print('\n')
         except ValueError:
             raise InvalidInputError('Input parameter is invalid.')
         except TypeError:
@@ -141,29 +517,69 @@ class SingleCurveFit(Common, AbstractCurveFit):
         else:
             return param_list
 
+    @timed('initial_guess')
+    def initial_guess(self) -> Dict[str, Dict]:
+        values, chisqr = SeparableCurveSolver().solve(self.xd, self.yd, self.ye)
+        self.debug(f'Initial guess: {values} (chi-square = {chisqr})')
+        return dict((name, dict(value=value, **self.GUESS_BOUNDS[name])) for name, value in values.items())
+
+    def resample_names(self) -> List[str]:
+        return list(self.scf_model.param_names)
+
+    @timed('set_parameter')
     def set_parameter(self) -> None:
         param_list = self.entry_parameter()
         for param in param_list:
             self.scf_model.set_param_hint(param.name, **param.hints)
         self.debug(self.scf_model.param_hints)
 
+    def objective(self, parameters:lf.Parameters, E:np.ndarray) -> np.ndarray:
+        """Calculate weighted residual of the data set."""
+        return (self.yd - self.scf_model.eval(parameters, E=E))/self.ye
+
+    def jacobian(self, parameters:lf.Parameters, E:np.ndarray) -> np.ndarray:
+        """Calculate derivatives of the objective by the varying parameters."""
+        PROFILER.count('njev')
+        var_names = [name for name, param in parameters.items() if param.vary]
+        partial = -scf_jacobian(E,
+            **dict((name, parameters[name].value) for name in self.scf_model.param_names))/self.ye
+        jacobian = np.zeros((len(var_names), E.size))
+        for name, partial_name in zip(self.scf_model.param_names, partial):
+            source = tied_source(parameters, name)
+            if source in var_names:
+                jacobian[var_names.index(source)] += partial_name
+        return jacobian
+
     def fit(self) -> None:
         self.debug('START', inspect.currentframe())
         self.set_parameter()
-        self.result = self.scf_model.fit(
-            E=self.xd, data=self.yd, weights=self.ye**(-1), method='leastsq')
-        self.debug(self.result.best_values)
+        parameters = self.scf_model.make_params()
+        key = self.cache_key(parameters)
+        if self.load_result(key):
+            report = self.result.fit_report()
+        else:
+            fit_kws = dict()
+            if has_analytic_jacobian(parameters):
+                fit_kws = dict(Dfun=self.jacobian, col_deriv=True)
+            with stage('minimize'):
+                self.result = lf.minimize(
+                    fcn=self.objective, params=parameters, kws={'E':self.xd}, method='leastsq', **fit_kws)
+            PROFILER.count('nfev', self.result.nfev)
+            report = lf.fit_report(self.result)
+            self.store_result(key, report)
+        self.evaluate()
+        self.debug(self.result.params.valuesdict())
 
         self.info('BEST FIT VALUES')
         for name in self.scf_model.param_names:
             self.info(f'parameter of {name}')
             self.info(
-                f'  {self.result.result.params[name].value} +- {self.result.result.params[name].stderr}')
+                f'  {self.result.params[name].value} +- {self.result.params[name].stderr}')
 
-        with open(self.log_file, 'w') as log:
+        with stage('write_log'), open(self.log_file, 'w') as log:
             log.write(
                 '--------------------------------------------------------------------\n')
-            log.write(self.result.fit_report())
+            log.write(report)
             log.write('\n')
             log.write(
                 '--------------------------------------------------------------------\n')
@@ -173,46 +589,38 @@ class SingleCurveFit(Common, AbstractCurveFit):
             log.write('\n')
         self.info(f'Fitting results were recorded to {self.log_file}')
         self.create_result_qdp()
-        if self.plot_flag:
+        if self.plot_flag or self.save_flag:
             self.plot()
         self.debug('END', inspect.currentframe())
 
-    @property
-    def result_curve(self):
-        return scf_curve(E=self.DUMMY_ENERGY, **self.result.best_values)
-
+    @timed('write_result_qdp')
     def create_result_qdp(self) -> None:
         self.debug('START', inspect.currentframe())
-        raw_name = list(self.raw_data.keys())[0]
-        raw_data = list(self.raw_data.values())[0]
-        qdp_file = f'{get_file_prefix(raw_name)}_result.qdp'
-
-        raw_data.append('NO NO NO NO')
-        header = '\n'.join(raw_data)
-        result = np.array([
-            self.DUMMY_ENERGY,
-            np.zeros(self.DUMMY_DATA_SIZE),
-            self.result_curve,
-            np.zeros(self.DUMMY_DATA_SIZE)])
-        np.savetxt(fname=qdp_file, X=result.T,
-                   delimiter=' ', newline='\n', header=header, comments='')
+        qdp_name, commands = list(self.qdp_header.items())[0]
+        qdp_file = self.result_file(qdp_name, 'qdp')
+        data = np.column_stack((self.xd, self.xe, self.yd, self.ye))
+        blocks = [self.result_block(0, level) for level in range(len(BAND_SIGMAS))]
+        write_qdp_file(qdp_file, [data] + blocks, commands)
         self.info(f'{qdp_file} is generated')
         self.debug('END', inspect.currentframe())
 
+    @timed('plot')
     def plot(self) -> None:
         self.debug('START', inspect.currentframe())
+        from matplotlib import ticker
         spl = SimplePlot(configure=True,
                          figsize=(8, 6), nrows=2, height_ratios=[0.7, 0.3], fsize=20,
-                         left=0.15, right=0.95, bottom=0.15, top=0.9)
+                         left=0.15, right=0.95, bottom=0.15, top=0.9, interactive=self.plot_flag)
 
         # data & best-fit model
         spl.axes[0].errorbar(x=self.xd, y=self.yd, xerr=self.xe, yerr=self.ye,
                              marker=spl.marker, ms=spl.masize, fmt=spl.pltfmt,
                              color=spl.colors.orange, ecolor=spl.colors.orange,
                              capsize=0.0, elinewidth=spl.lwidth, mec=spl.colors.orange,
-                             label=f'{list(self.raw_data.keys())[0]}')
-        spl.axes[0].plot(self.DUMMY_ENERGY, self.result_curve,
+                             label=f'{list(self.qdp_header)[0]}')
+        spl.axes[0].plot(self.DUMMY_ENERGY, self.evaluation.curve(0),
                          lw=spl.lwidth, ls=':', color=spl.colors.orange)
+        self.plot_bands(spl.axes[0], 0, spl.colors.orange)
         spl.axes[0].set_ylabel('Energy (keV)', fontsize=spl.fsize)
         spl.axes[0].legend(fontsize=spl.legfsize, loc='upper left',
                            scatterpoints=1, numpoints=1, markerscale=0.7, handletextpad=0.,
@@ -225,7 +633,7 @@ class SingleCurveFit(Common, AbstractCurveFit):
 
         # residual
         spl.axes[1].errorbar(
-            x=self.xd, y=self.yd-self.result.best_fit,
+            x=self.xd, y=self.evaluation.residuals(0),
             xerr=self.xe, yerr=self.ye,
             marker=spl.marker, ms=spl.masize, fmt=spl.pltfmt,
             color=spl.colors.orange, ecolor=spl.colors.orange,
@@ -247,55 +655,83 @@ class SingleCurveFit(Common, AbstractCurveFit):
             ax.xaxis.set_major_locator(ticker.LogLocator(base=10))
             ax.yaxis.set_label_coords(-0.11, 0.5)
 
-        plt.pause(1.0)
-        plt.show()
+        self.show_or_save(spl)
 
         self.debug('END', inspect.currentframe())
 
 class MultipleCurveFit(Common, AbstractCurveFit):
-    def __init__(self, qdp:List[str], log_file:str, plot_flag:bool=True, loglv:int=1) -> None:
+    SOLVERS = ('auto', 'leastsq', 'trf')
+    SPARSE_NDATA = 20 # number of data sets from which the auto solver uses the sparse Jacobian
+
+    def __init__(self, qdp:List[str], log_file:str, plot_flag:bool=True, loglv:int=1, hints:Dict[str, Dict]=None,
+                 guess:bool=False, cache_dir:str=None, save_flag:bool=False, state_file:str=None,
+                 ties:Dict[str, str]=None, labels:Dict[str, Dict[str, str]]=None, solver:str='auto',
+                 band:str='analytic', band_nsample:int=1000, seed:int=None, output_dir:str=None) -> None:
         super().__init__(loglv)
         self.plot_flag = plot_flag
+        self.save_flag = save_flag
+        self.output_dir = output_dir
         self.log_file = log_file
+        self.hints = hints
+        self.guess = guess
+        self.cache = None if cache_dir is None else FitCache(cache_dir)
+        self.set_band(band, band_nsample, seed)
+        self.state_file = state_file
         self.ndata = len(qdp)
         self.xd, self.xe, self.yd, self.ye = self.read_multiple_qdp(qdp)
         self.scf_model = lf.Model(func=scf_curve, independent_vars=['E'])
         self.scf_model_parameters = lf.Parameters()
+        self.param_table = [
+            [f'{name}_{n}' for n in range(self.ndata)] for name in self.scf_model.param_names]
+        self.tie_source = tie_sources(qdp, self.scf_model.param_names, ties, labels)
+        if solver not in self.SOLVERS:
+            raise InvalidInputError('Solver should be one of ' + ', '.join(self.SOLVERS))
+        self.solver = solver
 
+    @timed('read_qdp')
     def read_multiple_qdp(self, qdp_list:List[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Read the data sets into flat arrays concatenated in order of the list.
+
+        Data sets may have different sizes. The n-th data set is self.slices[n] of
+        the arrays, and self.index has the number of data set of each point.
+        """
         datasets = list()
-        self.raw_data = dict()
+        self.qdp_header = dict()
         for qdp in qdp_list:
-            with open(qdp, 'r') as f:
-                raw_data: List = f.read().splitlines()
-            skiprows = raw_data.index('!')+1
-            self.raw_data[qdp] = raw_data
-
-            datasets.append(np.loadtxt(qdp, dtype=float, delimiter=' ',
-                skiprows=skiprows, unpack=True))
-        return tuple(np.array([dataset[i,:] for dataset in datasets]) for i in range(4))
+            data = read_qdp_file(qdp)
+            self.qdp_header[qdp] = data.commands
+            datasets.append(np.array(data.curve()))
+        sizes = [dataset.shape[1] for dataset in datasets]
+        self.offsets = np.concatenate(([0], np.cumsum(sizes)))
+        self.slices = [slice(start, stop) for start, stop in zip(self.offsets[:-1], self.offsets[1:])]
+        self.index = np.repeat(np.arange(len(datasets)), sizes)
+        return tuple(np.concatenate([dataset[i,:] for dataset in datasets]) for i in range(4))
 
     def entry_parameter(self) -> List[CurveFitParameter]:
         param_list = list()
+        if self.state_file is not None and os.path.exists(self.state_file):
+            self.guess_hints(self.warm_start())
+        elif self.guess:
+            self.guess_hints()
         try:
-            self.info('Input parameters')
-            self.info('Enter the values separated by ","')
-            self.info(', '.join(
-                [f'{p} ({k})' for p, k in CurveFitParameter.PROPERTIES.items()]))
-            for n, raw_name in zip(range(self.ndata), self.raw_data.keys()):
+            if self.hints is None:
+                self.info('Input parameters')
+                self.info('Enter the values separated by ","')
+                self.info(', '.join(
+                    [f'{p} ({k})' for p, k in CurveFitParameter.PROPERTIES.items()]))
+            for n, qdp_name in zip(range(self.ndata), self.qdp_header):
                 for param_name in self.scf_model.param_names:
-                    if (n > 0) & (param_name in self.scf_model.param_names[1:]):
+                    source = self.tie_source[param_name][n]
+                    if source != n:
                         param_list.append(CurveFitParameter(
-                            name=f'{param_name}_{n}', value=0, vary=False, min=0, max=1.E+10, expr=f'{param_name}_0'))
+                            name=f'{param_name}_{n}', value=0, vary=False, min=0, max=1.E+10,
+                            expr=f'{param_name}_{source}'))
                     else:
-                        print(f'{param_name}_{n} (for {raw_name})', end=' >>> ')
-                        entry = input()
-                        values = tuple(
-                            modifier(float(v.strip())) for v, modifier in zip(
-                                entry.split(','), CurveFitParameter.MODIFIERS))
-                        params = dict(zip(CurveFitParameter.PROPERTIES.keys(), values))
-                        param_list.append(CurveFitParameter(name=f'{param_name}_{n}', **params))
-            print('\n')
+                        param_list.append(self.request_parameter(
+                            f'{param_name}_{n}', f'{param_name}_{n} (for {qdp_name})',
+                            (f'{param_name}_{n}', param_name)))
+            if self.hints is None:
+                print('\n')
         except ValueError:
             raise InvalidInputError('Input parameter is invalid.')
         except TypeError:
@@ -307,6 +743,61 @@ class MultipleCurveFit(Common, AbstractCurveFit):
         else:
             return param_list
 
+    def warm_start(self) -> Dict[str, Dict]:
+        """Initial values from the previous joint solution in the state file.
+
+        Data sets in the state keep their Et, C and epsilon, and data sets
+        added to the fit take C and epsilon of the data sets they are tied to
+        (or the mean of the state without them) and Et solved in closed form.
+        Data sets only in the state are dropped.
+        """
+        state = read_joint_state(self.state_file)
+        qdp_list = [os.path.abspath(qdp) for qdp in self.qdp_header]
+        for qdp in set(state['Et']) - set(qdp_list):
+            self.info(f'{qdp} is dropped from the joint fit')
+        for qdp in qdp_list:
+            if qdp not in state['Et']:
+                self.info(f'{qdp} is added to the joint fit')
+        values = dict()
+        for name in ('C', 'epsilon'):
+            known = np.array([state[name].get(qdp, np.nan) for qdp in qdp_list], dtype=float)
+            values[name] = np.full(self.ndata, np.mean(list(state[name].values())))
+            for source in np.unique(self.tie_source[name]):
+                group = self.tie_source[name] == source
+                if np.any(np.isfinite(known[group])):
+                    values[name][group] = np.nanmean(known[group])
+        weight = self.ye**(-2)
+        shape = 1 - values['C'][self.index]*np.exp(-values['epsilon'][self.index]*self.xd)
+        Et_solved = (np.bincount(self.index, weight*self.yd*shape, self.ndata)
+                     /np.bincount(self.index, weight*shape**2, self.ndata))
+        values['Et'] = np.array([state['Et'].get(qdp, Et_solved[n]) for n, qdp in enumerate(qdp_list)], dtype=float)
+        guess = dict()
+        for name in self.scf_model.param_names:
+            for n in range(self.ndata):
+                guess[f'{name}_{n}'] = dict(value=float(values[name][n]), **self.GUESS_BOUNDS[name])
+        if self.enabled(0):
+            self.debug(f'Warm start from {self.state_file}: {guess}')
+        return guess
+
+    @timed('initial_guess')
+    def initial_guess(self) -> Dict[str, Dict]:
+        Et, C, epsilon, chisqr = SeparableCurveSolver().solve_joint(
+            self.xd, self.yd, self.ye, self.index, self.ndata)
+        if self.enabled(0):
+            self.debug(f'Initial guess: Et = {Et}, C = {C}, epsilon = {epsilon} (chi-square = {chisqr})')
+        guess = dict((f'Et_{n}', dict(value=float(value), **self.GUESS_BOUNDS['Et'])) for n, value in enumerate(Et))
+        guess['C'] = dict(value=C, **self.GUESS_BOUNDS['C'])
+        guess['epsilon'] = dict(value=epsilon, **self.GUESS_BOUNDS['epsilon'])
+        return guess
+
+    def resample_names(self) -> List[str]:
+        # Et of each data set, and C and epsilon shared by all the data sets
+        for name in self.scf_model.param_names[1:]:
+            if np.any(self.tie_source[name] != 0):
+                raise InvalidInputError(f'Resampling supports {name} shared by all the data sets only.')
+        return self.param_table[0] + [names[0] for names in self.param_table[1:]]
+
+    @timed('set_parameter')
     def set_parameter(self) -> None:
         param_list = self.entry_parameter()
         for param in param_list:
@@ -315,25 +806,136 @@ class MultipleCurveFit(Common, AbstractCurveFit):
 
     def calculate_model(self, parameters:lf.Parameters, n:int, E:np.ndarray):
         """Calculate model lineshape from parameters for data set."""
-        return scf_curve(E,
-            **dict((name, parameters[f'{name}_{n}']) for name in self.scf_model.param_names))
+        return scf_curve(E, *self.parameter_values(parameters)[:, n])
 
     def objective(self, parameters:lf.Parameters, E:np.ndarray):
-        """Calculate total residual for fits of models to several data sets."""
-        # make residual per data set
-        residual = 0.0 * self.yd
+        """Calculate weighted residual of all data sets at once."""
+        values = self.parameter_values(parameters)[:, self.index]
+        return (self.yd - scf_curve(E, *values))/self.ye
+
+    def jacobian(self, parameters:lf.Parameters, E:np.ndarray) -> np.ndarray:
+        """Calculate derivatives of the objective by the varying parameters."""
+        PROFILER.count('njev')
+        values = self.parameter_values(parameters)[:, self.index]
+        partial = -scf_jacobian(E, *values)/self.ye
+        jacobian = np.zeros((len(self.var_names), self.yd.size))
+        points = np.arange(self.yd.size)
+        # each point depends on one varying parameter per model parameter at most
+        for source, partial_name in zip(self.source_index[:, self.index], partial):
+            varying = source >= 0
+            jacobian[source[varying], points[varying]] += partial_name[varying]
+        return jacobian
+
+    def sparse_values(self, x:np.ndarray) -> np.ndarray:
+        """Values of model parameters from the varying parameters, like parameter_values."""
+        values = self.fixed_values.copy()
+        varying = self.source_index >= 0
+        values[varying] = x[self.source_index[varying]]
+        return values
+
+    def sparse_objective(self, x:np.ndarray) -> np.ndarray:
+        values = self.sparse_values(x)[:, self.index]
+        return (self.yd - scf_curve(self.xd, *values))/self.ye
+
+    def sparse_jacobian(self, x:np.ndarray) -> sparse.csr_matrix:
+        """Jacobian of sparse_objective, which has a nonzero per model parameter in each row at most."""
+        PROFILER.count('njev')
+        values = self.sparse_values(x)[:, self.index]
+        partial = -scf_jacobian(self.xd, *values)/self.ye
+        source = self.source_index[:, self.index]
+        varying = source >= 0
+        points = np.broadcast_to(np.arange(self.yd.size), source.shape)
+        return sparse.csr_matrix((partial[varying], (points[varying], source[varying])),
+                                 shape=(self.yd.size, len(self.var_names)))
 
-        for n in range(self.ndata):
-            residual[n,:] = (self.yd[n,:] - self.calculate_model(parameters, n, E[n,:]))**2*self.ye[n,:]**(-2)
+    def minimize_sparse(self) -> lf.minimizer.MinimizerResult:
+        """Minimize by the trust region reflective method of scipy with the sparse Jacobian.
 
-        # now flatten this to a 1D array, as minimize() needs
-        return residual.flatten()
+        The trust region subproblems are solved by LSMR, whose cost is linear in
+        the number of points, and lmfit constraints are not evaluated at each step.
+        """
+        parameters = self.scf_model_parameters
+        self.fixed_values = self.parameter_values(parameters)
+        lower = np.array([parameters[name].min for name in self.var_names])
+        upper = np.array([parameters[name].max for name in self.var_names])
+        start = np.clip([parameters[name].value for name in self.var_names], lower, upper)
+        ret = optimize.least_squares(
+            self.sparse_objective, start, jac=self.sparse_jacobian, bounds=(lower, upper),
+            method='trf', tr_solver='lsmr', x_scale='jac')
+
+        ndata, nvarys = ret.fun.size, len(self.var_names)
+        chisqr = float(ret.fun @ ret.fun)
+        # statistics as lmfit calculates them, with the chi-square kept finite for -2 log likelihood
+        neg2_log_likel = ndata*np.log(max(chisqr, 1e-250)/ndata)
+        result = lf.minimizer.MinimizerResult(
+            method='least_squares', var_names=list(self.var_names), init_vals=list(start),
+            init_values=dict(zip(self.var_names, start)), nfev=ret.nfev, success=ret.success,
+            message=ret.message, residual=ret.fun, aborted=False, errorbars=False, covar=None,
+            ndata=ndata, nvarys=nvarys, nfree=ndata - nvarys, chisqr=chisqr,
+            redchi=chisqr/max(1, ndata - nvarys), aic=neg2_log_likel + 2*nvarys,
+            bic=neg2_log_likel + np.log(ndata)*nvarys)
+        result.params = copy.deepcopy(parameters)
+        for name, value in zip(self.var_names, ret.x):
+            result.params[name].value = value
+        try:
+            hess = (ret.jac.T @ ret.jac).toarray()
+            result.covar = np.linalg.inv(hess)*result.redchi
+            result.errorbars = bool(np.all(np.diag(result.covar) > 0))
+        except np.linalg.LinAlgError:
+            pass
+        if result.errorbars:
+            stderr = np.sqrt(np.diag(result.covar))
+            correl = result.covar/np.outer(stderr, stderr)
+            for i, name in enumerate(self.var_names):
+                result.params[name].stderr = stderr[i]
+                result.params[name].correl = dict(
+                    (other, correl[i, j]) for j, other in enumerate(self.var_names) if j != i)
+            for name, param in result.params.items():
+                source = tied_source(result.params, name)
+                if source != name and source in self.var_names:
+                    param.stderr = result.params[source].stderr
+        return result
+
+    def use_sparse_solver(self) -> bool:
+        if self.solver == 'auto':
+            return self.ndata >= self.SPARSE_NDATA and has_analytic_jacobian(self.scf_model_parameters)
+        if self.solver == 'trf' and not has_analytic_jacobian(self.scf_model_parameters):
+            raise InvalidInputError('The trf solver supports parameters tied without expressions only.')
+        return self.solver == 'trf'
+
+    def resolved_solver(self) -> str:
+        return 'trf' if self.use_sparse_solver() else 'leastsq'
+
+    def set_jacobian_source(self) -> None:
+        """Map model parameters of each data set onto the varying parameter they depend on."""
+        parameters = self.scf_model_parameters
+        self.var_names = [name for name, param in parameters.items() if param.vary]
+        self.source_index = np.array([[
+            self.var_names.index(tied_source(parameters, name))
+            if tied_source(parameters, name) in self.var_names else -1
+            for name in names] for names in self.param_table])
 
     def fit(self) -> None:
         self.debug('START', inspect.currentframe())
         self.set_parameter()
-        self.result = lf.minimize(
-            fcn=self.objective, params=self.scf_model_parameters, kws={'E':self.xd})
+        key = self.cache_key(self.scf_model_parameters)
+        if self.load_result(key):
+            report = self.result.fit_report()
+        else:
+            fit_kws = dict()
+            if has_analytic_jacobian(self.scf_model_parameters):
+                self.set_jacobian_source()
+                fit_kws = dict(Dfun=self.jacobian, col_deriv=True)
+            with stage('minimize'):
+                if self.use_sparse_solver():
+                    self.result = self.minimize_sparse()
+                else:
+                    self.result = lf.minimize(
+                        fcn=self.objective, params=self.scf_model_parameters, kws={'E':self.xd}, **fit_kws)
+            PROFILER.count('nfev', self.result.nfev)
+            report = lf.fit_report(self.result)
+            self.store_result(key, report)
+        self.evaluate()
 
         if self.result.success:
             self.info(self.result.message)
@@ -342,10 +944,10 @@ class MultipleCurveFit(Common, AbstractCurveFit):
                 self.info(f'parameter of {name}')
                 self.info(
                     f'  {self.result.params[name].value} +- {self.result.params[name].stderr}')
-            with open(self.log_file, 'w') as log:
+            with stage('write_log'), open(self.log_file, 'w') as log:
                 log.write(
                     '--------------------------------------------------------------------\n')
-                log.write(lf.fit_report(self.result))
+                log.write(report)
                 log.write('\n')
                 log.write(
                     '--------------------------------------------------------------------\n')
@@ -354,78 +956,55 @@ class MultipleCurveFit(Common, AbstractCurveFit):
                 log.write(f' Reduced Chi-squared value  = {self.result.redchi}\n')
                 log.write('\n')
             self.info(f'Fitting results were recorded to {self.log_file}')
+            if self.state_file is not None:
+                Et, C, epsilon = (dict(zip(self.qdp_header, values))
+                                  for values in self.parameter_values(self.result.params))
+                write_joint_state(self.state_file, C, epsilon, Et)
+                self.info(f'Joint solution was saved to {self.state_file}')
             self.create_result_qdp()
-            if self.plot_flag:
+            if self.plot_flag or self.save_flag:
                 self.plot()
         self.debug('END', inspect.currentframe())
 
-    @property
-    def result_curve(self) -> List:
-        return [
-            scf_curve(
-                E=self.DUMMY_ENERGY,
-                **dict((
-                    param_name,
-                    self.result.params[f'{param_name}_{n}']) 
-                for param_name in self.scf_model.param_names)
-            )
-        for n in range(self.ndata) ]
-
-    @property
-    def result_residuals(self) -> List:
-        return [
-            self.yd[n] - scf_curve(
-                E=self.xd[n],
-                **dict((
-                    param_name,
-                    self.result.params[f'{param_name}_{n}']) 
-                for param_name in self.scf_model.param_names)
-            )
-        for n in range(self.ndata) ]
-
-
+    @timed('write_result_qdp')
     def create_result_qdp(self):
         self.debug('START', inspect.currentframe())
-        for n, raw_name, raw_data in zip(
-            range(self.ndata), self.raw_data.keys(), self.raw_data.values()):
-
-            qdp_file = f'{get_file_prefix(raw_name)}_result.qdp'
-            raw_data.append('NO NO NO NO')
-            header = '\n'.join(raw_data)
-
-            result = np.array([
-                self.DUMMY_ENERGY,
-                np.zeros(self.DUMMY_DATA_SIZE),
-                self.result_curve[n],
-                np.zeros(self.DUMMY_DATA_SIZE)])
-            np.savetxt(fname=qdp_file, X=result.T,
-                delimiter=' ', newline='\n', header=header, comments='')
+        for n, (qdp_name, commands) in zip(range(self.ndata), self.qdp_header.items()):
+            qdp_file = self.result_file(qdp_name, 'qdp')
+            data = np.column_stack((
+                self.xd[self.slices[n]], self.xe[self.slices[n]],
+                self.yd[self.slices[n]], self.ye[self.slices[n]]))
+            blocks = [self.result_block(n, level) for level in range(len(BAND_SIGMAS))]
+            write_qdp_file(qdp_file, [data] + blocks, commands)
             self.info(f'{qdp_file} is generated')
         self.debug('END', inspect.currentframe())
 
+    @timed('plot')
     def plot(self):
         self.debug('START', inspect.currentframe())
+        from matplotlib import ticker
         spl = SimplePlot(configure=True,
                          figsize=(8, 6), nrows=2, height_ratios=[0.7, 0.3], fsize=20,
-                         left=0.15, right=0.95, bottom=0.15, top=0.9)
+                         left=0.15, right=0.95, bottom=0.15, top=0.9, interactive=self.plot_flag)
 
         # data & best-fit model
-        for n, raw_name, color in zip(range(self.ndata), self.raw_data.keys(), spl.colors.values()):
+        for n, qdp_name, color in zip(range(self.ndata), self.qdp_header, spl.colors.values()):
             # data
             spl.axes[0].errorbar(
-                x=self.xd[n], y=self.yd[n],
-                xerr=self.xe[n], yerr=self.ye[n],
+                x=self.xd[self.slices[n]], y=self.yd[self.slices[n]],
+                xerr=self.xe[self.slices[n]], yerr=self.ye[self.slices[n]],
                 marker=spl.marker, ms=spl.masize, fmt=spl.pltfmt,
                 color=color, ecolor=color, mec=color,
                 capsize=0.0, elinewidth=spl.lwidth,
-                label=f'{raw_name}')
+                label=f'{qdp_name}')
             # model
-            spl.axes[0].plot(self.DUMMY_ENERGY, self.result_curve[n],
+            spl.axes[0].plot(self.DUMMY_ENERGY, self.evaluation.curve(n),
                 lw=spl.lwidth, ls=':', color=color)
+            self.plot_bands(spl.axes[0], n, color)
             # residual
             spl.axes[1].errorbar(
-                x=self.xd[n], y=self.result_residuals[n],
-                xerr=self.xe[n], yerr=self.ye[n],
+                x=self.xd[self.slices[n]], y=self.evaluation.residuals(n),
+                xerr=self.xe[self.slices[n]], yerr=self.ye[self.slices[n]],
                 marker=spl.marker, ms=spl.masize, fmt=spl.pltfmt,
                 color=color, ecolor=color, mec=color,
                 capsize=0.0, elinewidth=spl.lwidth)
@@ -457,7 +1036,6 @@ class MultipleCurveFit(Common, AbstractCurveFit):
             ax.xaxis.set_major_locator(ticker.LogLocator(base=10))
             ax.yaxis.set_label_coords(-0.11, 0.5)
 
-        plt.pause(1.0)
-        plt.show()
+        self.show_or_save(spl)
 
         self.debug('END', inspect.currentframe())
\ No newline at end of file
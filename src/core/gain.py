@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+
+import ctypes
+import inspect
+import os
+from functools import lru_cache
+from typing import List, Union
+
+import numpy as np
+from astropy.io import fits
+from numpy.ctypeslib import ndpointer
+from scipy import sparse
+
+from ..util.common import Common
+from ..util.error import InvalidInputError
+from ..util.parse import get_file_prefix
+
+
+E0_WIDTH = 3.65 # energy width of a PI channel in eV
+LIBRARY_FILE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', '..', 'libpigaincorrect.so')
+
+
+@lru_cache(maxsize=64)
+def overlap_matrix(nchan:int, efunc:float, etrue:float) -> sparse.csr_matrix:
+    """Build the matrix redistributing input channels onto corrected channels.
+
+    Element (j, k) is the fraction of the input channel k, whose width is
+    stretched to E0_WIDTH*etrue/efunc, overlapping the corrected channel j.
+    """
+    e1_width = E0_WIDTH*etrue/efunc
+    j = np.arange(nchan)
+    estart = E0_WIDTH*j
+    estop = estart + E0_WIDTH
+    span = int(np.ceil(E0_WIDTH/e1_width)) + 1
+    k = np.floor(estart/e1_width).astype(int)[:, None] + np.arange(span)[None, :]
+    e1 = e1_width*k
+    overlap = np.minimum(estop[:, None], e1+e1_width) - np.maximum(estart[:, None], e1)
+    valid = (overlap > 0.0) & (k < nchan)
+    rows = np.broadcast_to(j[:, None], k.shape)
+    return sparse.csr_matrix(
+        (overlap[valid]/e1_width, (rows[valid], k[valid])), shape=(nchan, nchan))
+
+
+def stochastic_round(values:np.ndarray, rng:np.random.Generator) -> np.ndarray:
+    """Round to integer counts, rounding up with probability of the fraction."""
+    integer = np.floor(values)
+    return (integer + (values - integer > rng.random(values.shape))).astype(np.int32)
+
+
+def correct_counts(counts:np.ndarray, efunc:float, etrue:float,
+                   seed:Union[int, np.random.Generator]=None) -> np.ndarray:
+    """Correct the gain of spectra given as an array of shape (..., nchan)."""
+    counts = np.asarray(counts, dtype=float)
+    matrix = overlap_matrix(counts.shape[-1], float(efunc), float(etrue))
+    redistributed = (matrix @ counts.reshape(-1, counts.shape[-1]).T).T
+    return stochastic_round(
+        redistributed.reshape(counts.shape), np.random.default_rng(seed))
+
+
+@lru_cache(maxsize=None)
+def load_library(path:str=LIBRARY_FILE) -> ctypes.CDLL:
+    """Load libpigaincorrect built by `make`."""
+    if not os.path.exists(path):
+        raise FileNotFoundError(f'No such library: {path}. Run make to build it.')
+    lib = ctypes.CDLL(path)
+    lib.pigaincorrect.argtypes = [
+        ndpointer(np.int32, flags='C_CONTIGUOUS'), ndpointer(np.int32, flags='C_CONTIGUOUS'),
+        ctypes.c_int, ctypes.c_int, ctypes.c_double, ctypes.c_double, ctypes.c_uint64]
+    lib.pigaincorrect.restype = ctypes.c_int
+    return lib
+
+
+def correct_counts_clib(counts:np.ndarray, efunc:float, etrue:float, seed:int=1,
+                        path:str=LIBRARY_FILE) -> np.ndarray:
+    """Same as correct_counts but runs the single-pass C routine of libpigaincorrect."""
+    counts = np.ascontiguousarray(counts, dtype=np.int32)
+    nchan = counts.shape[-1]
+    out = np.empty_like(counts)
+    status = load_library(path).pigaincorrect(
+        counts, out, counts.size//nchan, nchan, efunc, etrue, seed)
+    if status != 0:
+        raise InvalidInputError('Input of pigaincorrect is invalid.')
+    return out
+
+
+class PiGainCorrect(Common):
+    EXTNAME = 'SPECTRUM'
+    CHANNEL_COLUMN = 'CHANNEL'
+    COUNTS_COLUMN = 'COUNTS'
+
+    def __init__(self, seed:Union[int, np.random.Generator]=None, clobber:bool=False, loglv:int=1) -> None:
+        super().__init__(loglv)
+        self.rng = np.random.default_rng(seed)
+        self.clobber = clobber
+
+    def read_spectrum(self, pifile:str) -> fits.HDUList:
+        if not os.path.exists(pifile):
+            raise FileNotFoundError(f'No such spectrum file: {pifile}')
+        hdul = fits.open(pifile)
+        if self.EXTNAME not in hdul:
+            raise InvalidInputError(f'{self.EXTNAME} extension is not found in {pifile}')
+        if self.COUNTS_COLUMN not in hdul[self.EXTNAME].columns.names:
+            raise InvalidInputError(f'{self.COUNTS_COLUMN} column is not found in {pifile}')
+        return hdul
+
+    def write_spectrum(self, hdul:fits.HDUList, counts:np.ndarray, output:str) -> None:
+        spectrum = hdul[self.EXTNAME]
+        columns = [
+            fits.Column(name=self.COUNTS_COLUMN, format='J', unit='count', array=counts)
+            if column.name == self.COUNTS_COLUMN else column
+            for column in spectrum.columns]
+        hdul[self.EXTNAME] = fits.BinTableHDU.from_columns(
+            columns, header=spectrum.header, name=self.EXTNAME)
+        hdul.writeto(output, overwrite=self.clobber)
+
+    def correct(self, input:str, output:str, actual:float, expect:float) -> None:
+        self.debug('START', inspect.currentframe())
+        with self.read_spectrum(input) as hdul:
+            counts = hdul[self.EXTNAME].data[self.COUNTS_COLUMN]
+            self.debug(f'NUM = {counts.size}')
+            corrected = correct_counts(counts, efunc=actual, etrue=expect, seed=self.rng)
+            self.write_spectrum(hdul, corrected, output)
+        self.info(f'{output} is generated')
+        self.debug('END', inspect.currentframe())
+
+    def correct_multiple(self, input_list:List[str], output_list:List[str],
+                         actual_list:List[float], expect_list:List[float]) -> None:
+        for input, output, actual, expect in zip(input_list, output_list, actual_list, expect_list):
+            self.correct(input, output, actual, expect)
+
+    @staticmethod
+    def default_output(input:str) -> str:
+        return os.path.join(os.path.dirname(input), f'{get_file_prefix(input)}_cor.pi')
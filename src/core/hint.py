@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+from typing import Dict, List, Tuple
+
+from ..util.error import InvalidInputError
+from .fit import CurveFitParameter
+
+
+BOOLEAN_WORDS = {'true': True, 'yes': True, '1': True, 'false': False, 'no': False, '0': False}
+
+
+def parse_bool(value) -> bool:
+    """Boolean of true or false, 1 or 0, or their spellings in BOOLEAN_WORDS in any case."""
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)) and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str) and value.strip().lower() in BOOLEAN_WORDS:
+        return BOOLEAN_WORDS[value.strip().lower()]
+    raise InvalidInputError(f'{value!r} is not a boolean.')
+
+
+def normalize_hints(raw:Dict) -> Dict[str, Dict]:
+    """Check and convert the hints of parameters keyed by parameter name."""
+    hints = dict()
+    modifiers = dict(zip(CurveFitParameter.PROPERTIES.keys(), CurveFitParameter.MODIFIERS), vary=parse_bool)
+    for name, hint in raw.items():
+        if not isinstance(hint, dict):
+            raise InvalidInputError(f'Hint of parameter {name} should be a table of properties.')
+        unknown = set(hint) - set(modifiers)
+        if unknown:
+            raise InvalidInputError(f'Unknown properties of parameter {name}: ' + ', '.join(sorted(unknown)))
+        # bounds not given are left to the initial guess or unbounded
+        hints[name] = dict((key, modifiers[key](value)) for key, value in hint.items())
+    return hints
+
+
+def read_table(path:str) -> Dict:
+    """Read a table from a JSON, TOML or YAML file."""
+    if not os.path.exists(path):
+        raise FileNotFoundError(f'No such file: {path}')
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.json':
+        with open(path, 'r') as f:
+            raw = json.load(f)
+    elif ext == '.toml':
+        try:
+            import tomllib as toml_parser
+        except ImportError:
+            import toml as toml_parser
+        with open(path, 'rb' if toml_parser.__name__ == 'tomllib' else 'r') as f:
+            raw = toml_parser.load(f)
+    elif ext in ('.yaml', '.yml'):
+        import yaml
+        with open(path, 'r') as f:
+            raw = yaml.safe_load(f)
+    else:
+        raise InvalidInputError(f'Format of file should be JSON, TOML or YAML: {path}')
+    if not isinstance(raw, dict):
+        raise InvalidInputError(f'{path} should be a table.')
+    return raw
+
+
+def read_parameter_hints(path:str) -> Dict[str, Dict]:
+    """Read hints of parameters from a JSON, TOML or YAML file.
+
+    The file maps parameter names (e.g. Et, C, epsilon, or Et_1 for a data set)
+    onto tables of value, vary, min, max and expr.
+    """
+    return normalize_hints(read_table(path))
+
+
+def parse_parameter_hints(entries:List[str]) -> Dict[str, Dict]:
+    """Parse hints given as NAME=value,vary,min,max[,expr] like the interactive input."""
+    hints = dict()
+    for entry in entries:
+        name, sep, values = entry.partition('=')
+        if not sep:
+            raise InvalidInputError(f'Parameter hint should be NAME=value,vary,min,max: {entry}')
+        try:
+            hints[name.strip()] = CurveFitParameter.from_entry(name.strip(), values).hints
+        except (TypeError, ValueError):
+            raise InvalidInputError(f'Parameter hint is invalid: {entry}')
+    return hints
+
+
+def read_tie_spec(path:str) -> Tuple[Dict[str, str], Dict[str, Dict[str, str]]]:
+    """Read ties of parameters and labels of data sets from a JSON, TOML or YAML file.
+
+    The table "tie" maps parameter names onto free, global or a label such as
+    sensor or epoch, and the table "labels" maps QDP files onto their labels.
+    """
+    raw = read_table(path)
+    unknown = set(raw) - {'tie', 'labels'}
+    if unknown:
+        raise InvalidInputError(f'Unknown tables in {path}: ' + ', '.join(sorted(unknown)))
+    return (dict((name, str(mode)) for name, mode in raw.get('tie', dict()).items()),
+            raw.get('labels', dict()))
+
+
+def parse_ties(entries:List[str]) -> Dict[str, str]:
+    """Parse ties given as NAME=free, NAME=global or NAME=<label>, e.g. C=sensor."""
+    ties = dict()
+    for entry in entries:
+        name, sep, mode = entry.partition('=')
+        if not (sep and name.strip() and mode.strip()):
+            raise InvalidInputError(f'Tie should be NAME=free, NAME=global or NAME=<label>: {entry}')
+        ties[name.strip()] = mode.strip()
+    return ties
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import os
+from typing import Tuple
+
+import numpy as np
+from astropy.io import fits
+
+from ..util.common import CACHE_DIR
+
+
+ARCMIN2PIXEL = 57.53 # sky pixels per arcmin of XIS
+
+
+def read_image(image:str) -> Tuple[np.ndarray, fits.Header]:
+    """Read the primary image of a (gzipped) FITS file."""
+    if not os.path.exists(image):
+        raise FileNotFoundError(f'No such image file: {image}')
+    with fits.open(image) as hdul:
+        return np.asarray(hdul[0].data, dtype=float), hdul[0].header
+
+
+def load_image(image:str, cache_dir:str=CACHE_DIR) -> Tuple[np.ndarray, fits.Header]:
+    """Read the image through a decompressed, memory-mapped copy kept in the cache directory."""
+    if not os.path.exists(image):
+        raise FileNotFoundError(f'No such image file: {image}')
+    stat = os.stat(image)
+    key = hashlib.sha1(
+        f'{os.path.abspath(image)}:{stat.st_size}:{stat.st_mtime_ns}'.encode()).hexdigest()
+    data_file = os.path.join(cache_dir, 'image', f'{key}.npy')
+    header_file = os.path.join(cache_dir, 'image', f'{key}.hdr')
+    if not (os.path.exists(data_file) and os.path.exists(header_file)):
+        data, header = read_image(image)
+        os.makedirs(os.path.dirname(data_file), exist_ok=True)
+        # write to temporary files first so that concurrent readers never see partial ones
+        with open(f'{data_file}.{os.getpid()}', 'wb') as f:
+            np.save(f, data)
+        with open(f'{header_file}.{os.getpid()}', 'w') as f:
+            f.write(header.tostring())
+        os.replace(f'{data_file}.{os.getpid()}', data_file)
+        os.replace(f'{header_file}.{os.getpid()}', header_file)
+    with open(header_file, 'r') as f:
+        header = fits.Header.fromstring(f.read())
+    return np.load(data_file, mmap_mode='r'), header
+
+
+def physical_axes(shape:Tuple[int, int], header:fits.Header) -> Tuple[np.ndarray, np.ndarray]:
+    """Physical (sky) coordinates of the pixel centres along x and y."""
+    x = (np.arange(1, shape[1]+1) - header.get('LTV1', 0.0))/header.get('LTM1_1', 1.0)
+    y = (np.arange(1, shape[0]+1) - header.get('LTV2', 0.0))/header.get('LTM2_2', 1.0)
+    return x, y
+
+
+def radius_grid(shape:Tuple[int, int], header:fits.Header, x0:float, y0:float) -> np.ndarray:
+    """Distance of each pixel centre from (x0, y0) in physical pixels."""
+    x, y = physical_axes(shape, header)
+    return np.hypot(x[None, :] - x0, y[:, None] - y0)
@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+
+import inspect
+import os
+from typing import Dict, List, Tuple
+
+import numpy as np
+from astropy.io import fits
+from scipy import special
+
+from ..util.common import Common
+from ..util.error import InvalidInputError
+from .gain import E0_WIDTH, PiGainCorrect
+
+
+LINE_WINDOW = (5.8, 7.2) # energy range in keV around the iron lines fitted by default
+LINE_SIGMA = 0.05 # initial sigma of the line in keV
+MIN_SIGMA = 1e-3 # lower limit of sigma in keV, below which the line is narrower than a channel
+MIN_SIGNIFICANCE = 3.0 # norm over its error below which the line is not detected
+PARAM_NAMES = ('continuum', 'slope', 'norm', 'center', 'sigma')
+
+
+def load_spectra(pifiles:List[str]) -> np.ndarray:
+    """Counts of the spectra in shape of (number of spectra, number of channels).
+
+    A file whose COUNTS column has a spectrum per row gives all of them.
+    """
+    spectra = list()
+    for pifile in pifiles:
+        if not os.path.exists(pifile):
+            raise FileNotFoundError(f'No such spectrum file: {pifile}')
+        with fits.open(pifile, memmap=True) as hdul:
+            if PiGainCorrect.EXTNAME not in hdul:
+                raise InvalidInputError(f'{PiGainCorrect.EXTNAME} extension is not found in {pifile}')
+            counts = np.asarray(hdul[PiGainCorrect.EXTNAME].data[PiGainCorrect.COUNTS_COLUMN], dtype=float)
+        spectra.append(counts.reshape(-1, counts.shape[-1]) if counts.ndim > 1 else counts[None, :])
+    if len(set(spectrum.shape[1] for spectrum in spectra)) > 1:
+        raise InvalidInputError('Spectra should have the same number of channels.')
+    return np.concatenate(spectra)
+
+
+def line_model(params:np.ndarray, lower:np.ndarray, upper:np.ndarray, pivot:float) -> Tuple[np.ndarray, np.ndarray]:
+    """Counts of a linear continuum and a Gaussian line integrated over the channels, and their gradient.
+
+    params has the columns of PARAM_NAMES for each spectrum, and the
+    continuum is in counts per channel at the pivot energy in keV. The
+    gradient is in shape of (number of spectra, number of channels, 5).
+    """
+    a, b, norm, center, sigma = (params[:, i, None] for i in range(5))
+    zl, zu = (lower - center)/sigma, (upper - center)/sigma
+    fraction = 0.5*(special.erf(zu/np.sqrt(2)) - special.erf(zl/np.sqrt(2)))
+    pl, pu = np.exp(-0.5*zl**2)/np.sqrt(2*np.pi), np.exp(-0.5*zu**2)/np.sqrt(2*np.pi)
+    offset = 0.5*(lower + upper) - pivot
+    model = a + b*offset + norm*fraction
+    gradient = np.stack(np.broadcast_arrays(
+        np.ones_like(offset), offset, fraction,
+        norm*(pl - pu)/sigma, norm*(zl*pl - zu*pu)/sigma), axis=-1)
+    return model, gradient
+
+
+def cstat(counts:np.ndarray, model:np.ndarray) -> np.ndarray:
+    """C-statistic of each spectrum, 2*sum(model - counts + counts*ln(counts/model))."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_term = np.where(counts > 0, counts*np.log(counts/model), 0.0)
+    return 2*np.sum(model - counts + log_term, axis=-1)
+
+
+class LineCentroidFitter(Common):
+    """Fit a Gaussian line on a linear continuum to many spectra at once with the Poisson likelihood.
+
+    All the spectra are stacked in a 2-D array, and every iteration takes a
+    damped Newton step of all of them with the Fisher information of the
+    C-statistic, raising the damping of the spectra whose step does not
+    decrease it. The errors are from the inverse of the Fisher information
+    at the best fit, and are NaN for the spectra without a reliable line.
+    """
+
+    def __init__(self, window:Tuple[float, float]=LINE_WINDOW, sigma:float=LINE_SIGMA,
+                 max_iter:int=100, tolerance:float=1e-6, min_significance:float=MIN_SIGNIFICANCE,
+                 loglv:int=1) -> None:
+        super().__init__(loglv)
+        if not 0.0 < window[0] < window[1]:
+            raise InvalidInputError('Window should be a range of positive energies.')
+        if sigma <= MIN_SIGMA:
+            raise InvalidInputError(f'Sigma should be greater than {MIN_SIGMA} keV.')
+        self.window = window
+        self.sigma = sigma
+        self.max_iter = max_iter
+        self.tolerance = tolerance
+        self.min_significance = min_significance
+
+    def channels(self, nchan:int) -> slice:
+        """Channels whose energy ranges are within the window."""
+        lower = np.arange(nchan)*E0_WIDTH*1e-3
+        start = np.searchsorted(lower, self.window[0])
+        stop = np.searchsorted(lower + E0_WIDTH*1e-3, self.window[1], side='right')
+        if stop - start < len(PARAM_NAMES) + 1:
+            raise InvalidInputError(f'Window {self.window} keV has too few channels.')
+        return slice(start, stop)
+
+    def initial_params(self, counts:np.ndarray, energy:np.ndarray, pivot:float) -> np.ndarray:
+        """Continuum from the counts at both ends of the window and the line at the peak of the excess.
+
+        The excess is smoothed with a Gaussian of the initial sigma, which
+        finds weak lines more often than a narrower kernel.
+        """
+        nedge = max(counts.shape[1]//10, 1)
+        low, high = counts[:, :nedge].mean(axis=1), counts[:, -nedge:].mean(axis=1)
+        slope = (high - low)/(energy[-nedge:].mean() - energy[:nedge].mean())
+        continuum = low + slope*(pivot - energy[:nedge].mean())
+        excess = counts - (continuum[:, None] + slope[:, None]*(energy - pivot))
+        half = min(int(3*self.sigma/(E0_WIDTH*1e-3)), (counts.shape[1] - 1)//2)
+        kernel = np.exp(-0.5*(np.arange(-half, half + 1)*E0_WIDTH*1e-3/self.sigma)**2)
+        smoothed = np.apply_along_axis(np.convolve, 1, excess, kernel, mode='same')
+        center = energy[np.argmax(smoothed, axis=1)]
+        near = np.abs(energy[None, :] - center[:, None]) <= 3*self.sigma
+        norm = np.maximum(np.where(near, excess, 0.0).sum(axis=1), 1.0)
+        return np.column_stack((continuum, slope, norm, center, np.full(center.size, self.sigma)))
+
+    def fit(self, spectra:np.ndarray) -> Dict[str, np.ndarray]:
+        """Best-fit values and errors of the parameters of each spectrum.
+
+        spectra is in shape of (number of spectra, number of channels). The
+        result has arrays of PARAM_NAMES, their errors suffixed by _error,
+        cstat, dof, converged and reliable, with a value per spectrum. A fit
+        is reliable if it converged to a line detected at min_significance
+        and wider than a channel within the window, otherwise its errors are
+        NaN since a weak line fitted to the noise has no meaningful error.
+        """
+        self.debug('START', inspect.currentframe())
+        spectra = np.atleast_2d(np.asarray(spectra, dtype=float))
+        window = self.channels(spectra.shape[1])
+        counts = spectra[:, window]
+        lower = np.arange(window.start, window.stop)*E0_WIDTH*1e-3
+        upper = lower + E0_WIDTH*1e-3
+        energy = 0.5*(lower + upper)
+        pivot = 0.5*sum(self.window)
+        if np.any(counts.sum(axis=1) <= 0):
+            raise InvalidInputError('Spectra should have counts in the window.')
+        params = self.initial_params(counts, energy, pivot)
+        model, gradient = line_model(params, lower, upper, pivot)
+        model = np.maximum(model, 1e-10)
+        statistic = cstat(counts, model)
+        damping = np.full(len(params), 1e-3)
+        converged = np.zeros(len(params), dtype=bool)
+        for iteration in range(self.max_iter):
+            active = ~converged
+            if not active.any():
+                break
+            info, score = self.fisher(counts[active], model[active], gradient[active])
+            scale = np.sqrt(np.clip(np.diagonal(info, axis1=1, axis2=2), 1e-300, None))
+            # Levenberg-Marquardt damping on the scaled information keeps the step finite
+            scaled = info/(scale[:, :, None]*scale[:, None, :]) + damping[active, None, None]*np.eye(len(PARAM_NAMES))
+            step = np.linalg.solve(scaled, (score/scale)[..., None])[..., 0]/scale
+            trial = params[active] + step
+            # the line stays within the window even if the spectrum has none
+            trial[:, 3] = np.clip(trial[:, 3], *self.window)
+            trial[:, 4] = np.clip(trial[:, 4], MIN_SIGMA, self.window[1] - self.window[0])
+            trial_model, trial_gradient = line_model(trial, lower, upper, pivot)
+            valid = np.all(trial_model > 0, axis=1)
+            trial_statistic = np.where(valid, cstat(counts[active], np.maximum(trial_model, 1e-10)), np.inf)
+            better = trial_statistic <= statistic[active]
+            index = np.flatnonzero(active)
+            accepted = index[better]
+            decrease = statistic[accepted] - trial_statistic[better]
+            params[accepted] = trial[better]
+            model[accepted] = trial_model[better]
+            gradient[accepted] = trial_gradient[better]
+            statistic[accepted] = trial_statistic[better]
+            damping[accepted] = np.maximum(damping[accepted]*0.1, 1e-9)
+            damping[index[~better]] *= 10.0
+            converged[accepted[decrease < self.tolerance]] = True
+            # a step rejected with a large damping cannot decrease the statistic any more
+            converged[index[~better][damping[index[~better]] > 1e8]] = True
+        self.debug(f'{iteration+1} iteration(s) for {len(params)} spectra')
+        info, _ = self.fisher(counts, model, gradient)
+        try:
+            covariance = np.linalg.inv(info)
+        except np.linalg.LinAlgError:
+            covariance = np.linalg.pinv(info)
+        errors = np.sqrt(np.clip(np.diagonal(covariance, axis1=1, axis2=2), 0.0, None))
+        reliable = (converged & (params[:, 2] > self.min_significance*errors[:, 2])
+                    & (params[:, 3] > self.window[0]) & (params[:, 3] < self.window[1])
+                    & (params[:, 4] >= E0_WIDTH*1e-3) & (params[:, 4] < self.window[1] - self.window[0]))
+        errors[~reliable] = np.nan
+        result = dict((name, params[:, i]) for i, name in enumerate(PARAM_NAMES))
+        result.update((f'{name}_error', errors[:, i]) for i, name in enumerate(PARAM_NAMES))
+        result.update(cstat=statistic, dof=np.full(len(params), counts.shape[1] - len(PARAM_NAMES)),
+                      converged=converged, reliable=reliable)
+        if not converged.all():
+            self.warning(f'{int((~converged).sum())} spectra did not converge in {self.max_iter} iterations')
+        if not reliable.all():
+            self.warning(f'{int((~reliable).sum())} spectra have no reliable line, whose errors are NaN')
+        self.debug('END', inspect.currentframe())
+        return result
+
+    @staticmethod
+    def fisher(counts:np.ndarray, model:np.ndarray, gradient:np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Fisher information and score of half the C-statistic."""
+        info = np.einsum('sck,sc,scl->skl', gradient, 1.0/model, gradient)
+        score = np.einsum('sck,sc->sk', gradient, counts/model - 1.0)
+        return info, score
+
+    def fit_files(self, pifiles:List[str]) -> Dict[str, np.ndarray]:
+        result = self.fit(load_spectra(pifiles))
+        for n, (center, error) in enumerate(zip(result['center'], result['center_error'])):
+            self.info(f'Line center of spectrum {n+1}: {center:.5f} +- {error:.5f} keV')
+        return result
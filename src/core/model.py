@@ -1,7 +1,13 @@
 # -*- coding: utf-8 -*-
 
-from numpy import exp
+from numpy import array, exp
 
 
 def energy_event_density_curve(E, Et, C, epsilon):
     return Et*(1 - C*exp(-1*epsilon*E))
+
+
+def energy_event_density_curve_jacobian(E, Et, C, epsilon):
+    """Partial derivatives of energy_event_density_curve by Et, C and epsilon, stacked in this order."""
+    decay = exp(-1*epsilon*E)
+    return array([1 - C*decay, -1*Et*decay, Et*C*E*decay])
@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import inspect
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Callable, Dict, List
+
+from ..util.common import Common
+from ..util.error import InvalidInputError
+from .cache import content_key
+
+
+DIGEST_BLOCK = 16*1024**2 # bytes of a file hashed at once
+
+
+class Stage(object):
+    """A step of a pipeline that makes the outputs from the inputs by calling function(**params).
+
+    The function should be defined at the top level of a module and the
+    params should be JSON serializable, so that the stage is run in a worker
+    process and its key is the same whenever the params are the same.
+    """
+
+    def __init__(self, name:str, function:Callable, params:Dict, inputs:List[str], outputs:List[str]) -> None:
+        self.name = name
+        self.function = function
+        self.params = params
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+
+
+def file_digest(path:str, memo:Dict[str, List]) -> str:
+    """Hash of the contents of the file, taken from the memo while its size and mtime are unchanged."""
+    stat = os.stat(path)
+    entry = memo.get(os.path.abspath(path))
+    if entry is not None and entry[:2] == [stat.st_size, stat.st_mtime_ns]:
+        return entry[2]
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(DIGEST_BLOCK), b''):
+            digest.update(block)
+    memo[os.path.abspath(path)] = [stat.st_size, stat.st_mtime_ns, digest.hexdigest()]
+    return digest.hexdigest()
+
+
+def run_stage(function:Callable, params:Dict) -> float:
+    """Call the function of a stage and return the wall-clock time in second."""
+    start = time.perf_counter()
+    function(**params)
+    return time.perf_counter() - start
+
+
+class Pipeline(Common):
+    """Run the stale stages of a DAG of stages, connected by the files they read and write.
+
+    A stage depends on the stages that write its inputs. The key of a stage
+    is the hash of its function, params and contents of its inputs, and the
+    stage is stale if the key differs from the one recorded in the state
+    file or its outputs are missing or changed since. A stage whose outputs
+    are the same as before leaves the later stages up to date. Stages are
+    run in worker processes as soon as the stages they depend on finish.
+    """
+
+    def __init__(self, stages:List[Stage], state_file:str, workers:int=None, clobber:bool=False,
+                 loglv:int=1) -> None:
+        super().__init__(loglv)
+        self.stages = dict()
+        writers = dict()
+        for stage in stages:
+            if stage.name in self.stages:
+                raise InvalidInputError(f'Stage {stage.name} is defined twice.')
+            self.stages[stage.name] = stage
+            for output in stage.outputs:
+                path = os.path.abspath(output)
+                if path in writers:
+                    raise InvalidInputError(f'{output} is written by both {writers[path]} and {stage.name}.')
+                writers[path] = stage.name
+        self.depends = dict(
+            (stage.name, sorted(set(writers[os.path.abspath(f)] for f in stage.inputs
+                                    if os.path.abspath(f) in writers) - {stage.name}))
+            for stage in stages)
+        self.order = self.sort()
+        self.state_file = state_file
+        self.workers = workers
+        self.clobber = clobber
+        self.state = self.read_state()
+
+    def sort(self) -> List[str]:
+        """Names of the stages in topological order."""
+        order, done = list(), set()
+        remaining = list(self.stages)
+        while remaining:
+            ready = [name for name in remaining if set(self.depends[name]) <= done]
+            if not ready:
+                raise InvalidInputError('Stages depend on each other in a cycle: ' + ', '.join(remaining))
+            order.extend(ready)
+            done.update(ready)
+            remaining = [name for name in remaining if name not in done]
+        return order
+
+    def read_state(self) -> Dict:
+        try:
+            with open(self.state_file, 'r') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            state = dict()
+        state.setdefault('stages', dict())
+        state.setdefault('files', dict())
+        return state
+
+    def write_state(self) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(self.state_file)), exist_ok=True)
+        with open(f'{self.state_file}.{os.getpid()}', 'w') as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(f'{self.state_file}.{os.getpid()}', self.state_file)
+
+    def stage_key(self, stage:Stage) -> str:
+        for f in stage.inputs:
+            if not os.path.exists(f):
+                raise FileNotFoundError(f'No such input file of {stage.name}: {f}')
+        memo = self.state['files']
+        return content_key(
+            f'{stage.function.__module__}.{stage.function.__qualname__}',
+            json.dumps(stage.params, sort_keys=True),
+            *[f'{os.path.abspath(f)}:{file_digest(f, memo)}' for f in stage.inputs])
+
+    def is_stale(self, stage:Stage, key:str) -> bool:
+        record = self.state['stages'].get(stage.name)
+        if self.clobber or record is None or record['key'] != key:
+            return True
+        memo = self.state['files']
+        return any(not os.path.exists(f) or file_digest(f, memo) != record['outputs'].get(os.path.abspath(f))
+                   for f in stage.outputs)
+
+    def finish(self, stage:Stage, key:str, duration:float) -> None:
+        """Record the key and the digests of the outputs of the stage that has run."""
+        missing = [f for f in stage.outputs if not os.path.exists(f)]
+        if missing:
+            raise FileNotFoundError(f'{stage.name} did not make ' + ', '.join(missing))
+        memo = self.state['files']
+        self.state['stages'][stage.name] = dict(
+            key=key, outputs=dict((os.path.abspath(f), file_digest(f, memo)) for f in stage.outputs))
+        self.write_state()
+        self.info(f'{stage.name} finished in {duration:.2f} s')
+
+    def run(self, dry_run:bool=False) -> Dict:
+        """Run the stale stages and return the report of the status and the duration of each stage.
+
+        The status is run, skipped (up to date), failed, or blocked by a failed
+        stage. With dry_run, stale stages and the stages after them are
+        reported as stale without being run.
+        """
+        self.debug('START', inspect.currentframe())
+        start = time.perf_counter()
+        self.rows = dict((name, dict(name=name, status=None, duration=0.0)) for name in self.order)
+        if dry_run:
+            self.plan()
+        elif self.workers == 1:
+            self.run_serial()
+        else:
+            self.run_pool()
+        counts = dict()
+        for row in self.rows.values():
+            counts[row['status']] = counts.get(row['status'], 0) + 1
+            if row['status'] == 'failed':
+                self.warning(f'{row["name"]} failed: {row["message"]}')
+        self.info(', '.join(f'{n} {status}' for status, n in counts.items()) + f' of {len(self.rows)} stage(s)')
+        self.debug('END', inspect.currentframe())
+        return dict(stages=[self.rows[name] for name in self.order], counts=counts,
+                    duration=time.perf_counter() - start)
+
+    def prepare(self, name:str) -> str:
+        """Key of the stage if it should run, or None after setting its status."""
+        row = self.rows[name]
+        blocking = [n for n in self.depends[name] if self.rows[n]['status'] in ('failed', 'blocked')]
+        if blocking:
+            row.update(status='blocked', message='after ' + ', '.join(blocking))
+            return None
+        try:
+            key = self.stage_key(self.stages[name])
+            if self.is_stale(self.stages[name], key):
+                return key
+        except Exception as err:
+            self.fail(name, err)
+            return None
+        row.update(status='skipped')
+        self.debug(f'{name} is up to date')
+        return None
+
+    def fail(self, name:str, error:Exception) -> None:
+        self.rows[name].update(status='failed', message=f'{type(error).__name__}: {error}')
+        # the stage runs again next time even if it is given the same inputs
+        if self.state['stages'].pop(name, None) is not None:
+            self.write_state()
+
+    def complete(self, name:str, key:str, duration:float) -> None:
+        self.rows[name].update(status='run', duration=duration)
+        try:
+            self.finish(self.stages[name], key, duration)
+        except Exception as err:
+            self.fail(name, err)
+
+    def plan(self) -> None:
+        for name in self.order:
+            if any(self.rows[n]['status'] == 'stale' for n in self.depends[name]):
+                self.rows[name].update(status='stale')
+            elif self.prepare(name) is not None:
+                self.rows[name].update(status='stale')
+
+    def run_serial(self) -> None:
+        for name in self.order:
+            key = self.prepare(name)
+            if key is None:
+                continue
+            self.info(f'Run {name}')
+            try:
+                duration = run_stage(self.stages[name].function, self.stages[name].params)
+            except Exception as err:
+                self.fail(name, err)
+                continue
+            self.complete(name, key, duration)
+
+    def run_pool(self) -> None:
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            pending = dict()
+            waiting = list(self.order)
+
+            def submit_ready() -> None:
+                for name in list(waiting):
+                    if any(self.rows[n]['status'] is None for n in self.depends[name]):
+                        continue
+                    waiting.remove(name)
+                    key = self.prepare(name)
+                    if key is not None:
+                        self.info(f'Run {name}')
+                        stage = self.stages[name]
+                        pending[executor.submit(run_stage, stage.function, stage.params)] = (name, key)
+
+            submit_ready()
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name, key = pending.pop(future)
+                    if future.exception() is None:
+                        self.complete(name, key, future.result())
+                    else:
+                        self.fail(name, future.exception())
+                submit_ready()
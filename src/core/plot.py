@@ -1,12 +1,10 @@
 # -*- coding: utf-8 -*-
 
+import sys
+from functools import lru_cache
 from typing import List, Tuple, Union
 
-import matplotlib as mpl
-import matplotlib.pyplot as plt
-import matplotlib._color_data as mcd
 from numpy import ndarray
-import seaborn as sns
 
 from ..util.object import ObjectLikeDict
 
@@ -30,26 +28,51 @@ PLTFMT = ','                       # format for plot with errors
 MASIZE = 5.0                       # marker size
 DPI = 100                          # resolution of the figure
 IGFONT = ObjectLikeDict(family='IPAexGothic')
-COLORS = ObjectLikeDict({
-    'blue': sns.color_palette('muted').as_hex()[0],
-    'orange': sns.color_palette('muted').as_hex()[1],
-    'green': sns.color_palette('muted').as_hex()[2],
-    'red': sns.color_palette('muted').as_hex()[3],
-    'violet': sns.color_palette('muted').as_hex()[4],
-    'brown': sns.color_palette('muted').as_hex()[5],
-    'pink': sns.color_palette('muted').as_hex()[6],
-    'gray': sns.color_palette('muted').as_hex()[7],
-    'ocher': sns.color_palette('muted').as_hex()[8],
-    'cyan': sns.color_palette('muted').as_hex()[9],
-    'white': mcd.CSS4_COLORS['white'],
-    'black': mcd.CSS4_COLORS['black'],
-    'yellow': mcd.CSS4_COLORS['gold'],
-    'peach': sns.color_palette("husl", 8).as_hex()[0],
-    'emerald': sns.color_palette("husl", 8).as_hex()[4],
-    'turquoise': sns.color_palette("husl", 8).as_hex()[5],
-    'purple': sns.color_palette("husl", 8).as_hex()[6],
-    'magenta': sns.color_palette("husl", 8).as_hex()[7],
-})
+
+
+@lru_cache(maxsize=None)
+def palette() -> ObjectLikeDict:
+    """Named colors, made from seaborn palettes on first use."""
+    import matplotlib._color_data as mcd
+    import seaborn as sns
+    muted = sns.color_palette('muted').as_hex()
+    husl = sns.color_palette('husl', 8).as_hex()
+    return ObjectLikeDict({
+        'blue': muted[0],
+        'orange': muted[1],
+        'green': muted[2],
+        'red': muted[3],
+        'violet': muted[4],
+        'brown': muted[5],
+        'pink': muted[6],
+        'gray': muted[7],
+        'ocher': muted[8],
+        'cyan': muted[9],
+        'white': mcd.CSS4_COLORS['white'],
+        'black': mcd.CSS4_COLORS['black'],
+        'yellow': mcd.CSS4_COLORS['gold'],
+        'peach': husl[0],
+        'emerald': husl[4],
+        'turquoise': husl[5],
+        'purple': husl[6],
+        'magenta': husl[7],
+    })
+
+
+def __getattr__(name:str):
+    # COLORS is kept as a module attribute, computed on first access
+    if name == 'COLORS':
+        return palette()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def pyplot(interactive:bool=True):
+    """Import pyplot, with the non-GUI Agg backend unless figures are shown."""
+    import matplotlib
+    if not interactive and 'matplotlib.pyplot' not in sys.modules:
+        matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
 
 
 def configure_figure(figsize: Tuple[int, int] = (FIGSIZE.x, FIGSIZE.y),
@@ -59,7 +82,9 @@ def configure_figure(figsize: Tuple[int, int] = (FIGSIZE.x, FIGSIZE.y),
                      wspace: float = GRIDSPACE.w, hspace: float = GRIDSPACE.h,
                      sharex: bool = True, sharey: bool = True,
                      width_ratios: List = GRIDRATIO.w,
-                     height_ratios: List = GRIDRATIO.h) -> (mpl.figure.Figure, Union[ndarray, mpl.axes.Subplot]):
+                     height_ratios: List = GRIDRATIO.h,
+                     interactive: bool = True) -> Tuple['matplotlib.figure.Figure', Union[ndarray, 'matplotlib.axes.Axes']]:
+    plt = pyplot(interactive)
     if sharex:
         sharex = 'col'
     if sharey:
@@ -106,11 +131,12 @@ class SimplePlot(object):
         self.pltfmt: str = args.get('pltfmt', PLTFMT)
         self.masize: float = args.get('masize', MASIZE)
         self.igfont: ObjectLikeDict = args.get('igfont', IGFONT)
-        self.colors: ObjectLikeDict = args.get('colors', COLORS)
+        self.colors: ObjectLikeDict = args['colors'] if 'colors' in args else palette()
         self.sharex: bool = args.get('sharex', True)
         self.sharey: bool = args.get('sharey', True)
         self.width_ratios: List = args.get('width_ratios', GRIDRATIO.w)
         self.height_ratios: List = args.get('height_ratios', GRIDRATIO.h)
+        self.interactive: bool = args.get('interactive', True)
         if configure:
             self.configure()
 
@@ -124,9 +150,11 @@ class SimplePlot(object):
             wspace=self.wspace, hspace=self.hspace,
             sharex=self.sharex, sharey=self.sharey,
             width_ratios=self.width_ratios,
-            height_ratios=self.height_ratios)
+            height_ratios=self.height_ratios,
+            interactive=self.interactive)
 
     def set_rcparams(self) -> None:
+        plt = pyplot(self.interactive)
         plt.rcParams['font.family'] = 'Times New Roman'
         plt.rcParams['mathtext.fontset'] = 'cm'
         plt.rcParams['mathtext.rm'] = 'serif'
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+
+import glob
+import os
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+from ..util.error import InvalidInputError
+
+
+SERR_COMMAND = 'READ SERR 1 2' # x and y with symmetric errors, as the event density QDP
+FLOAT_FORMAT = '%.8e'
+RESULT_SUFFIX = '_result.qdp'
+ERROR_WIDTHS = dict(SERR=1, TERR=2) # error columns following the vector
+DEFAULT_ERRORS = {1: 'SERR', 2: 'SERR'} # {d_dat, d_err, e_dat, e_err} of a QDP without READ
+
+
+class QdpData(object):
+    """Header commands and data blocks of a QDP file.
+
+    A block has the columns as written in the file, where a vector read with
+    SERR or TERR is followed by one or two error columns, and NO is NaN.
+    Without READ SERR or TERR, a block of four columns is taken as
+    {d_dat, d_err, e_dat, e_err}.
+    """
+
+    def __init__(self, commands:List[str], errors:Dict[int, str], blocks:List[np.ndarray]) -> None:
+        self.commands = commands
+        self.errors = errors
+        self.blocks = blocks
+
+    def vectors(self, block:int=0) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Values and errors of each vector, averaging the two-sided errors of TERR."""
+        data = self.blocks[block]
+        kinds = self.errors or (DEFAULT_ERRORS if data.shape[1] == 4 else dict())
+        vectors = list()
+        column = 0
+        while column < data.shape[1]:
+            width = ERROR_WIDTHS.get(kinds.get(len(vectors)+1), 0)
+            if column + width >= data.shape[1]:
+                raise InvalidInputError(f'Error columns of vector {len(vectors)+1} are missing.')
+            values = data[:, column]
+            if width == 0:
+                errors = np.zeros_like(values)
+            else:
+                errors = np.abs(data[:, column+1:column+1+width]).mean(axis=1)
+            vectors.append((values, errors))
+            column += 1 + width
+        return vectors
+
+    def curve(self, block:int=0) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Event densities, line energies and their errors from the first two vectors of the block."""
+        if not self.errors and not self.blocks[block].shape[1] == 4:
+            raise InvalidInputError('QDP without READ SERR or TERR should have the columns of '
+                                    '{d_dat, d_err, e_dat, e_err}.')
+        vectors = self.vectors(block)
+        if len(vectors) < 2:
+            raise InvalidInputError('QDP should have x and y vectors.')
+        (x, xe), (y, ye) = vectors[:2]
+        return x, xe, y, ye
+
+
+def parse_read_command(words:List[str], errors:Dict[int, str]) -> None:
+    """Record the vectors of the command if it is READ SERR or READ TERR."""
+    if len(words) < 2 or words[0].upper() != 'READ' or words[1][:1].upper() not in 'ST':
+        return
+    kind = 'SERR' if words[1][:1].upper() == 'S' else 'TERR'
+    try:
+        for word in words[2:]:
+            errors[int(word)] = kind
+    except ValueError:
+        raise InvalidInputError('Vectors of READ ' + ' '.join(words[1:]) + ' are invalid.')
+
+
+def to_block(rows:List[List[str]], source:str) -> np.ndarray:
+    try:
+        return np.array(rows, dtype=float)
+    except ValueError:
+        raise InvalidInputError(f'Data rows of {source} have different numbers of columns or invalid values.')
+
+
+def parse_qdp(lines:Iterable[str], source:str='QDP') -> QdpData:
+    """Parse header commands, READ SERR/TERR, data rows and NO separators in a single pass.
+
+    Comments after "!" and blank lines are dropped, and a row of NO only
+    separates blocks. Commands are kept, while data rows are not kept as text.
+    """
+    commands, errors, blocks = list(), dict(), list()
+    rows = list()
+    for line in lines:
+        words = line.partition('!')[0].split()
+        if not words:
+            continue
+        first = words[0][0]
+        if first.isdigit() or first in '+-.' or words[0].upper() == 'NO':
+            if all(word.upper() == 'NO' for word in words):
+                if rows:
+                    blocks.append(to_block(rows, source))
+                    rows = list()
+                continue
+            rows.append(['nan' if word.upper() == 'NO' else word for word in words])
+        else:
+            parse_read_command(words, errors)
+            commands.append(' '.join(words))
+    if rows:
+        blocks.append(to_block(rows, source))
+    if not blocks:
+        raise InvalidInputError(f'No data is found in {source}')
+    return QdpData(commands, errors, blocks)
+
+
+def read_qdp_file(qdp:str) -> QdpData:
+    if not os.path.exists(qdp):
+        raise FileNotFoundError(f'No such QDP file: {qdp}')
+    with open(qdp, 'r') as f:
+        return parse_qdp(f, source=qdp)
+
+
+def qdp_files(directory:str, pattern:str='*.qdp') -> List[str]:
+    """QDP files in the directory in order of the names, leaving out the results of fitting."""
+    if not os.path.isdir(directory):
+        raise FileNotFoundError(f'No such directory: {directory}')
+    return sorted(
+        path for path in glob.glob(os.path.join(directory, pattern)) if not path.endswith(RESULT_SUFFIX))
+
+
+def read_qdp_directory(directory:str, pattern:str='*.qdp') -> Dict[str, QdpData]:
+    """Read all the QDP files in the directory, keyed by the path."""
+    qdp_list = qdp_files(directory, pattern)
+    if not qdp_list:
+        raise InvalidInputError(f'No QDP file is found in {directory}')
+    return dict((qdp, read_qdp_file(qdp)) for qdp in qdp_list)
+
+
+def format_block(block:np.ndarray, fmt:str=FLOAT_FORMAT) -> str:
+    """Rows of the block formatted at once, writing NaN as NO."""
+    block = np.atleast_2d(np.asarray(block, dtype=float))
+    row = ' '.join([fmt]*block.shape[1]) + '\n'
+    text = (row*block.shape[0]) % tuple(block.ravel())
+    return text.replace('nan', 'NO') if np.isnan(block).any() else text
+
+
+def write_qdp_file(qdp:str, blocks:List[np.ndarray], commands:List[str]=(SERR_COMMAND,),
+                   fmt:str=FLOAT_FORMAT) -> None:
+    """Write the commands and the blocks separated by rows of NO."""
+    parts = [''.join(f'{command}\n' for command in commands) + '!\n']
+    for n, block in enumerate(blocks):
+        block = np.atleast_2d(block)
+        if n > 0:
+            parts.append(' '.join(['NO']*block.shape[1]) + '\n')
+        parts.append(format_block(block, fmt))
+    with open(qdp, 'w') as f:
+        f.write(''.join(parts))
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+
+import inspect
+import os
+import re
+from typing import List, Tuple
+
+import numpy as np
+
+from ..util.common import Common
+from ..util.error import InvalidInputError
+from .image import ARCMIN2PIXEL, radius_grid, read_image
+
+
+SHAPES = ('circle', 'annulus', 'box', 'polygon')
+
+
+class RegionShape(object):
+    """A DS9 shape in physical coordinates."""
+
+    def __init__(self, name:str, params:Tuple[float, ...], exclude:bool=False) -> None:
+        if name not in SHAPES:
+            raise InvalidInputError(f'Unsupported region shape: {name}')
+        self.name = name
+        self.params = params
+        self.exclude = exclude
+
+    @property
+    def bbox(self) -> Tuple[float, float, float, float]:
+        """Bounding box of (xmin, xmax, ymin, ymax)."""
+        p = self.params
+        if self.name in ('circle', 'annulus'):
+            return p[0]-p[-1], p[0]+p[-1], p[1]-p[-1], p[1]+p[-1]
+        elif self.name == 'box':
+            half = 0.5*np.hypot(p[2], p[3])
+            return p[0]-half, p[0]+half, p[1]-half, p[1]+half
+        else:
+            return min(p[0::2]), max(p[0::2]), min(p[1::2]), max(p[1::2])
+
+    def contains(self, x:np.ndarray, y:np.ndarray) -> np.ndarray:
+        """Whether the pixel centres at the broadcast x and y are within the shape."""
+        p = self.params
+        if self.name == 'circle':
+            return np.hypot(x-p[0], y-p[1]) <= p[2]
+        elif self.name == 'annulus':
+            radius = np.hypot(x-p[0], y-p[1])
+            return (radius >= p[2]) & (radius <= p[-1])
+        elif self.name == 'box':
+            angle = np.deg2rad(p[4]) if len(p) > 4 else 0.0
+            dx, dy = x-p[0], y-p[1]
+            u = dx*np.cos(angle) + dy*np.sin(angle)
+            v = -dx*np.sin(angle) + dy*np.cos(angle)
+            return (np.abs(u) <= 0.5*p[2]) & (np.abs(v) <= 0.5*p[3])
+        else:
+            # even-odd rule over the edges of the polygon
+            vx, vy = np.array(p[0::2]), np.array(p[1::2])
+            inside = np.zeros(np.broadcast(x, y).shape, dtype=bool)
+            for x0, y0, x1, y1 in zip(vx, vy, np.roll(vx, -1), np.roll(vy, -1)):
+                if y0 == y1:
+                    continue
+                crossing = ((y0 > y) != (y1 > y)) & (x < (x1-x0)*(y-y0)/(y1-y0) + x0)
+                inside ^= crossing
+            return inside
+
+
+def read_region(region:str) -> List[RegionShape]:
+    """Read shapes following the physical line of a DS9 region file."""
+    if not os.path.exists(region):
+        raise FileNotFoundError(f'No such region file: {region}')
+    with open(region, 'r') as f:
+        text = f.read()
+    if 'physical' not in text:
+        raise InvalidInputError(f'{region} is not written in physical coordinates.')
+    shapes = list()
+    for entry in re.split(r'[;\n]', text.split('physical', 1)[1]):
+        match = re.match(r'\s*([-+]?)\s*(\w+)\s*\(([^)]*)\)', entry.split('#')[0])
+        if match is None:
+            continue
+        try:
+            params = tuple(float(v) for v in match.group(3).split(','))
+        except ValueError:
+            raise InvalidInputError(f'Invalid region in {region}: {entry.strip()}')
+        shapes.append(RegionShape(match.group(2), params, exclude=match.group(1) == '-'))
+    if not shapes:
+        raise InvalidInputError(f'No region is found in {region}')
+    return shapes
+
+
+def write_circle_region(region:str, x:float, y:float, radius:float) -> None:
+    with open(region, 'w') as f:
+        f.write('# Region file format: DS9\n')
+        f.write('physical\n')
+        f.write(f'circle({x},{y},{radius:5.2f})\n')
+
+
+def write_annulus_region(region:str, x:float, y:float, inner:float, outer:float) -> None:
+    with open(region, 'w') as f:
+        f.write('# Region file format: DS9\n')
+        f.write('physical\n')
+        f.write(f'annulus({x},{y},{inner:f},{outer:f})\n')
+
+
+class AnnulusRegionPlanner(Common):
+    """Split a circle around a source into annuli of equal counts."""
+
+    def __init__(self, image:str, skyx:float, skyy:float, loglv:int=1) -> None:
+        super().__init__(loglv)
+        self.image = image
+        self.skyx = skyx
+        self.skyy = skyy
+        self.data, header = read_image(image)
+        self.radius_grid = radius_grid(self.data.shape, header, skyx, skyy)
+
+    def build_profile(self, outer:float) -> None:
+        """Sort the pixels within the outer radius in pixel into a cumulative radial profile."""
+        inside = self.radius_grid <= outer
+        radius = self.radius_grid[inside]
+        order = np.argsort(radius)
+        self.radius = radius[order]
+        self.counts = self.data[inside][order]
+        self.cumulative = np.cumsum(self.counts)
+
+    def enclosed_count(self, radius:np.ndarray) -> np.ndarray:
+        """Counts of pixels whose centres are within the radius in pixel."""
+        index = np.searchsorted(self.radius, radius, side='right')
+        return np.where(index > 0, self.cumulative[np.maximum(index-1, 0)], 0.0)
+
+    def find_radius(self, count:np.ndarray) -> np.ndarray:
+        """Radius in pixel at which the enclosed counts reach the count."""
+        index = np.clip(np.searchsorted(self.cumulative, count, side='left'), 1, self.radius.size-1)
+        below = self.cumulative[index-1]
+        fraction = np.clip((count - below)/np.maximum(self.counts[index], 1.0), 0.0, 1.0)
+        return self.radius[index-1] + fraction*(self.radius[index] - self.radius[index-1])
+
+    def plan(self, regnum:int, inner_radius:float, outer_radius:float) -> Tuple[np.ndarray, float]:
+        """Return the boundary radii in arcmin of the annuli and the count for each region."""
+        self.debug('START', inspect.currentframe())
+        if regnum < 1:
+            raise InvalidInputError('Number of regions should be positive.')
+        if not 0.0 <= inner_radius < outer_radius:
+            raise InvalidInputError('Outer radius should be greater than inner radius.')
+        inner, outer = inner_radius*ARCMIN2PIXEL, outer_radius*ARCMIN2PIXEL
+        self.build_profile(outer)
+        total_count = self.enclosed_count(outer)
+        each_count = float(int(total_count/regnum))
+        if each_count <= 0.0:
+            raise InvalidInputError(f'Not enough counts in {self.image}')
+        self.debug(f'Total count in extreme circle region: {total_count}')
+        self.debug(f'Count for each region: {each_count}')
+
+        targets = self.enclosed_count(inner) + each_count*np.arange(1, regnum)
+        radii = np.concatenate(([inner], self.find_radius(targets), [outer]))
+        radii = np.clip(radii, inner, outer)/ARCMIN2PIXEL
+        self.debug('END', inspect.currentframe())
+        return radii, each_count
+
+    def write_regions(self, outdir:str, prefix:str, regnum:int,
+                      inner_radius:float, outer_radius:float) -> List[str]:
+        self.debug('START', inspect.currentframe())
+        radii, each_count = self.plan(regnum, inner_radius, outer_radius)
+        counts = np.diff(self.enclosed_count(radii*ARCMIN2PIXEL))
+        os.makedirs(outdir, exist_ok=True)
+
+        whole_circle_region = os.path.join(outdir, f'{prefix}_circle0.reg')
+        write_circle_region(whole_circle_region, self.skyx, self.skyy, outer_radius*ARCMIN2PIXEL)
+        self.debug(f'Make region: {os.path.basename(whole_circle_region)}')
+
+        region_list = list()
+        for i in range(regnum):
+            self.info(f'Make region: {i+1} / {regnum}')
+            region = os.path.join(outdir, f'{prefix}_circle{i+1}.reg')
+            write_annulus_region(region, self.skyx, self.skyy,
+                                 radii[i]*ARCMIN2PIXEL, radii[i+1]*ARCMIN2PIXEL)
+            self.info(f'  inner radius: {radii[i]:.4f} arcmin')
+            self.info(f'  outer radius: {radii[i+1]:.4f} arcmin')
+            self.info(f'  count: {counts[i]} / reference: {each_count} = ratio: {counts[i]/each_count:4.2f}')
+            region_list.append(region)
+        self.debug('END', inspect.currentframe())
+        return region_list
@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+
+import inspect
+import json
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Dict, List
+
+from ..util.common import Common
+from ..util.error import InvalidInputError
+from .event import EventImageBinner, unfiltered_event_files
+from .region import AnnulusRegionPlanner
+
+
+XIS_SENSORS = ('0', '1', '2', '3')
+
+
+def read_observations(manifest:str) -> List[Dict]:
+    """Read observation directories and the sky positions of their sources.
+
+    A text manifest has directory, skyx and skyy, and optionally the output
+    directory of the regions, as a comma-separated line per observation. A
+    JSON manifest is a list of objects with the same keys.
+    """
+    if not os.path.exists(manifest):
+        raise FileNotFoundError(f'No such manifest file: {manifest}')
+    keys = ('directory', 'skyx', 'skyy', 'outdir')
+    with open(manifest, 'r') as f:
+        if os.path.splitext(manifest)[1].lower() == '.json':
+            items = json.load(f)
+        else:
+            items = list()
+            for line in f.read().splitlines():
+                values = [value.strip() for value in line.split('#')[0].split(',')]
+                if values != ['']:
+                    items.append(dict(zip(keys, values)))
+    observations = list()
+    for item in items:
+        try:
+            observations.append(dict(
+                directory=item['directory'], skyx=float(item['skyx']), skyy=float(item['skyy']),
+                outdir=item.get('outdir') or None))
+        except (KeyError, TypeError, ValueError):
+            raise InvalidInputError(f'Observation in {manifest} should have directory, skyx and skyy: {item}')
+    if not observations:
+        raise InvalidInputError(f'No observation is found in {manifest}')
+    return observations
+
+
+class RegionTask(object):
+    """All grade image and annuli of an XIS sensor in an observation directory."""
+
+    def __init__(self, directory:str, xis:str, skyx:float, skyy:float,
+                 image:str=None, outdir:str=None) -> None:
+        if xis not in XIS_SENSORS:
+            raise InvalidInputError('XIS should be one of ' + ', '.join(XIS_SENSORS))
+        anadir = os.path.join(directory, 'xis', 'analysis')
+        self.directory = directory
+        self.xis = xis
+        self.skyx = skyx
+        self.skyy = skyy
+        self.image = image or os.path.join(anadir, 'img', 'grade', f'x{xis}_grade_0_7.img.gz')
+        self.outdir = outdir or os.path.join(anadir, 'reg', 'scf')
+        self.prefix = f'x{xis}'
+
+    @property
+    def stamp(self) -> str:
+        """Record of the parameters and the image that the regions were made from."""
+        return os.path.join(self.outdir, f'{self.prefix}_scf.json')
+
+    def image_is_stale(self, clobber:bool=False) -> bool:
+        """Whether the image is missing, or older than the unfiltered event files or clobbered.
+
+        An existing image is used as it is without the event files.
+        """
+        if not os.path.exists(self.image):
+            return True
+        evtfiles = unfiltered_event_files(self.directory, self.xis)
+        mtime = os.stat(self.image).st_mtime_ns
+        return bool(evtfiles) and (clobber or any(os.stat(f).st_mtime_ns > mtime for f in evtfiles))
+
+    def record(self, regnum:int, inner_radius:float, outer_radius:float) -> Dict:
+        stat = os.stat(self.image)
+        return dict(image=os.path.abspath(self.image), size=stat.st_size, mtime_ns=stat.st_mtime_ns,
+                    skyx=self.skyx, skyy=self.skyy, regnum=regnum,
+                    inner_radius=inner_radius, outer_radius=outer_radius)
+
+    def regions_are_fresh(self, record:Dict) -> bool:
+        """Whether the regions were made with the record and all of them exist."""
+        try:
+            with open(self.stamp, 'r') as f:
+                stamp = json.load(f)
+        except (OSError, ValueError):
+            return False
+        regions = stamp.pop('regions', [])
+        return stamp == record and len(regions) == record['regnum'] + 1 and all(
+            os.path.exists(os.path.join(self.outdir, region)) for region in regions)
+
+
+def make_image(directory:str, xis:str, image:str, workers:int, loglv:int) -> None:
+    """Bin the unfiltered event files into the image through a temporary file."""
+    binner = EventImageBinner(
+        evtfiles=unfiltered_event_files(directory, xis), workers=workers, loglv=loglv)
+    os.makedirs(os.path.dirname(os.path.abspath(image)), exist_ok=True)
+    # the temporary file keeps the extension, which tells astropy to compress it
+    temporary = os.path.join(os.path.dirname(image), f'.{os.getpid()}.{os.path.basename(image)}')
+    binner.write(temporary, clobber=True)
+    os.replace(temporary, image)
+
+
+def make_regions(task:RegionTask, record:Dict, loglv:int) -> List[str]:
+    """Write the annuli and then the stamp of the record, so that the stamp tells completed regions."""
+    planner = AnnulusRegionPlanner(image=task.image, skyx=task.skyx, skyy=task.skyy, loglv=loglv)
+    regions = planner.write_regions(
+        outdir=task.outdir, prefix=task.prefix, regnum=record['regnum'],
+        inner_radius=record['inner_radius'], outer_radius=record['outer_radius'])
+    stamp = dict(record, regions=[os.path.basename(region) for region in
+                                  [os.path.join(task.outdir, f'{task.prefix}_circle0.reg')] + regions])
+    with open(f'{task.stamp}.{os.getpid()}', 'w') as f:
+        json.dump(stamp, f, indent=2)
+    os.replace(f'{task.stamp}.{os.getpid()}', task.stamp)
+    return regions
+
+
+class BatchRegionPlanner(Common):
+    """Make all grade images and annuli of many observations and sensors in a process pool.
+
+    An image is made once for the tasks that share it, and the annuli of a
+    task are planned as soon as its image is ready. Images newer than the
+    event files and regions whose stamp matches the parameters and the image
+    are skipped unless clobber is set.
+    """
+
+    def __init__(self, tasks:List[RegionTask], regnum:int, inner_radius:float, outer_radius:float,
+                 workers:int=None, clobber:bool=False, loglv:int=1) -> None:
+        super().__init__(loglv)
+        if not tasks:
+            raise InvalidInputError('No observation is given.')
+        outputs = [(os.path.abspath(task.outdir), task.prefix) for task in tasks]
+        if len(set(outputs)) < len(outputs):
+            raise InvalidInputError('Regions of different tasks should be written to different directories.')
+        if regnum < 1:
+            raise InvalidInputError('Number of regions should be positive.')
+        if not 0.0 <= inner_radius < outer_radius:
+            raise InvalidInputError('Outer radius should be greater than inner radius.')
+        self.tasks = tasks
+        self.regnum = regnum
+        self.inner_radius = inner_radius
+        self.outer_radius = outer_radius
+        self.workers = workers
+        self.clobber = clobber
+
+    def run(self) -> List[Dict]:
+        """Return the status of each task, which is made, skipped or failed."""
+        self.debug('START', inspect.currentframe())
+        users = dict()
+        for n, task in enumerate(self.tasks):
+            users.setdefault(os.path.abspath(task.image), list()).append(n)
+        # images to be made, keyed by the absolute path
+        self.images = dict()
+        for path, indices in users.items():
+            task = self.tasks[indices[0]]
+            if task.image_is_stale(self.clobber):
+                self.images[path] = (task.directory, task.xis, task.image)
+        rows = [dict(directory=task.directory, xis=task.xis, image=task.image, outdir=task.outdir)
+                for task in self.tasks]
+        if len(self.tasks) == 1 or self.workers == 1:
+            self.run_serial(users, rows)
+        else:
+            self.run_pool(users, rows)
+        nfail = sum(row['status'] == 'failed' for row in rows)
+        for row in rows:
+            if row['status'] == 'failed':
+                self.warning(f'XIS{row["xis"]} of {row["directory"]} failed: {row["message"]}')
+        self.info(f'{len(rows)-nfail} / {len(rows)} task(s) are up to date')
+        self.debug('END', inspect.currentframe())
+        return rows
+
+    def image_arguments(self, path:str, workers:int):
+        directory, xis, image = self.images[path]
+        return directory, xis, image, workers, max(self.loglv, 2)
+
+    def region_record(self, n:int, rows:List[Dict]) -> Dict:
+        """Record of the n-th task, or None if the regions are up to date or the image failed."""
+        task = self.tasks[n]
+        if 'status' in rows[n]:
+            return None
+        record = task.record(self.regnum, self.inner_radius, self.outer_radius)
+        if not self.clobber and task.regions_are_fresh(record):
+            rows[n].update(status='skipped')
+            self.debug(f'Regions of XIS{task.xis} in {task.directory} are up to date')
+            return None
+        return record
+
+    def finish_image(self, path:str, users:Dict[str, List[int]], rows:List[Dict], error:Exception) -> None:
+        if error is None:
+            self.info(f'Make image: {path}')
+            return
+        for n in users[path]:
+            rows[n].update(status='failed', message=f'{type(error).__name__}: {error}')
+
+    def finish_regions(self, n:int, rows:List[Dict], error:Exception) -> None:
+        if error is None:
+            rows[n].update(status='made')
+            self.info(f'Make regions of XIS{self.tasks[n].xis} in {self.tasks[n].directory}')
+        else:
+            rows[n].update(status='failed', message=f'{type(error).__name__}: {error}')
+
+    def run_serial(self, users:Dict[str, List[int]], rows:List[Dict]) -> None:
+        for path, indices in users.items():
+            if path in self.images:
+                try:
+                    make_image(*self.image_arguments(path, self.workers))
+                    self.finish_image(path, users, rows, None)
+                except Exception as err:
+                    self.finish_image(path, users, rows, err)
+            for n in indices:
+                record = self.region_record(n, rows)
+                if record is None:
+                    continue
+                try:
+                    make_regions(self.tasks[n], record, self.loglv)
+                    self.finish_regions(n, rows, None)
+                except Exception as err:
+                    self.finish_regions(n, rows, err)
+
+    def run_pool(self, users:Dict[str, List[int]], rows:List[Dict]) -> None:
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            pending = dict()
+
+            def submit_regions(indices:List[int]) -> None:
+                for n in indices:
+                    record = self.region_record(n, rows)
+                    if record is not None:
+                        future = executor.submit(make_regions, self.tasks[n], record, max(self.loglv, 2))
+                        pending[future] = ('regions', n)
+
+            for path, indices in users.items():
+                if path in self.images:
+                    # images are binned in parallel over the images instead of the event files
+                    future = executor.submit(make_image, *self.image_arguments(path, 1))
+                    pending[future] = ('image', path)
+                else:
+                    submit_regions(indices)
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    kind, key = pending.pop(future)
+                    error = future.exception()
+                    if kind == 'image':
+                        self.finish_image(key, users, rows, error)
+                        if error is None:
+                            submit_regions(users[key])
+                    else:
+                        self.finish_regions(key, rows, error)
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from ..util.error import InvalidInputError
+
+
+MODES = ('montecarlo', 'bootstrap')
+PERCENTILES = (2.5, 16.0, 50.0, 84.0, 97.5)
+CHUNK_ELEMENTS = 4000000 # elements of the Jacobian solved at once
+CHUNK_SAMPLES = 250 # samples fitted at once at most, so that a few thousand samples make chunks for the workers
+
+
+def batch_levenberg_marquardt(E:np.ndarray, y:np.ndarray, sigma:np.ndarray, index:np.ndarray, ndata:int,
+                              start:np.ndarray, free:np.ndarray, lower:np.ndarray, upper:np.ndarray,
+                              max_iter:int=100, ftol:float=1e-10) -> Tuple[np.ndarray, np.ndarray]:
+    """Fit the joint SCF curve to a batch of data sets by damped Gauss-Newton steps.
+
+    E, y and sigma are of shape (number of samples, number of points), and
+    the parameters are (Et_0, ..., Et_{ndata-1}, C, epsilon) for each sample,
+    of which the ones not free stay at the start. Return the parameters in
+    shape of (number of samples, number of parameters) and the chi-square.
+    """
+    nsample, npoint = y.shape
+    points = np.arange(npoint)
+    params = np.tile(start, (nsample, 1))
+    damping = np.full(nsample, 1e-3)
+
+    def residual_jacobian(params):
+        Et, C, epsilon = params[:, :ndata][:, index], params[:, [ndata]], params[:, [ndata+1]]
+        decay = np.exp(-epsilon*E)
+        residual = (y - Et*(1 - C*decay))/sigma
+        jacobian = np.zeros((nsample, npoint, ndata+2))
+        jacobian[:, points, index] = (1 - C*decay)/sigma
+        jacobian[:, :, ndata] = -Et*decay/sigma
+        jacobian[:, :, ndata+1] = Et*C*E*decay/sigma
+        jacobian[:, :, ~free] = 0.0
+        return residual, jacobian
+
+    residual, jacobian = residual_jacobian(params)
+    chisqr = (residual**2).sum(-1)
+    fixed = np.diag((~free).astype(float))
+    for _ in range(max_iter):
+        jtj = np.einsum('snp,snq->spq', jacobian, jacobian)
+        jtr = np.einsum('snp,sn->sp', jacobian, residual)
+        scale = np.einsum('spp->sp', jtj)
+        matrix = jtj + damping[:, None, None]*(scale[:, :, None]*np.eye(ndata+2)) + fixed
+        step = np.linalg.solve(matrix, jtr[..., None])[..., 0]
+        trial = np.clip(params + step, lower, upper)
+        trial_residual, trial_jacobian = residual_jacobian(trial)
+        trial_chisqr = (trial_residual**2).sum(-1)
+        better = trial_chisqr < chisqr
+        converged = better & (chisqr - trial_chisqr <= ftol*chisqr)
+        params[better] = trial[better]
+        residual[better], jacobian[better] = trial_residual[better], trial_jacobian[better]
+        chisqr = np.where(better, trial_chisqr, chisqr)
+        damping = np.where(better, damping/10, damping*10)
+        if np.all(converged | (damping > 1e10)):
+            break
+    return params, chisqr
+
+
+def resample_chunk(E:np.ndarray, E_err:np.ndarray, y:np.ndarray, y_err:np.ndarray, index:np.ndarray,
+                   ndata:int, start:np.ndarray, free:np.ndarray, lower:np.ndarray, upper:np.ndarray,
+                   nsample:int, mode:str, seed:np.random.SeedSequence) -> Tuple[np.ndarray, np.ndarray]:
+    """Draw and fit perturbed data sets, and return the best-fit parameters and chi-square of each."""
+    rng = np.random.default_rng(seed)
+    if mode == 'montecarlo':
+        E_sample = E + E_err*rng.standard_normal((nsample, E.size))
+        y_sample = y + y_err*rng.standard_normal((nsample, y.size))
+        sigma = np.broadcast_to(y_err, y_sample.shape)
+    else:
+        # draw points with replacement within each data set
+        offsets = np.concatenate(([0], np.cumsum(np.bincount(index, minlength=ndata))))
+        choice = np.concatenate([
+            rng.integers(start_, stop, size=(nsample, stop-start_))
+            for start_, stop in zip(offsets[:-1], offsets[1:])], axis=1)
+        E_sample, y_sample, sigma = E[choice], y[choice], y_err[choice]
+    return batch_levenberg_marquardt(
+        E_sample, y_sample, sigma, index, ndata, start, free, lower, upper)
+
+
+class ResampleResult(object):
+    def __init__(self, names:List[str], samples:np.ndarray, chisqr:np.ndarray, mode:str) -> None:
+        self.names = names
+        self.samples = samples
+        self.chisqr = chisqr
+        self.mode = mode
+
+    @property
+    def percentiles(self) -> Dict[str, np.ndarray]:
+        values = np.percentile(self.samples, PERCENTILES, axis=0)
+        return dict(zip(self.names, values.T))
+
+    @property
+    def covariance(self) -> np.ndarray:
+        return np.cov(self.samples, rowvar=False)
+
+    def report(self) -> str:
+        lines = [f'[[{self.mode} resampling of {self.samples.shape[0]} data sets]]',
+                 '    percentiles: ' + ', '.join(f'{p:g}%' for p in PERCENTILES)]
+        for name, values in self.percentiles.items():
+            lines.append(f'    {name:10s} ' + ' '.join(f'{v:.8g}' for v in values))
+        lines.append('[[Covariance]]')
+        for name, row in zip(self.names, self.covariance):
+            lines.append(f'    {name:10s} ' + ' '.join(f'{v: .4e}' for v in row))
+        return '\n'.join(lines)
+
+
+def resample(E:np.ndarray, E_err:np.ndarray, y:np.ndarray, y_err:np.ndarray, index:np.ndarray,
+             ndata:int, start:np.ndarray, free:np.ndarray, lower:np.ndarray, upper:np.ndarray,
+             names:List[str], nsample:int, mode:str='montecarlo', seed:int=None,
+             workers:int=1) -> ResampleResult:
+    """Estimate the distribution of the parameters by fitting many perturbed data sets."""
+    if mode not in MODES:
+        raise InvalidInputError('Resampling mode should be one of ' + ', '.join(MODES))
+    # chunks and their seeds do not depend on the workers, so that the draws with a seed are the same
+    chunk = max(1, min(CHUNK_SAMPLES, CHUNK_ELEMENTS//(E.size*(ndata+2))))
+    sizes = [min(chunk, nsample-start_) for start_ in range(0, nsample, chunk)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    nchunk = len(sizes)
+    arguments = ([E]*nchunk, [E_err]*nchunk, [y]*nchunk, [y_err]*nchunk, [index]*nchunk,
+                 [ndata]*nchunk, [start]*nchunk, [free]*nchunk, [lower]*nchunk, [upper]*nchunk,
+                 sizes, [mode]*nchunk, seeds)
+    if workers == 1 or nchunk == 1:
+        results = list(map(resample_chunk, *arguments))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(resample_chunk, *arguments))
+    samples = np.concatenate([params for params, _ in results])
+    chisqr = np.concatenate([chisqr for _, chisqr in results])
+    free_names = [name for name, is_free in zip(names, free) if is_free]
+    return ResampleResult(free_names, samples[:, free], chisqr, mode)
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+
+import os
+import subprocess
+from typing import Dict, List
+
+from ..util.error import InvalidInputError
+from .density import FRAME_TIME, EventDensityQdpBuilder, write_line_energy
+from .densitymap import PSF_SCALE
+from .event import unfiltered_event_files
+from .fit import CurveFitFactory, joint_state_values, read_joint_state, write_joint_state
+from .gain import PiGainCorrect
+from .hint import read_parameter_hints, read_table
+from .linefit import LINE_SIGMA, LINE_WINDOW, LineCentroidFitter, load_spectra
+from .model import energy_event_density_curve as scf_curve
+from .pipeline import Stage
+from .qdp import read_qdp_file
+from .region import AnnulusRegionPlanner
+from .regionbatch import XIS_SENSORS, make_image
+
+
+PIPELINE_STATE_FILE = 'xisscf_pipeline.json'
+PIPELINE_REPORT_FILE = 'xisscf_pipeline_report.json'
+WORKER_LOGLV = 2 # stages report warnings and errors only not to interleave their logs
+
+
+def image_stage(directory:str, xis:str, image:str) -> None:
+    make_image(directory, xis, image, workers=1, loglv=WORKER_LOGLV)
+
+
+def regions_stage(image:str, skyx:float, skyy:float, outdir:str, prefix:str, regnum:int,
+                  inner_radius:float, outer_radius:float) -> None:
+    planner = AnnulusRegionPlanner(image=image, skyx=skyx, skyy=skyy, loglv=WORKER_LOGLV)
+    planner.write_regions(outdir=outdir, prefix=prefix, regnum=regnum,
+                          inner_radius=inner_radius, outer_radius=outer_radius)
+
+
+def command_stage(command:str) -> None:
+    """Run an external command, e.g. xselect or xspec, through the shell."""
+    subprocess.run(command, shell=True, check=True)
+
+
+def line_fit_stage(spectra:List[str], energy:str, window:List[float], sigma:float) -> None:
+    os.makedirs(os.path.dirname(os.path.abspath(energy)), exist_ok=True)
+    result = LineCentroidFitter(window=tuple(window), sigma=sigma, loglv=WORKER_LOGLV).fit(load_spectra(spectra))
+    write_line_energy(energy, result['center'], result['center_error'])
+
+
+def qdp_stage(image:str, regions:List[str], energy:str, qdp:str, nframe:float, kernel:str, scale:float) -> None:
+    os.makedirs(os.path.dirname(os.path.abspath(qdp)), exist_ok=True)
+    builder = EventDensityQdpBuilder(image=image, regions=regions, nframe=nframe, kernel=kernel, scale=scale,
+                                     loglv=WORKER_LOGLV)
+    builder.write_qdp(qdp, energy)
+
+
+def fit_stage(qdp_list:List[str], state:str, log:str, param_file:str=None, guess:bool=True,
+              ties:Dict[str, str]=None, solver:str='auto') -> None:
+    """Fit the QDP files jointly and write C, epsilon and Et of each QDP file to the state."""
+    os.makedirs(os.path.dirname(os.path.abspath(log)), exist_ok=True)
+    options = dict()
+    if len(qdp_list) > 1:
+        # the joint fit starts from the previous solution and updates it
+        options.update(state_file=state, solver=solver)
+        if ties:
+            options['ties'] = ties
+    hints = None if param_file is None else read_parameter_hints(param_file)
+    cf = CurveFitFactory.get_instance(qdp_list=qdp_list, log_file=log, plot_flag=False, loglv=WORKER_LOGLV,
+                                      hints=hints, guess=guess, **options)
+    cf.fit()
+    if not cf.result.success:
+        raise InvalidInputError(f'Fitting failed: {cf.result.message}')
+    if len(qdp_list) == 1:
+        Et, C, epsilon = ({qdp_list[0]: value} for value in cf.parameter_values(cf.result.params)[:, 0])
+        write_joint_state(state, C, epsilon, Et)
+
+
+def correct_stage(qdp:str, state:str, spectra:List[str], outputs:List[str], seed:int=None) -> None:
+    """Correct the spectrum of each region from the line energy at its event density to Et of the QDP file."""
+    values = joint_state_values(read_joint_state(state), qdp)
+    density = read_qdp_file(qdp).curve()[0]
+    if not density.size == len(spectra):
+        raise InvalidInputError(f'{qdp} has {density.size} regions for {len(spectra)} spectra.')
+    actual = scf_curve(density, values['Et'], values['C'], values['epsilon'])
+    gc = PiGainCorrect(seed=seed, clobber=True, loglv=WORKER_LOGLV)
+    gc.correct_multiple(spectra, outputs, list(actual), [values['Et']]*len(spectra))
+
+
+def read_pipeline_config(path:str) -> Dict:
+    """Read the pipeline from a JSON, TOML or YAML file, filling the defaults."""
+    config = read_table(path)
+    for key in ('regnum', 'outer_radius', 'observations'):
+        if key not in config:
+            raise InvalidInputError(f'{key} is required in {path}')
+    config.setdefault('xis', ['0', '1', '3'])
+    config['xis'] = [str(xis) for xis in config['xis']]
+    if not set(config['xis']) <= set(XIS_SENSORS):
+        raise InvalidInputError('XIS should be one of ' + ', '.join(XIS_SENSORS))
+    config.setdefault('inner_radius', 3.5)
+    config.setdefault('frame_time', FRAME_TIME)
+    config.setdefault('kernel', 'gaussian')
+    config.setdefault('smooth_scale', PSF_SCALE)
+    config.setdefault('workdir', '.')
+    config.setdefault('correct', True)
+    config.setdefault('fit', dict())
+    for obs in config['observations']:
+        if not {'directory', 'skyx', 'skyy'} <= set(obs) or not {'nframe', 'exposure'} & set(obs):
+            raise InvalidInputError(f'Observation in {path} should have directory, skyx, skyy '
+                                    f'and nframe or exposure: {obs}')
+    return config
+
+
+def scf_stages(config:Dict) -> List[Stage]:
+    """Stages of the SCF procedure of all observations and sensors in the config.
+
+    Each observation and sensor has the stages of the all grade image (if
+    unfiltered event files exist), the annuli, the spectra and the line
+    energies (if their commands are given, otherwise the files are inputs),
+    the QDP, and the correction of the spectra, and the QDP files of all of
+    them are fitted jointly. The line energies are fitted by
+    LineCentroidFitter instead if line_fit is given without the command.
+    The commands are formatted with directory, seq, xis, image, regions,
+    spectra and energy, where lists are comma-separated.
+    """
+    fit = config['fit']
+    workdir = config['workdir']
+    state = os.path.join(workdir, fit.get('state', 'xisscf_joint.json'))
+    stages, qdp_list, corrections = list(), list(), list()
+    for obs in config['observations']:
+        directory = obs['directory']
+        seq = os.path.basename(os.path.abspath(directory))
+        anadir = os.path.join(directory, 'xis', 'analysis')
+        nframe = obs.get('nframe') or obs['exposure']/config['frame_time']
+        for xis in config['xis']:
+            tag = f'{seq}:xi{xis}'
+            prefix = f'x{xis}'
+            image = os.path.join(anadir, 'img', 'grade', f'{prefix}_grade_0_7.img.gz')
+            regdir = os.path.join(anadir, 'reg', 'scf')
+            regions = [os.path.join(regdir, f'{prefix}_circle{n}.reg') for n in range(config['regnum']+1)]
+            spectra = [os.path.join(anadir, 'spec', 'scf', f'{prefix}_circle{n}.pi')
+                       for n in range(1, config['regnum']+1)]
+            energy = obs.get('energy', dict()).get(xis) or os.path.join(anadir, 'scf', f'{prefix}_energy.txt')
+            qdp = os.path.join(anadir, 'scf', f'ae{seq}xi{xis}.qdp')
+            evtfiles = unfiltered_event_files(directory, xis)
+            fields = dict(directory=directory, seq=seq, xis=xis, image=image, regions=','.join(regions[1:]),
+                          spectra=','.join(spectra), energy=energy)
+            if evtfiles:
+                stages.append(Stage(f'image:{tag}', image_stage,
+                                    dict(directory=directory, xis=xis, image=image), evtfiles, [image]))
+            stages.append(Stage(
+                f'regions:{tag}', regions_stage,
+                dict(image=image, skyx=obs['skyx'], skyy=obs['skyy'], outdir=regdir, prefix=prefix,
+                     regnum=config['regnum'], inner_radius=config['inner_radius'],
+                     outer_radius=config['outer_radius']),
+                [image], regions))
+            if config.get('spectrum_command'):
+                stages.append(Stage(f'spectra:{tag}', command_stage,
+                                    dict(command=config['spectrum_command'].format(**fields)),
+                                    regions[1:], spectra))
+            if config.get('energy_command'):
+                stages.append(Stage(f'energy:{tag}', command_stage,
+                                    dict(command=config['energy_command'].format(**fields)),
+                                    spectra, [energy]))
+            elif config.get('line_fit') is not None:
+                line_fit = config['line_fit']
+                stages.append(Stage(f'energy:{tag}', line_fit_stage,
+                                    dict(spectra=spectra, energy=energy,
+                                         window=list(line_fit.get('window', LINE_WINDOW)),
+                                         sigma=line_fit.get('sigma', LINE_SIGMA)),
+                                    spectra, [energy]))
+            stages.append(Stage(
+                f'qdp:{tag}', qdp_stage,
+                dict(image=image, regions=regions[1:], energy=energy, qdp=qdp, nframe=nframe,
+                     kernel=config['kernel'], scale=config['smooth_scale']),
+                [image, energy] + regions[1:], [qdp]))
+            qdp_list.append(qdp)
+            if config['correct']:
+                outputs = [PiGainCorrect.default_output(f) for f in spectra]
+                corrections.append(Stage(
+                    f'correct:{tag}', correct_stage,
+                    dict(qdp=qdp, state=state, spectra=spectra, outputs=outputs, seed=config.get('seed')),
+                    [qdp, state] + spectra, outputs))
+    inputs = list(qdp_list)
+    if fit.get('param_file') is not None:
+        inputs.append(fit['param_file'])
+    stages.append(Stage(
+        'fit', fit_stage,
+        dict(qdp_list=qdp_list, state=state, log=os.path.join(workdir, fit.get('log', 'xisscf_joint_result.log')),
+             param_file=fit.get('param_file'), guess=fit.get('guess', fit.get('param_file') is None),
+             ties=fit.get('tie'), solver=fit.get('solver', 'auto')),
+        inputs, [state]))
+    return stages + corrections
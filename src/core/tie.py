@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+
+import os
+import re
+from typing import Dict, List
+
+import numpy as np
+
+from ..util.error import InvalidInputError
+
+
+FREE, GLOBAL = 'free', 'global'
+DEFAULT_TIES = dict(Et=FREE, C=GLOBAL, epsilon=GLOBAL)
+SENSOR_PATTERN = re.compile(r'xis?([0-3])', re.IGNORECASE)
+
+
+def sensor_label(qdp:str) -> str:
+    """XIS sensor found in the file name, e.g. XIS1 for ae100000010xi1_scf.qdp."""
+    match = SENSOR_PATTERN.search(os.path.basename(qdp))
+    if match is None:
+        raise InvalidInputError(f'No XIS sensor is found in the file name of {qdp}.')
+    return f'XIS{match.group(1)}'
+
+
+def dataset_label(qdp:str, key:str, labels:Dict[str, Dict[str, str]]) -> str:
+    """Label of the data set, looked up by the path, the absolute path or the file name."""
+    for name in (qdp, os.path.abspath(qdp), os.path.basename(qdp)):
+        if key in labels.get(name, dict()):
+            return str(labels[name][key])
+    if key == 'sensor':
+        return sensor_label(qdp)
+    raise InvalidInputError(f'Label {key} of {qdp} is not given.')
+
+
+def tie_sources(qdp_list:List[str], param_names:List[str], ties:Dict[str, str]=None,
+                labels:Dict[str, Dict[str, str]]=None) -> Dict[str, np.ndarray]:
+    """Number of the data set whose parameter each data set shares, for each model parameter.
+
+    A parameter is free for each data set, shared by all the data sets
+    (global), or shared by the data sets with the same label, e.g. sensor or
+    epoch, in which case the first data set of the label holds the parameter.
+    """
+    ties = dict(DEFAULT_TIES, **(ties or dict()))
+    labels = labels or dict()
+    unknown = set(ties) - set(param_names)
+    if unknown:
+        raise InvalidInputError('Unknown parameters to tie: ' + ', '.join(sorted(unknown)))
+    sources = dict()
+    for name in param_names:
+        if ties[name] == FREE:
+            sources[name] = np.arange(len(qdp_list))
+        elif ties[name] == GLOBAL:
+            sources[name] = np.zeros(len(qdp_list), dtype=int)
+        else:
+            keys = [dataset_label(qdp, ties[name], labels) for qdp in qdp_list]
+            sources[name] = np.array([keys.index(key) for key in keys])
+    return sources
@@ -0,0 +1,79 @@
+#include "pigaincorrect.h"
+
+/* splitmix64: reproducible for a given seed on every platform */
+static double next_random(uint64_t *state){
+    uint64_t z;
+    z=(*state+=0x9E3779B97F4A7C15ULL);
+    z=(z^(z>>30))*0xBF58476D1CE4E5B9ULL;
+    z=(z^(z>>27))*0x94D049BB133111EBULL;
+    z=z^(z>>31);
+    return (double)(z>>11)*0x1.0p-53; //0-1
+}
+
+void pigaincorrect_redistribute(const double *cnt1, double *cnt0, int num, double efunc, double etrue){
+    int j=0,k=0;
+    double e1_width,estart,estop,e1start,e1stop,lo,hi;
+
+    e1_width=E0_WIDTH*etrue/efunc;
+    for(j=0;j<num;j++){
+        cnt0[j]=0.0;
+    }
+
+    // merge the two sorted bin edge sequences in a single pass
+    j=0;
+    while(j<num && k<num){
+        estart=E0_WIDTH*j;
+        estop=estart+E0_WIDTH;
+        e1start=e1_width*k;
+        e1stop=e1start+e1_width;
+        lo=(estart>e1start)?estart:e1start;
+        hi=(estop<e1stop)?estop:e1stop;
+        if(hi>lo){
+            cnt0[j]+=cnt1[k]*(hi-lo)/e1_width;
+        }
+        if(e1stop<=estop){
+            k++;
+        } else{
+            j++;
+        }
+    }
+}
+
+int pigaincorrect(const int *cnt1, int *out, int nspec, int num, double efunc, double etrue, uint64_t seed){
+    int i,j;
+    double *in0,*cnt0;
+    double integer,decimal;
+    uint64_t state=seed;
+
+    if(num<=0 || nspec<=0 || efunc<=0.0 || etrue<=0.0){
+        return -1;
+    }
+    in0=(double *)malloc(sizeof(double)*num);
+    cnt0=(double *)malloc(sizeof(double)*num);
+    if(in0==NULL || cnt0==NULL){
+        free(in0);
+        free(cnt0);
+        return -1;
+    }
+
+    for(i=0;i<nspec;i++){
+        for(j=0;j<num;j++){
+            in0[j]=cnt1[(size_t)i*num+j];
+        }
+        pigaincorrect_redistribute(in0,cnt0,num,efunc,etrue);
+        for(j=0;j<num;j++){
+            out[(size_t)i*num+j]=0;
+            if(cnt0[j]>0.0){
+                integer=floor(cnt0[j]);
+                decimal=cnt0[j]-integer;
+                out[(size_t)i*num+j]=(int)integer+(decimal>next_random(&state));
+            }
+        }
+    }
+
+    free(in0);
+    free(cnt0);
+    return 0;
+}
+
+/*EOF*/
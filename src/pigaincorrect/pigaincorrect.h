@@ -3,13 +3,15 @@
 
 #include<stdio.h>
 #include<stdlib.h>
+#include<stdint.h>
 #include<math.h>
 
 //------------------------------------------------
 //  マクロ定義(Macro definition)
 //------------------------------------------------
-#define NUM 4096
-#define E0_WIDTH 3.65f
+#define E0_WIDTH 3.65
+#define NUM_INIT 4096
+#define DEFAULT_SEED 1
 
 //------------------------------------------------
 //  型定義(Type definition)
@@ -23,7 +25,8 @@
 //------------------------------------------------
 //  プロトタイプ宣言(Prototype declaration)
 //------------------------------------------------
-// int subPrint(S_SUBINFO info);
+void pigaincorrect_redistribute(const double *cnt1, double *cnt0, int num, double efunc, double etrue);
+int pigaincorrect(const int *cnt1, int *out, int nspec, int num, double efunc, double etrue, uint64_t seed);
 
 //------------------------------------------------
 #endif
@@ -2,7 +2,6 @@
 
 import os
 import sys
-import inspect
 from typing import Union, List, Dict, Tuple
 
 
@@ -13,6 +12,8 @@ ROOT_DIR = './'
 PKG_DIR = os.path.join(ROOT_DIR, 'src')
 OUT_DIR = os.path.join(ROOT_DIR, 'out')
 DAT_DIR = os.path.join(ROOT_DIR, 'data')
+CACHE_DIR = os.environ.get(
+    'XISSCF_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'xisscf'))
 
 
 # -----------------------------------------------------------------------
@@ -72,14 +73,21 @@ class Log(object):
     # -------------------------------------------------------------------
     def logger(self, string: str, level: int, frame=None) -> None:
         # -------------------------------------------------------------------
+        # check the level first not to pay for the frame and the message
+        if level < self.loglv:
+            return
         if not frame == None:
-            function_name = inspect.getframeinfo(frame)[2]
+            function_name = frame.f_code.co_name
             console_msg = f'[{self.STATUS[level]}] {function_name} : {str(string)}'
         else:
             console_msg = f'[{self.STATUS[level]}] {str(string)}'
-        if (level >= self.loglv):
-            print(
-                f'{self.STRING_COLORS[level]}{console_msg}{StringColor.RESET}')
+        print(
+            f'{self.STRING_COLORS[level]}{console_msg}{StringColor.RESET}')
+
+    # -------------------------------------------------------------------
+    def enabled(self, level: int) -> bool:
+        # -------------------------------------------------------------------
+        return level >= self.loglv
 
     # -------------------------------------------------------------------
     def debug(self, string: str, frame=None) -> None:
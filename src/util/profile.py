@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+import functools
+import json
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict
+
+
+class StageProfiler(object):
+    """Wall-clock and CPU times of named stages and counts of named events."""
+
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        self.stages: Dict[str, Dict[str, float]] = dict()
+        self.counts: Dict[str, int] = dict()
+
+    def add(self, name:str, wall:float, cpu:float, calls:int=1) -> None:
+        stage = self.stages.setdefault(name, dict(wall=0.0, cpu=0.0, calls=0))
+        stage['wall'] += wall
+        stage['cpu'] += cpu
+        stage['calls'] += calls
+
+    def count(self, name:str, n:int=1) -> None:
+        self.counts[name] = self.counts.get(name, 0) + n
+
+    @contextmanager
+    def stage(self, name:str):
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - wall, time.process_time() - cpu)
+
+    def timed(self, name:str) -> Callable:
+        """Decorator to time each call of the function as the stage."""
+        def decorator(function:Callable) -> Callable:
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.stage(name):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def report(self) -> Dict[str, Dict]:
+        return dict(stages=dict((name, dict(stage)) for name, stage in self.stages.items()),
+                    counts=dict(self.counts))
+
+    def merge(self, report:Dict[str, Dict]) -> None:
+        """Add a report of another profiler, e.g. of a worker process."""
+        for name, stage in report['stages'].items():
+            self.add(name, stage['wall'], stage['cpu'], stage['calls'])
+        for name, n in report['counts'].items():
+            self.count(name, n)
+
+    def write(self, path:str) -> None:
+        """Write the report as JSON to the file, or to the standard output for "-"."""
+        text = json.dumps(self.report(), indent=2)
+        if path == '-':
+            print(text)
+        else:
+            with open(path, 'w') as f:
+                f.write(text + '\n')
+
+
+PROFILER = StageProfiler() # profiler of the process shared by the tasks
+stage = PROFILER.stage
+timed = PROFILER.timed
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+
+import os
+
+import numpy as np
+
+from src.core.batch import BatchCurveFit
+from src.core.model import energy_event_density_curve as scf_curve
+from src.core.qdp import write_qdp_file
+
+
+def make_qdp(qdp, C):
+    density = np.geomspace(1e-4, 2e-2, 12)
+    energy = scf_curve(density, 6.7, C, 150.0)
+    write_qdp_file(qdp, [np.column_stack((density, 0.02*density, energy, np.full(density.size, 0.002)))])
+
+
+def test_groups_sharing_qdp_files_write_to_their_own_directories(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    for directory in ('a', 'b'):
+        os.makedirs(tmp_path/directory)
+    make_qdp('a/xi0.qdp', 0.02)
+    make_qdp('b/xi0.qdp', 0.03)
+    make_qdp('a/xi1.qdp', 0.02)
+    groups = [['a/xi0.qdp'], ['b/xi0.qdp'], ['a/xi0.qdp', 'a/xi1.qdp']]
+    rows = BatchCurveFit(groups, hints=None, summary_file='out/summary.csv', guess=True, workers=1,
+                         log_file='fit.log', loglv=2).run()
+    assert all(row['success'] for row in rows)
+    assert [row['log'] for row in rows] == [os.path.join('out', 'summary', f'group{n}', 'fit.log') for n in (1, 2, 3)]
+    assert rows[0]['C'] != rows[1]['C']
+    assert os.path.exists('out/summary/group1/xi0_result.qdp')
+    assert os.path.exists('out/summary/group3/xi1_result.qdp')
+    assert not [f for f in os.listdir(tmp_path) if f.endswith(('_result.qdp', '.log'))]
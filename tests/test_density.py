@@ -0,0 +1,17 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+from astropy.io import fits
+
+from src.core.density import EventDensityQdpBuilder
+from src.core.eventgain import EventGainCorrect
+
+
+def test_qdp_and_event_correction_share_the_density_map_by_default(tmp_path):
+    image = str(tmp_path/'image.fits')
+    data = np.random.default_rng(1).poisson(0.5, size=(64, 64)).astype(np.int32)
+    fits.PrimaryHDU(data).writeto(image)
+    cache_dir = str(tmp_path/'cache')
+    builder = EventDensityQdpBuilder(image, [], nframe=100.0, cache_dir=cache_dir, loglv=2)
+    corrector = EventGainCorrect(image, C=0.02, epsilon=150.0, nframe=100.0, cache_dir=cache_dir, loglv=2)
+    assert builder.density_map.path == corrector.density_map.path
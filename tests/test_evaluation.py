@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+from src.core.evaluation import BAND_SIGMAS, FitEvaluation
+from src.core.model import energy_event_density_curve as scf_curve
+
+
+ENERGY = np.geomspace(1e-4, 2e-2, 50)
+VALUES = np.array([[6.70, 6.69], [0.02, 0.02], [150.0, 150.0]]) # Et, C and epsilon of two data sets
+
+
+def evaluation(covariance, sources):
+    return FitEvaluation(VALUES, ENERGY, np.zeros(0), np.zeros(0), np.array([0, 0, 0]),
+                         covariance=covariance, sources=sources)
+
+
+def test_analytic_band_matches_sampled_band_when_nearly_linear():
+    # Et of each data set, and C and epsilon shared by them
+    sources = np.array([[0, 1], [2, 2], [3, 3]])
+    sigma = np.array([1e-3, 1e-3, 1e-4, 0.5])
+    correlation = np.eye(4)
+    correlation[2, 3] = correlation[3, 2] = -0.5
+    covariance = correlation*np.outer(sigma, sigma)
+    ev = evaluation(covariance, sources)
+    analytic = ev.bands('analytic')
+    sampled = ev.bands('sample', nsample=20000, seed=1)
+    for level in range(len(BAND_SIGMAS)):
+        width = analytic[level, 1] - analytic[level, 0]
+        np.testing.assert_allclose(sampled[level, 1] - sampled[level, 0], width, rtol=0.05)
+        np.testing.assert_allclose(0.5*(sampled[level, 1] + sampled[level, 0]), ev.curves, atol=0.05*width.max())
+
+
+def test_fixed_parameters_add_no_variance():
+    # only Et varies, with C and epsilon fixed despite their variances in the covariance
+    covariance = np.diag([1e-6, 1e-6, 1e-4, 100.0])
+    ev = evaluation(covariance, np.array([[0, 1], [-1, -1], [-1, -1]]))
+    shape = scf_curve(ENERGY, 1.0, 0.02, 150.0)
+    expected = 1e-3*shape
+    analytic = ev.bands('analytic')
+    for level, sigma in enumerate(BAND_SIGMAS):
+        np.testing.assert_allclose(analytic[level, 1] - ev.curves, sigma*np.array([expected, expected]))
+    sampled = ev.bands('sample', nsample=20000, seed=1)
+    np.testing.assert_allclose(sampled[0, 1] - sampled[0, 0], 2*np.array([expected, expected]), rtol=0.05)
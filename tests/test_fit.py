@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+
+import numpy as np
+import pytest
+
+from src.core.fit import (CachedFitResult, MultipleCurveFit, joint_state_values, read_joint_state,
+                          write_joint_state)
+from src.core.model import energy_event_density_curve as scf_curve
+from src.core.qdp import write_qdp_file
+from src.util.error import InvalidInputError
+
+
+SENSOR_C = {'0': 0.02, '1': 0.03}
+
+
+def make_qdp_list(directory, names, seed=1):
+    """QDP files of the names like ae0xi0.qdp, with C of the sensor in the name."""
+    rng = np.random.default_rng(seed)
+    qdp_list = list()
+    for name in names:
+        density = np.geomspace(1e-4, 2e-2, 12)
+        energy = scf_curve(density, 6.7, SENSOR_C[name[-5]], 150.0) + rng.normal(0.0, 0.002, density.size)
+        qdp = os.path.join(directory, name)
+        write_qdp_file(qdp, [np.column_stack((density, 0.02*density, energy, np.full(density.size, 0.002)))])
+        qdp_list.append(qdp)
+    return qdp_list
+
+
+def test_joint_state_round_trip(tmp_path):
+    state = str(tmp_path/'joint.json')
+    write_joint_state(state, {'a.qdp': 0.02, 'b.qdp': 0.03}, {'a.qdp': 150.0, 'b.qdp': 150.0},
+                      {'a.qdp': 6.7, 'b.qdp': 6.69})
+    solution = read_joint_state(state)
+    assert solution['C'] == {os.path.abspath('a.qdp'): 0.02, os.path.abspath('b.qdp'): 0.03}
+    assert joint_state_values(solution, 'b.qdp') == dict(Et=6.69, C=0.03, epsilon=150.0)
+    with pytest.raises(InvalidInputError):
+        joint_state_values(solution)
+
+
+def test_joint_state_with_single_c_and_epsilon(tmp_path):
+    state = tmp_path/'joint.json'
+    state.write_text(json.dumps(dict(C=0.02, epsilon=150.0, Et={'/data/a.qdp': 6.7, '/data/b.qdp': 6.69})))
+    solution = read_joint_state(str(state))
+    assert solution['C'] == {'/data/a.qdp': 0.02, '/data/b.qdp': 0.02}
+    assert joint_state_values(solution) == dict(C=0.02, epsilon=150.0)
+
+
+def test_joint_state_keeps_c_tied_by_sensor(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    qdp_list = make_qdp_list(str(tmp_path), ['ae0xi0.qdp', 'ae0xi1.qdp', 'ae1xi0.qdp'])
+    state = str(tmp_path/'joint.json')
+    cf = MultipleCurveFit(qdp_list[:2], str(tmp_path/'fit.log'), plot_flag=False, loglv=2, guess=True,
+                          state_file=state, ties={'C': 'sensor'})
+    cf.fit()
+    Et, C, epsilon = cf.parameter_values(cf.result.params)
+    solution = read_joint_state(state)
+    assert [solution['C'][os.path.abspath(qdp)] for qdp in qdp_list[:2]] == pytest.approx(C)
+    assert C[0] == pytest.approx(SENSOR_C['0'], rel=0.1)
+    assert C[1] == pytest.approx(SENSOR_C['1'], rel=0.1)
+
+    # the added data set starts from C of the data set of the same sensor
+    cf = MultipleCurveFit(qdp_list, str(tmp_path/'fit.log'), plot_flag=False, loglv=2,
+                          state_file=state, ties={'C': 'sensor'})
+    guess = cf.warm_start()
+    assert guess['C_2']['value'] == pytest.approx(C[0])
+    assert guess['Et_1']['value'] == pytest.approx(Et[1])
+    cf.fit()
+    solution = read_joint_state(state)
+    assert len(solution['C']) == 3
+    assert solution['C'][os.path.abspath(qdp_list[2])] == solution['C'][os.path.abspath(qdp_list[0])]
+
+
+def test_cached_result_is_not_shared_by_solvers(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    qdp_list = make_qdp_list(str(tmp_path), ['ae0xi0.qdp', 'ae0xi1.qdp', 'ae1xi0.qdp'])
+    fits = dict()
+    for solver in ('trf', 'leastsq', 'trf'):
+        cf = MultipleCurveFit(qdp_list, str(tmp_path/'fit.log'), plot_flag=False, loglv=2, guess=True,
+                              cache_dir=str(tmp_path/'cache'), solver=solver)
+        cf.fit()
+        fits.setdefault(solver, list()).append(cf.result)
+    assert not isinstance(fits['leastsq'][0], CachedFitResult)
+    assert isinstance(fits['trf'][1], CachedFitResult)
+
+
+def test_sparse_solver_agrees_with_leastsq(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    qdp_list = make_qdp_list(str(tmp_path), ['ae0xi0.qdp', 'ae0xi1.qdp', 'ae1xi0.qdp', 'ae1xi1.qdp'])
+    results = dict()
+    for solver in ('leastsq', 'trf'):
+        cf = MultipleCurveFit(qdp_list, str(tmp_path/'fit.log'), plot_flag=False, loglv=2, guess=True,
+                              ties={'C': 'sensor'}, solver=solver)
+        cf.fit()
+        assert cf.result.success
+        results[solver] = cf.result
+    leastsq, trf = results['leastsq'], results['trf']
+    assert trf.var_names == leastsq.var_names
+    for name in leastsq.var_names:
+        assert trf.params[name].value == pytest.approx(leastsq.params[name].value, rel=1e-4)
+        assert trf.params[name].stderr == pytest.approx(leastsq.params[name].stderr, rel=1e-2)
+    assert trf.params['C_2'].stderr == trf.params['C_0'].stderr
+    for name in ('chisqr', 'nfree', 'redchi', 'aic', 'bic'):
+        assert getattr(trf, name) == pytest.approx(getattr(leastsq, name), rel=1e-4)
+    np.testing.assert_allclose(trf.covar, leastsq.covar, rtol=2e-2, atol=1e-12)
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+
+import json
+
+import pytest
+
+from src.core.hint import normalize_hints, read_parameter_hints
+from src.util.error import InvalidInputError
+
+
+@pytest.mark.parametrize('vary, expected', [
+    (True, True), (False, False), (1, True), (0, False), ('false', False), ('No', False), ('TRUE', True)])
+def test_vary_takes_booleans_and_their_spellings(vary, expected):
+    assert normalize_hints({'C': {'vary': vary}})['C']['vary'] is expected
+
+
+@pytest.mark.parametrize('vary', ['fixed', 2, None])
+def test_vary_refuses_other_values(vary):
+    with pytest.raises(InvalidInputError):
+        normalize_hints({'C': {'vary': vary}})
+
+
+def test_hints_keep_only_the_given_properties(tmp_path):
+    path = tmp_path/'hints.json'
+    path.write_text(json.dumps({'Et': {'value': 6.7}, 'C': {'max': 0.5, 'vary': 'false'}}))
+    assert read_parameter_hints(str(path)) == {'Et': {'value': 6.7}, 'C': {'max': 0.5, 'vary': False}}
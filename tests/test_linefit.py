@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pytest
+
+from src.core.density import write_line_energy
+from src.core.gain import E0_WIDTH
+from src.core.linefit import LineCentroidFitter, line_model
+from src.util.error import InvalidInputError
+
+
+CENTER = 6.7 # keV
+
+
+def spectra(nspec, line_counts, seed, continuum=5.0, nchan=4096):
+    lower = np.arange(nchan)*E0_WIDTH*1e-3
+    params = np.tile([continuum, 0.0, line_counts, CENTER, 0.05], (nspec, 1))
+    model, _ = line_model(params, lower, lower + E0_WIDTH*1e-3, 6.5)
+    return np.random.default_rng(seed).poisson(model).astype(float)
+
+
+@pytest.mark.parametrize('line_counts', [200, 2000])
+def test_centers_are_unbiased_with_unit_pulls(line_counts):
+    result = LineCentroidFitter().fit(spectra(400, line_counts, seed=line_counts))
+    reliable = result['reliable']
+    assert reliable.mean() > 0.99
+    pull = (result['center'][reliable] - CENTER)/result['center_error'][reliable]
+    assert abs(pull.mean()) < 0.2
+    assert 0.85 < pull.std() < 1.15
+
+
+def test_unconverged_fits_have_no_errors(tmp_path):
+    result = LineCentroidFitter(max_iter=1).fit(spectra(10, 2000, seed=0))
+    assert not result['converged'].any() and not result['reliable'].any()
+    assert np.isnan(result['center_error']).all()
+    with pytest.raises(InvalidInputError):
+        write_line_energy(str(tmp_path/'energy.txt'), result['center'], result['center_error'])
+
+
+def test_weak_lines_are_flagged():
+    result = LineCentroidFitter().fit(spectra(200, 20, seed=1))
+    reliable = result['reliable']
+    assert not reliable[~result['converged']].any()
+    assert np.isnan(result['center_error'][~reliable]).all()
+    assert np.all(result['norm'][reliable] > 3*result['norm_error'][reliable])
+    assert np.all(result['sigma'][reliable] >= E0_WIDTH*1e-3)
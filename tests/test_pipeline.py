@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+import os
+
+from src.core.pipeline import Pipeline, Stage
+
+
+def copy_stage(source:str, target:str, suffix:str='') -> None:
+    with open(source, 'r') as f:
+        text = f.read()
+    with open(target, 'w') as f:
+        f.write(text + suffix)
+
+
+def make_pipeline(tmp_path, suffix='', clobber=False):
+    source, target = str(tmp_path/'source.txt'), str(tmp_path/'target.txt')
+    stage = Stage('copy', copy_stage, dict(source=source, target=target, suffix=suffix), [source], [target])
+    return Pipeline([stage], str(tmp_path/'state.json'), workers=1, clobber=clobber, loglv=2), stage
+
+
+def run(tmp_path, **args):
+    pipeline, _ = make_pipeline(tmp_path, **args)
+    return pipeline.run()['stages'][0]['status']
+
+
+def is_stale(tmp_path, **args):
+    pipeline, stage = make_pipeline(tmp_path, **args)
+    return pipeline.is_stale(stage, pipeline.stage_key(stage))
+
+
+def test_stage_is_stale_until_it_runs(tmp_path):
+    (tmp_path/'source.txt').write_text('a')
+    assert is_stale(tmp_path)
+    assert run(tmp_path) == 'run'
+    assert not is_stale(tmp_path)
+    assert run(tmp_path) == 'skipped'
+
+
+def test_stage_is_stale_when_the_input_changes(tmp_path):
+    (tmp_path/'source.txt').write_text('a')
+    run(tmp_path)
+    (tmp_path/'source.txt').write_text('b')
+    assert is_stale(tmp_path)
+
+
+def test_stage_is_not_stale_when_the_input_is_touched(tmp_path):
+    (tmp_path/'source.txt').write_text('a')
+    run(tmp_path)
+    stat = os.stat(tmp_path/'source.txt')
+    os.utime(tmp_path/'source.txt', ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert not is_stale(tmp_path)
+
+
+def test_stage_is_stale_when_the_params_change(tmp_path):
+    (tmp_path/'source.txt').write_text('a')
+    run(tmp_path)
+    assert is_stale(tmp_path, suffix='!')
+
+
+def test_stage_is_stale_when_the_output_is_missing_or_changed(tmp_path):
+    (tmp_path/'source.txt').write_text('a')
+    run(tmp_path)
+    (tmp_path/'target.txt').write_text('edited')
+    assert is_stale(tmp_path)
+    run(tmp_path)
+    os.remove(tmp_path/'target.txt')
+    assert is_stale(tmp_path)
+
+
+def test_stage_is_stale_with_clobber(tmp_path):
+    (tmp_path/'source.txt').write_text('a')
+    run(tmp_path)
+    assert is_stale(tmp_path, clobber=True)
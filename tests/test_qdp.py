@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pytest
+
+from src.core.qdp import parse_qdp
+from src.util.error import InvalidInputError
+
+
+def test_curve_without_read_has_density_energy_and_their_errors():
+    data = parse_qdp(['1e-3 1e-4 6.70 0.01', '2e-3 2e-4 6.68 0.02'])
+    x, xe, y, ye = data.curve()
+    np.testing.assert_allclose(x, [1e-3, 2e-3])
+    np.testing.assert_allclose(xe, [1e-4, 2e-4])
+    np.testing.assert_allclose(y, [6.70, 6.68])
+    np.testing.assert_allclose(ye, [0.01, 0.02])
+
+
+def test_curve_without_read_should_have_four_columns():
+    with pytest.raises(InvalidInputError):
+        parse_qdp(['1e-3 6.70 0.01', '2e-3 6.68 0.02']).curve()
+
+
+def test_curve_averages_two_sided_errors_of_terr():
+    data = parse_qdp(['READ TERR 1 2', '1e-3 1e-4 -3e-4 6.70 0.01 -0.03'])
+    x, xe, y, ye = data.curve()
+    np.testing.assert_allclose(xe, [2e-4])
+    np.testing.assert_allclose(ye, [0.02])
+
+
+def test_curve_reads_serr_of_the_energy_only():
+    data = parse_qdp(['READ SERR 2', '1e-3 6.70 0.01', '2e-3 6.68 0.02'])
+    x, xe, y, ye = data.curve()
+    np.testing.assert_allclose(xe, [0.0, 0.0])
+    np.testing.assert_allclose(ye, [0.01, 0.02])
+    assert data.commands == ['READ SERR 2']
+
+
+def test_missing_error_columns_are_invalid():
+    with pytest.raises(InvalidInputError):
+        parse_qdp(['READ SERR 1 2', '1e-3 1e-4 6.70']).curve()
+
+
+def test_no_rows_separate_blocks_and_no_values_are_nan():
+    data = parse_qdp([
+        'READ SERR 1 2', '! comment', '',
+        '1e-3 1e-4 6.70 0.01 ! trailing comment',
+        'NO NO NO NO',
+        '2e-3 NO 6.68 0.02',
+        '3e-3 3e-4 6.66 0.03'])
+    assert len(data.blocks) == 2
+    assert data.blocks[0].shape == (1, 4)
+    assert np.isnan(data.blocks[1][0, 1])
+    np.testing.assert_allclose(data.curve(1)[0], [2e-3, 3e-3])
+
+
+def test_rows_of_different_columns_are_invalid():
+    with pytest.raises(InvalidInputError):
+        parse_qdp(['READ SERR 1 2', '1e-3 1e-4 6.70 0.01', '2e-3 2e-4 6.68'])
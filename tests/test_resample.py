@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+from src.core.model import energy_event_density_curve as scf_curve
+from src.core.resample import CHUNK_SAMPLES, resample
+
+
+def test_samples_with_a_seed_do_not_depend_on_the_workers():
+    E = np.geomspace(1e-4, 2e-2, 10)
+    y = scf_curve(E, 6.7, 0.02, 150.0)
+    args = dict(E=E, E_err=0.02*E, y=y, y_err=np.full(E.size, 0.003), index=np.zeros(E.size, dtype=int),
+                ndata=1, start=np.array([6.7, 0.02, 150.0]), free=np.ones(3, dtype=bool),
+                lower=np.array([0.0, 0.0, 0.0]), upper=np.array([np.inf, 1.0, np.inf]),
+                names=['Et', 'C', 'epsilon'], nsample=2*CHUNK_SAMPLES + 10, seed=7)
+    serial = resample(workers=1, **args)
+    parallel = resample(workers=2, **args)
+    np.testing.assert_array_equal(serial.samples, parallel.samples)
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import sys
+
+from absl import app
+from absl import flags
+
+import src as scf
+
+
+def main(argv):
+    if flag_values.debug:
+        flag_values.loglv = 0
+    if flag_values.manifest is not None:
+        if flag_values.image is not None or flag_values.outdir is not None:
+            raise app.UsageError('--image and --outdir are given per observation in the manifest.')
+        tasks = [scf.RegionTask(directory=obs['directory'], xis=xis, skyx=obs['skyx'], skyy=obs['skyy'],
+                                outdir=obs['outdir'])
+                 for obs in scf.read_observations(flag_values.manifest) for xis in flag_values.xis]
+    else:
+        if flag_values.skyx is None or flag_values.skyy is None:
+            raise app.UsageError('--skyx and --skyy are required without --manifest.')
+        if len(flag_values.xis) > 1 and (flag_values.image is not None or flag_values.outdir is not None):
+            raise app.UsageError('--image and --outdir are given for a single XIS.')
+        tasks = [scf.RegionTask(directory=flag_values.directory, xis=xis, skyx=flag_values.skyx,
+                                skyy=flag_values.skyy, image=flag_values.image, outdir=flag_values.outdir)
+                 for xis in flag_values.xis]
+    planner = scf.BatchRegionPlanner(
+        tasks=tasks, regnum=flag_values.regnum, inner_radius=flag_values.inner_radius,
+        outer_radius=flag_values.outer_radius, workers=flag_values.workers,
+        clobber=flag_values.clobber, loglv=flag_values.loglv)
+    rows = planner.run()
+    return int(any(row['status'] == 'failed' for row in rows))
+
+
+def define_flags():
+    flag_values = flags.FLAGS
+    flags.DEFINE_string(
+        'directory', '.', 'Path to observation data directory.')
+    flags.DEFINE_list(
+        'xis', None, 'Comma-separated list of XIS detector ids.')
+    flags.register_validator(
+        'xis', lambda value: value is None or set(value) <= {'0', '1', '2', '3'},
+        message='XIS detector ids should be 0, 1, 2 or 3.')
+    flags.DEFINE_integer(
+        'regnum', None, 'Number of regions.', lower_bound=1)
+    flags.DEFINE_float(
+        'skyx', None, 'SKYX of middle of region.')
+    flags.DEFINE_float(
+        'skyy', None, 'SKYY of middle of region.')
+    flags.DEFINE_string(
+        'manifest', None, 'Path to manifest of observations instead of --directory, --skyx and --skyy, '
+        'one "directory,skyx,skyy[,outdir]" per line or JSON list of objects of these keys.')
+    flags.DEFINE_float(
+        'inner_radius', 3.5, 'Inner radius of innermost region in unit of arcmin.')
+    flags.DEFINE_float(
+        'outer_radius', None, 'Outer radius of outermost region in unit of arcmin.')
+    flags.DEFINE_string(
+        'image', None, 'Path to all grade image. Default is <DIRECTORY>/xis/analysis/img/grade/x<XIS>_grade_0_7.img.gz.')
+    flags.DEFINE_string(
+        'outdir', None, 'Output directory of region files. Default is <DIRECTORY>/xis/analysis/reg/scf.')
+    flags.DEFINE_integer(
+        'workers', None, 'Number of processes to make images and regions. Default is the number of CPUs.')
+    flags.DEFINE_boolean(
+        'clobber', False, 'Make images and regions even if they are up to date.')
+    flags.DEFINE_boolean(
+        'debug', False, 'run with debug mode.')
+    flags.DEFINE_enum(
+        'loglv', 'INFO',
+        ['DEBUG', 'debug', 'INFO', 'info', 'WARNING', 'warning', 'ERROR', 'error'],
+        'Logging level.')
+    flags.mark_flags_as_required(['xis', 'regnum', 'outer_radius'])
+    return flag_values
+
+
+if __name__ == '__main__':
+    flag_values = define_flags()
+    sys.exit(app.run(main))
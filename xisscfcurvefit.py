@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import os
 import sys
 
 from absl import app
@@ -9,29 +10,139 @@ from absl import flags
 import src as scf
 
 
+def load_hints():
+    if flag_values.param_file is None and not flag_values.param:
+        return None
+    hints = dict()
+    if flag_values.param_file is not None:
+        hints.update(scf.read_parameter_hints(flag_values.param_file))
+    hints.update(scf.parse_parameter_hints(flag_values.param))
+    return hints
+
+
+def expand_qdp(qdp_list):
+    """Replace each directory in the list by the QDP files in it."""
+    expanded = list()
+    for qdp in qdp_list:
+        expanded.extend(scf.qdp_files(qdp) if os.path.isdir(qdp) else [qdp])
+    return expanded
+
+
 def main(argv):
     if flag_values.debug:
         flag_values.loglv = 0
+    with scf.PROFILER.stage('total'):
+        run()
+    if flag_values.profile is not None:
+        scf.PROFILER.write(flag_values.profile)
+
+
+def run():
+    hints = load_hints()
+    cache_dir = flag_values.cache_dir if flag_values.cache else None
+    if flag_values.manifest is not None:
+        if hints is None and not flag_values.guess:
+            raise app.UsageError('Batch mode requires --param_file, --param or --guess.')
+        bcf = scf.BatchCurveFit(
+            groups=scf.read_manifest(flag_values.manifest), hints=hints, guess=flag_values.guess,
+            summary_file=flag_values.summary, workers=flag_values.workers,
+            cache_dir=cache_dir, save_flag=flag_values.save, log_file=flag_values.log, loglv=flag_values.loglv)
+        bcf.run()
+        return
+    qdp_list = expand_qdp(flag_values.qdp)
+    if not qdp_list:
+        raise app.UsageError('No QDP file is found in ' + ', '.join(flag_values.qdp))
+    options = dict()
+    if flag_values.state is not None:
+        options['state_file'] = flag_values.state
+    if flag_values.tie_file is not None:
+        options['ties'], options['labels'] = scf.read_tie_spec(flag_values.tie_file)
+    if flag_values.tie:
+        options['ties'] = dict(options.get('ties', dict()), **scf.parse_ties(flag_values.tie))
+    if flag_values.solver != 'auto':
+        options['solver'] = flag_values.solver
+    if options and len(qdp_list) < 2:
+        raise app.UsageError('--state, --tie_file, --tie and --solver are for the joint fit of multiple QDP files.')
     cf:Union[scf.SingleCurveFit, scf.MultipleCurveFit] = scf.CurveFitFactory.get_instance(
-        qdp_list=flag_values.qdp, log_file=flag_values.log, plot_flag=flag_values.show, loglv=flag_values.loglv)
+        qdp_list=qdp_list, log_file=flag_values.log, plot_flag=flag_values.show, loglv=flag_values.loglv,
+        hints=hints, guess=flag_values.guess, cache_dir=cache_dir, save_flag=flag_values.save,
+        band=None if flag_values.band == 'none' else flag_values.band, band_nsample=flag_values.band_nsample,
+        seed=flag_values.seed, **options)
     cf.fit()
+    if flag_values.nsample > 0:
+        cf.resample(nsample=flag_values.nsample, mode=flag_values.resample_mode,
+                    seed=flag_values.seed, workers=flag_values.workers)
 
 
 def define_flags():
     flag_values = flags.FLAGS
     flags.DEFINE_list(
-        'qdp', None, 'Path to qdp file(s). If multiple files, input comma-separated list of strings.')
+        'qdp', None, 'Path to qdp file(s). If multiple files, input comma-separated list of strings. '
+        'A directory stands for all the QDP files in it except results of fitting.')
     flags.DEFINE_string(
-        'log', 'xisscfcurvefit_result.log', 'Logging file name of fitting result.')
+        'log', 'xisscfcurvefit_result.log', 'Logging file name of fitting result. '
+        'In batch mode, the name of the log in the output directory of each group.')
     flags.DEFINE_boolean(
         'show', True, 'Show result plot.', short_name='s')
+    flags.DEFINE_boolean(
+        'save', False, 'Save result plot as <prefix of first QDP file>_result.pdf. '
+        'The plot is drawn without display unless shown.')
+    flags.DEFINE_string(
+        'param_file', None, 'Path to JSON, TOML or YAML file of parameter hints, which replace the interactive input.')
+    flags.DEFINE_multi_string(
+        'param', [], 'Parameter hint as NAME=value,vary,min,max[,expr], e.g. Et=6.7,1,6.0,7.0. '
+        'NAME may have the suffix of data set number, e.g. Et_1. Overrides param_file.')
+    flags.DEFINE_boolean(
+        'guess', False, 'Find initial values of parameters by the separable least squares solver '
+        'instead of the interactive input. Hints given by param_file and param take precedence.')
+    flags.DEFINE_string(
+        'state', None, 'JSON file of the joint solution. If it exists, the joint fit starts from it and '
+        'initializes only Et of data sets added since; data sets left out are dropped. Updated after fitting.')
+    flags.DEFINE_string(
+        'tie_file', None, 'Path to JSON, TOML or YAML file of ties of parameters among data sets (table "tie") '
+        'and labels of QDP files (table "labels").')
+    flags.DEFINE_multi_string(
+        'tie', [], 'Tie of parameter as NAME=free, NAME=global or NAME=<label>, e.g. C=sensor or epsilon=epoch. '
+        'The sensor label is taken from the file name unless given. Overrides tie_file.')
+    flags.DEFINE_enum(
+        'solver', 'auto', ['auto', 'leastsq', 'trf'],
+        'Solver of the joint fit. trf uses the sparse Jacobian and scales to many data sets; '
+        'auto chooses it for 20 data sets or more.')
+    flags.DEFINE_integer(
+        'nsample', 0, 'Number of data sets perturbed within the errors to estimate percentile intervals '
+        'and covariance of the parameters. No resampling by default.', lower_bound=0)
+    flags.DEFINE_enum(
+        'resample_mode', 'montecarlo', ['montecarlo', 'bootstrap'],
+        'Resampling by Gaussian draws from xe and ye, or by drawing data points with replacement.')
+    flags.DEFINE_enum(
+        'band', 'analytic', ['analytic', 'sample', 'none'],
+        '1 and 2 sigma bands of the best-fit curve, written as the errors of the curve in the result QDP '
+        'and drawn in the plot. analytic propagates the covariance of the parameters through the gradient '
+        'of the model, and sample takes percentiles of curves of parameters drawn from the covariance.')
+    flags.DEFINE_integer(
+        'band_nsample', 1000, 'Number of parameter sets drawn for the sampled bands.', lower_bound=1)
+    flags.DEFINE_integer(
+        'seed', None, 'Seed of random numbers for resampling and the sampled bands.')
+    flags.DEFINE_boolean(
+        'cache', True, 'Reuse the result of the same fit to the same data from the cache directory.')
+    flags.DEFINE_string(
+        'cache_dir', scf.FIT_CACHE_DIR, 'Cache directory of fitting results.')
+    flags.DEFINE_string(
+        'manifest', None, 'Path to manifest of QDP groups for batch mode, one comma-separated group per line or JSON list.')
+    flags.DEFINE_string(
+        'summary', 'xisscfcurvefit_summary.csv', 'Summary table of fitting results in batch mode.')
+    flags.DEFINE_integer(
+        'workers', None, 'Number of processes in batch mode and resampling. Default is the number of CPUs.')
+    flags.DEFINE_string(
+        'profile', None, 'Write wall-clock and CPU times of stages and counts of function evaluations '
+        'as JSON to the file, or to the standard output for "-".')
     flags.DEFINE_boolean(
         'debug', False, 'run with debug mode.')
     flags.DEFINE_enum(
         'loglv', 'INFO',
         ['DEBUG', 'debug', 'INFO', 'info', 'WARNING', 'warning', 'ERROR', 'error'],
         'Logging level.')
-    flags.mark_flags_as_required(['qdp'])
+    flags.mark_flags_as_mutual_exclusive(['qdp', 'manifest'], required=True)
     return flag_values
 
 
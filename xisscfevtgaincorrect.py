@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import sys
+
+from absl import app
+from absl import flags
+
+import src as scf
+
+
+def main(argv):
+    if flag_values.debug:
+        flag_values.loglv = 0
+    if flag_values.state is not None:
+        values = scf.joint_state_values(scf.read_joint_state(flag_values.state), flag_values.qdp)
+        C, epsilon = values['C'], values['epsilon']
+    elif flag_values.C is not None and flag_values.epsilon is not None:
+        C, epsilon = flag_values.C, flag_values.epsilon
+    else:
+        raise app.UsageError('Either --state or both --C and --epsilon are required.')
+    nframe = flag_values.nframe
+    if nframe is None:
+        if flag_values.exposure is None:
+            raise app.UsageError('Either --nframe or --exposure is required.')
+        nframe = flag_values.exposure/flag_values.frame_time
+    output = flag_values.output or [scf.EventGainCorrect.default_output(f) for f in flag_values.input]
+    if not len(output) == len(flag_values.input):
+        raise app.UsageError('Numbers of input and output are inconsistent.')
+    options = dict() if flag_values.chunk_size is None else dict(chunk_size=flag_values.chunk_size)
+    gc = scf.EventGainCorrect(
+        image=flag_values.image, C=C, epsilon=epsilon, nframe=nframe, seed=flag_values.seed,
+        kernel=flag_values.kernel, scale=flag_values.smooth_scale,
+        workers=flag_values.workers, clobber=flag_values.clobber, loglv=flag_values.loglv, **options)
+    gc.correct_multiple(flag_values.input, output)
+
+
+def define_flags():
+    flag_values = flags.FLAGS
+    flags.DEFINE_list(
+        'input', None, 'Path to input event FITS file(s). If multiple files, input comma-separated list of strings.')
+    flags.DEFINE_list(
+        'output', None, 'Path to output event FITS file(s). Default is <input>_cor.evt.')
+    flags.DEFINE_string(
+        'image', None, 'Path to all grade image, from which the event density of each event is taken.')
+    flags.DEFINE_float(
+        'nframe', None, 'Number of frames.')
+    flags.DEFINE_float(
+        'exposure', None, 'Exposure in second. Used when nframe is not given.')
+    flags.DEFINE_float(
+        'frame_time', scf.FRAME_TIME, 'Exposure time of a frame in second.')
+    flags.DEFINE_enum(
+        'kernel', 'gaussian', ['gaussian', 'tophat'], 'Kernel smoothing the image by FFT convolution.')
+    flags.DEFINE_float(
+        'smooth_scale', scf.PSF_SCALE, 'Sigma of the gaussian or radius of the top hat in sky pixels '
+        '(57.53 pixels/arcmin). Should be the same as xisscfmkqdp.py, whose default is also the PSF of about 1 arcmin. '
+        '0 disables the smoothing.', lower_bound=0.0)
+    flags.DEFINE_float(
+        'C', None, 'C of the fitted SCF curve.')
+    flags.DEFINE_float(
+        'epsilon', None, 'epsilon of the fitted SCF curve.')
+    flags.DEFINE_string(
+        'state', None, 'JSON file of the joint solution saved by xisscfcurvefit.py --state, '
+        'from which C and epsilon are taken instead of --C and --epsilon.')
+    flags.DEFINE_string(
+        'qdp', None, 'QDP file in --state whose C and epsilon are taken. '
+        'Required if they differ among the QDP files, e.g. tied by sensor.')
+    flags.DEFINE_integer(
+        'seed', None, 'Seed of random numbers for the energies within the PI channels.')
+    flags.DEFINE_integer(
+        'chunk_size', None, 'Rows of the event table corrected at once. Default is 1000000.', lower_bound=1)
+    flags.DEFINE_integer(
+        'workers', None, 'Number of processes. Default is the number of CPUs.')
+    flags.DEFINE_boolean(
+        'clobber', False, 'Overwrite output file(s).')
+    flags.DEFINE_boolean(
+        'debug', False, 'run with debug mode.')
+    flags.DEFINE_enum(
+        'loglv', 'INFO',
+        ['DEBUG', 'debug', 'INFO', 'info', 'WARNING', 'warning', 'ERROR', 'error'],
+        'Logging level.')
+    flags.mark_flags_as_required(['input', 'image'])
+    return flag_values
+
+
+if __name__ == '__main__':
+    flag_values = define_flags()
+    sys.exit(app.run(main))
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import sys
+
+from absl import app
+from absl import flags
+
+import src as scf
+
+
+def main(argv):
+    if flag_values.debug:
+        flag_values.loglv = 0
+    window = [float(v) for v in flag_values.window]
+    if len(window) != 2:
+        raise app.UsageError('--window should be two energies in keV.')
+    fitter = scf.LineCentroidFitter(window=tuple(window), sigma=flag_values.sigma, loglv=flag_values.loglv)
+    result = fitter.fit_files(flag_values.input)
+    scf.write_line_energy(flag_values.energy, result['center'], result['center_error'])
+    scf.Common(flag_values.loglv).info(f'{flag_values.energy} is generated')
+
+
+def define_flags():
+    flag_values = flags.FLAGS
+    flags.DEFINE_list(
+        'input', None, 'Path to spectrum FITS files of the regions in order. If multiple files, input comma-separated '
+        'list of strings.')
+    flags.DEFINE_string(
+        'energy', None, 'Path to output text file of the line center energies and their errors, one row per region.')
+    flags.DEFINE_list(
+        'window', [str(v) for v in scf.LINE_WINDOW], 'Energy range in keV of the Gaussian line and the linear continuum.')
+    flags.DEFINE_float(
+        'sigma', scf.LINE_SIGMA, 'Initial sigma of the line in keV.')
+    flags.DEFINE_boolean(
+        'debug', False, 'run with debug mode.')
+    flags.DEFINE_enum(
+        'loglv', 'INFO',
+        ['DEBUG', 'debug', 'INFO', 'info', 'WARNING', 'warning', 'ERROR', 'error'],
+        'Logging level.')
+    flags.mark_flags_as_required(['input', 'energy'])
+    return flag_values
+
+
+if __name__ == '__main__':
+    flag_values = define_flags()
+    sys.exit(app.run(main))
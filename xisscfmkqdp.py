@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import sys
+
+from absl import app
+from absl import flags
+
+import src as scf
+
+
+def main(argv):
+    if flag_values.debug:
+        flag_values.loglv = 0
+    builder = scf.EventDensityQdpBuilder(
+        image=flag_values.image, regions=flag_values.region,
+        nframe=flag_values.nframe, exposure=flag_values.exposure,
+        frame_time=flag_values.frame_time, kernel=flag_values.kernel, scale=flag_values.smooth_scale,
+        loglv=flag_values.loglv)
+    builder.write_qdp(qdp=flag_values.qdp, energy=flag_values.energy)
+
+
+def define_flags():
+    flag_values = flags.FLAGS
+    flags.DEFINE_string(
+        'image', None, 'Path to all grade image.')
+    flags.DEFINE_list(
+        'region', None, 'Path to region files. Input comma-separated list of strings.')
+    flags.DEFINE_string(
+        'energy', None, 'Path to text file of line center energies and errors in keV, one row per region.')
+    flags.DEFINE_float(
+        'nframe', None, 'Number of frames.')
+    flags.DEFINE_float(
+        'exposure', None, 'Exposure in second. Used when nframe is not given.')
+    flags.DEFINE_float(
+        'frame_time', scf.FRAME_TIME, 'Exposure time of a frame in second.')
+    flags.DEFINE_enum(
+        'kernel', 'gaussian', ['gaussian', 'tophat'], 'Kernel smoothing the image by FFT convolution.')
+    flags.DEFINE_float(
+        'smooth_scale', scf.PSF_SCALE, 'Sigma of the gaussian or radius of the top hat in sky pixels '
+        '(57.53 pixels/arcmin). The event densities are averages of the smoothed map over the regions. '
+        'Default is the PSF of about 1 arcmin, as xisscfevtgaincorrect.py. 0 disables the smoothing.',
+        lower_bound=0.0)
+    flags.DEFINE_string(
+        'qdp', 'xisscf.qdp', 'Path to output qdp file.')
+    flags.DEFINE_boolean(
+        'debug', False, 'run with debug mode.')
+    flags.DEFINE_enum(
+        'loglv', 'INFO',
+        ['DEBUG', 'debug', 'INFO', 'info', 'WARNING', 'warning', 'ERROR', 'error'],
+        'Logging level.')
+    flags.mark_flags_as_required(['image', 'region', 'energy'])
+    return flag_values
+
+
+if __name__ == '__main__':
+    flag_values = define_flags()
+    sys.exit(app.run(main))
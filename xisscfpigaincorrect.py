@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import sys
+
+from absl import app
+from absl import flags
+
+import src as scf
+
+
+def main(argv):
+    if flag_values.debug:
+        flag_values.loglv = 0
+    ninput = len(flag_values.input)
+    output = flag_values.output or [scf.PiGainCorrect.default_output(f) for f in flag_values.input]
+    actual = [float(v) for v in flag_values.actual]
+    expect = [float(v) for v in flag_values.expect]
+    if len(actual) == 1:
+        actual *= ninput
+    if len(expect) == 1:
+        expect *= ninput
+    if not len(output) == len(actual) == len(expect) == ninput:
+        raise app.UsageError('Numbers of input, output, actual and expect are inconsistent.')
+    gc = scf.PiGainCorrect(seed=flag_values.seed, clobber=flag_values.clobber, loglv=flag_values.loglv)
+    gc.correct_multiple(flag_values.input, output, actual, expect)
+
+
+def define_flags():
+    flag_values = flags.FLAGS
+    flags.DEFINE_list(
+        'input', None, 'Path to input spectrum FITS file(s). If multiple files, input comma-separated list of strings.')
+    flags.DEFINE_list(
+        'output', None, 'Path to output spectrum FITS file(s). Default is <input>_cor.pi.')
+    flags.DEFINE_list(
+        'actual', None, 'Actual energy in keV. One value for all inputs or one value per input.')
+    flags.DEFINE_list(
+        'expect', None, 'Expected energy in keV. One value for all inputs or one value per input.')
+    flags.DEFINE_integer(
+        'seed', None, 'Seed of random numbers for the rounding of the corrected counts.')
+    flags.DEFINE_boolean(
+        'clobber', False, 'Overwrite output file(s).')
+    flags.DEFINE_boolean(
+        'debug', False, 'run with debug mode.')
+    flags.DEFINE_enum(
+        'loglv', 'INFO',
+        ['DEBUG', 'debug', 'INFO', 'info', 'WARNING', 'warning', 'ERROR', 'error'],
+        'Logging level.')
+    flags.mark_flags_as_required(['input', 'actual', 'expect'])
+    return flag_values
+
+
+if __name__ == '__main__':
+    flag_values = define_flags()
+    sys.exit(app.run(main))
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import sys
+
+from absl import app
+from absl import flags
+
+import src as scf
+
+
+def main(argv):
+    if flag_values.debug:
+        flag_values.loglv = 0
+    config = scf.read_pipeline_config(flag_values.config)
+    workdir = config['workdir']
+    pipeline = scf.Pipeline(
+        stages=scf.scf_stages(config), state_file=flag_values.state or os.path.join(workdir, scf.PIPELINE_STATE_FILE),
+        workers=flag_values.workers, clobber=flag_values.clobber, loglv=flag_values.loglv)
+    report = pipeline.run(dry_run=flag_values.dry_run)
+    report_file = flag_values.report or os.path.join(workdir, scf.PIPELINE_REPORT_FILE)
+    text = json.dumps(report, indent=2)
+    if report_file == '-':
+        print(text)
+    else:
+        with open(report_file, 'w') as f:
+            f.write(text + '\n')
+        scf.Common(flag_values.loglv).info(f'Report of the run was recorded to {report_file}')
+    return int(report['counts'].get('failed', 0) > 0)
+
+
+def define_flags():
+    flag_values = flags.FLAGS
+    flags.DEFINE_string(
+        'config', None, 'Path to JSON, TOML or YAML file of the pipeline: regnum, inner_radius, outer_radius, xis, '
+        'observations (list of directory, skyx, skyy and exposure or nframe), and optionally spectrum_command, '
+        'energy_command, fit, kernel, smooth_scale, correct and workdir.')
+    flags.DEFINE_string(
+        'state', None, 'Path to JSON file of the keys and outputs of the stages. Default is <workdir>/xisscf_pipeline.json.')
+    flags.DEFINE_string(
+        'report', None, 'Path to JSON report of the status and duration of each stage, or "-" for the standard output. '
+        'Default is <workdir>/xisscf_pipeline_report.json.')
+    flags.DEFINE_integer(
+        'workers', None, 'Number of processes running stages. Default is the number of CPUs.')
+    flags.DEFINE_boolean(
+        'clobber', False, 'Run all the stages even if they are up to date.')
+    flags.DEFINE_boolean(
+        'dry_run', False, 'Report the stale stages without running them.')
+    flags.DEFINE_boolean(
+        'debug', False, 'run with debug mode.')
+    flags.DEFINE_enum(
+        'loglv', 'INFO',
+        ['DEBUG', 'debug', 'INFO', 'info', 'WARNING', 'warning', 'ERROR', 'error'],
+        'Logging level.')
+    flags.mark_flags_as_required(['config'])
+    return flag_values
+
+
+if __name__ == '__main__':
+    flag_values = define_flags()
+    sys.exit(app.run(main))